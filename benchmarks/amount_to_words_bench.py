@@ -0,0 +1,166 @@
+"""
+Проверка и бенчмарк суммы прописью.
+
+1. Эталонные строки (склонения тысяч, миллионов, миллиардов, копеек).
+2. Сверка number_to_words с независимой эталонной реализацией: все числа
+   0..--exhaustive подряд, затем границы разрядов и --samples случайных
+   чисел до 10^9 (--full проверяет весь диапазон 0..10^9, это долго).
+3. Замеры: холодный вызов, повторный вызов из кэша и amounts_to_words.
+
+    python benchmarks/amount_to_words_bench.py
+    python benchmarks/amount_to_words_bench.py --exhaustive 10000000 --samples 500000
+"""
+import argparse
+import random
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import database  # noqa: E402,F401  (как в bot.py: database импортируется раньше services)
+from services.amount_to_words import (  # noqa: E402
+    _format_amount, _triad_to_words, amount_to_words, amounts_to_words, number_to_words
+)
+
+GOLDEN = {
+    0: "0 руб. 00 коп.",
+    0.01: "0 руб. 01 коп. (одна копейка)",
+    0.22: "0 руб. 22 коп. (двадцать две копейки)",
+    1: "1 руб. 00 коп. (один рубль)",
+    2.5: "2 руб. 50 коп. (два рубля пятьдесят копеек)",
+    11: "11 руб. 00 коп. (одиннадцать рублей)",
+    21.21: "21 руб. 21 коп. (двадцать один рубль двадцать одна копейка)",
+    112: "112 руб. 00 коп. (сто двенадцать рублей)",
+    1000: "1 000 руб. 00 коп. (одна тысяча рублей)",
+    2000: "2 000 руб. 00 коп. (две тысячи рублей)",
+    4999.99: "4 999 руб. 99 коп. (четыре тысячи девятьсот девяносто девять рублей девяносто девять копеек)",
+    5000: "5 000 руб. 00 коп. (пять тысяч рублей)",
+    11000: "11 000 руб. 00 коп. (одиннадцать тысяч рублей)",
+    21000: "21 000 руб. 00 коп. (двадцать одна тысяча рублей)",
+    22500: "22 500 руб. 00 коп. (двадцать две тысячи пятьсот рублей)",
+    101000: "101 000 руб. 00 коп. (сто одна тысяча рублей)",
+    1000000: "1 000 000 руб. 00 коп. (один миллион рублей)",
+    2300000: "2 300 000 руб. 00 коп. (два миллиона триста тысяч рублей)",
+    15000000: "15 000 000 руб. 00 коп. (пятнадцать миллионов рублей)",
+    1000000000: "1 000 000 000 руб. 00 коп. (один миллиард рублей)",
+    3002001001: "3 002 001 001 руб. 00 коп. (три миллиарда два миллиона одна тысяча один рубль)",
+    0.999: "1 руб. 00 коп. (один рубль)",
+}
+
+_ONES = "ноль один два три четыре пять шесть семь восемь девять".split()
+_ONES_F = "ноль одна две три четыре пять шесть семь восемь девять".split()
+_TEENS = ("десять одиннадцать двенадцать тринадцать четырнадцать пятнадцать "
+          "шестнадцать семнадцать восемнадцать девятнадцать").split()
+_TENS = "- - двадцать тридцать сорок пятьдесят шестьдесят семьдесят восемьдесят девяносто".split()
+_HUNDREDS = "- сто двести триста четыреста пятьсот шестьсот семьсот восемьсот девятьсот".split()
+_GROUPS = (
+    None,
+    ("тысяча", "тысячи", "тысяч", True),
+    ("миллион", "миллиона", "миллионов", False),
+    ("миллиард", "миллиарда", "миллиардов", False),
+)
+
+
+def _reference(n: int, feminine: bool = False) -> str:
+    """Эталон: разбор по цифрам строки группами по три, без общих таблиц с модулем."""
+    if n == 0:
+        return "ноль"
+    digits = str(n).zfill((len(str(n)) + 2) // 3 * 3)
+    groups = [int(digits[i:i + 3]) for i in range(0, len(digits), 3)]
+    words = []
+    for position, group in zip(range(len(groups) - 1, -1, -1), groups):
+        if group == 0:
+            continue
+        group_feminine = _GROUPS[position][3] if position else feminine
+        hundreds, rest = divmod(group, 100)
+        if hundreds:
+            words.append(_HUNDREDS[hundreds])
+        if 10 <= rest <= 19:
+            words.append(_TEENS[rest - 10])
+        else:
+            tens, ones = divmod(rest, 10)
+            if tens:
+                words.append(_TENS[tens])
+            if ones:
+                words.append((_ONES_F if group_feminine else _ONES)[ones])
+        if position:
+            one, few, many, _ = _GROUPS[position]
+            if 10 <= rest <= 19:
+                words.append(many)
+            else:
+                words.append({1: one, 2: few, 3: few, 4: few}.get(rest % 10, many))
+    return " ".join(words)
+
+
+def check_golden() -> int:
+    failures = 0
+    for amount, expected in GOLDEN.items():
+        actual = amount_to_words(amount)
+        if actual != expected:
+            failures += 1
+            print(f"FAIL {amount}: {actual!r} != {expected!r}")
+    return failures
+
+
+def check_against_reference(numbers) -> int:
+    failures = 0
+    for n in numbers:
+        if number_to_words(n) != _reference(n):
+            failures += 1
+            if failures <= 10:
+                print(f"FAIL {n}: {number_to_words(n)!r} != {_reference(n)!r}")
+    return failures
+
+
+def boundary_numbers(limit: int):
+    power = 1
+    while power <= limit:
+        for base in range(1, 10):
+            for delta in (-1, 0, 1, 11, 21):
+                n = base * power + delta
+                if 0 <= n <= limit:
+                    yield n
+        power *= 10
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--exhaustive", type=int, default=1_000_000, help="проверить все числа 0..N подряд")
+    parser.add_argument("--samples", type=int, default=200_000, help="случайных чисел до 10^9")
+    parser.add_argument("--full", action="store_true", help="проверить весь диапазон 0..10^9")
+    parser.add_argument("--repeat", type=int, default=20_000, help="повторов для замеров")
+    args = parser.parse_args()
+
+    upper = 10 ** 9
+    failures = check_golden()
+    print(f"Эталонные строки: {len(GOLDEN)}, ошибок: {failures}")
+
+    exhaustive = upper if args.full else args.exhaustive
+    rng = random.Random(2025)
+    numbers = [range(exhaustive + 1), boundary_numbers(upper), (rng.randint(0, upper) for _ in range(args.samples))]
+    for part in numbers:
+        failures += check_against_reference(part)
+    print(f"Сверка с эталоном: 0..{exhaustive}, границы разрядов, {args.samples} случайных; ошибок: {failures}")
+
+    amounts = [rng.randint(0, 5_000_000) + rng.randint(0, 99) / 100 for _ in range(1000)]
+
+    def cold():
+        _format_amount.cache_clear()
+        _triad_to_words.cache_clear()
+        return amounts_to_words(amounts)
+
+    repeat = max(1, args.repeat // 1000)
+    print(f"Без кэша:          {timeit.timeit(cold, number=repeat) / (repeat * len(amounts)) * 1e6:.2f} мкс/сумма")
+    amounts_to_words(amounts)
+    warm = timeit.timeit(lambda: amount_to_words(amounts[0]), number=args.repeat)
+    print(f"Повтор из кэша:    {warm / args.repeat * 1e6:.2f} мкс/сумма")
+    bulk = timeit.timeit(lambda: amounts_to_words(amounts), number=repeat)
+    print(f"amounts_to_words:  {bulk / (repeat * len(amounts)) * 1e6:.2f} мкс/сумма")
+
+    print("OK" if not failures else "FAIL")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,758 @@
+"""
+Сквозной нагрузочный стенд без сети.
+
+Запускает Dispatcher бота в режиме polling против локального поддельного
+Bot API (aiohttp на 127.0.0.1) и поддельной ЮKassa (модуль yookassa
+подменяется в процессе). Виртуальные пользователи проходят весь путь:
+/start → каталог → категория → документ → fill_* (ответы из примеров
+вопросов) → корзина → checkout → оплата → check_payment → получение документа.
+
+Все данные — во временном каталоге: база, FSM, сгенерированные документы.
+Рабочая база и настоящие Telegram/ЮKassa не затрагиваются.
+
+В отчете: обновлений в секунду, p50/p95/max задержки по шагам (от
+отправки обновления до ответа бота с клавиатурой), число завершенных
+сценариев и ошибок по шагам, конкуренция за SQLite (ошибки «database is
+locked», время в БД по обработчикам, самые дорогие запросы) и задержка
+event loop.
+
+    python benchmarks/e2e_load.py --users 200 --concurrency 50
+    python benchmarks/e2e_load.py --users 2000 --concurrency 200 --fsm sqlite --output e2e.json
+    python benchmarks/e2e_load.py --users 50 --template rental_contract_2025 --yookassa-latency 0.2
+
+Исходящие сообщения идут через общую очередь бота с ее лимитами (как у
+Telegram); --outbound-rate и --per-chat-interval позволяют их поднять,
+чтобы мерить сам бот, а не ограничение скорости отправки.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import types
+from collections import defaultdict
+from pathlib import Path
+
+# Поддельные учетные данные: бот разговаривает только с локальным стендом
+os.environ["BOT_TOKEN"] = "123456:LOADTEST"
+os.environ["BOT_MODE"] = "polling"
+os.environ["YOOKASSA_SHOP_ID"] = "loadtest"
+os.environ["YOOKASSA_SECRET_KEY"] = "loadtest"
+os.environ["METRICS_ENABLED"] = "false"
+os.environ["LOG_FILE_ENABLED"] = "false"  # логи стенда не должны попадать в файл бота
+os.environ.setdefault("ADMIN_IDS", "1")
+os.environ.setdefault("SUPPORT_CHAT_ID", "-1000000000001")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aiohttp import web  # noqa: E402
+from aiogram import Bot  # noqa: E402
+from aiogram.client.session.aiohttp import AiohttpSession  # noqa: E402
+from aiogram.client.telegram import TelegramAPIServer  # noqa: E402
+from aiogram.fsm.storage.memory import MemoryStorage  # noqa: E402
+from config import config  # noqa: E402
+
+BOT_USER = {"id": 123456, "is_bot": True, "first_name": "LoadTestBot", "username": "loadtest_bot"}
+FIRST_USER_ID = 7_000_000_000
+DEFAULT_ANSWER = "Пример"
+DATE_ANSWER = "15.03.2025"
+EXAMPLE_RE = re.compile(r"(?:Пример|Например): <i>(.*?)</i>", re.DOTALL)
+STEPS = ("start", "catalog", "category", "document", "fill", "answer", "confirm",
+         "checkout", "pay", "check_payment", "delivery")
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+# ---------------------------------------------------------------- ЮKassa
+
+
+class FakeYooKassa:
+    """
+    Подмена SDK yookassa: Payment.create / Payment.find_one без сети.
+    Вызовы, как и у настоящего SDK, синхронные — latency имитирует HTTP-запрос
+    и блокирует event loop так же, как в проде.
+    """
+
+    def __init__(self, latency: float = 0.0, pending_checks: int = 0):
+        self.latency = latency
+        self.pending_checks = pending_checks
+        self.payments = {}
+        self.created = 0
+        self.checked = 0
+        self._ids = itertools.count(1)
+
+    def _payment(self, payment_id: str, status: str):
+        confirmation = types.SimpleNamespace(confirmation_url=f"https://yookassa.invalid/pay/{payment_id}")
+        return types.SimpleNamespace(id=payment_id, status=status, confirmation=confirmation)
+
+    def create(self, params: dict, idempotency_key=None):
+        if self.latency:
+            time.sleep(self.latency)
+        payment_id = f"fake-{next(self._ids):08d}"
+        self.payments[payment_id] = {'params': params, 'checks': 0}
+        self.created += 1
+        return self._payment(payment_id, "pending")
+
+    def find_one(self, payment_id: str):
+        if self.latency:
+            time.sleep(self.latency)
+        self.checked += 1
+        payment = self.payments.get(payment_id)
+        if payment is None:
+            raise ValueError(f"Платеж {payment_id} не найден")
+        payment['checks'] += 1
+        status = "succeeded" if payment['checks'] > self.pending_checks else "pending"
+        return self._payment(payment_id, status)
+
+    def install(self):
+        """Подставляет модуль yookassa: интеграция импортирует его лениво."""
+        fake = self
+        module = types.ModuleType("yookassa")
+
+        class Configuration:
+            account_id = None
+            secret_key = None
+
+        class Payment:
+            @staticmethod
+            def create(params, idempotency_key=None):
+                return fake.create(params, idempotency_key)
+
+            @staticmethod
+            def find_one(payment_id):
+                return fake.find_one(payment_id)
+
+        module.Configuration = Configuration
+        module.Payment = Payment
+        sys.modules["yookassa"] = module
+
+
+# ---------------------------------------------------------------- Bot API
+
+
+class ChatLog:
+    """События одного чата: сообщения и правки бота, документы, всплывающие ответы."""
+
+    def __init__(self):
+        self.events = []
+        self.messages = {}
+        self._message_ids = itertools.count(1)
+        self._changed = asyncio.Event()
+
+    def next_message_id(self) -> int:
+        return next(self._message_ids)
+
+    def add(self, event: dict):
+        self.events.append(event)
+        self._changed.set()
+
+    async def wait_for(self, predicate, start: int, timeout: float):
+        """Первое событие начиная с индекса start, для которого predicate истинен."""
+        deadline = time.perf_counter() + timeout
+        position = start
+        while True:
+            while position < len(self.events):
+                event = self.events[position]
+                position += 1
+                if predicate(event):
+                    return event, position
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return None, position
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+
+def _is_error(event: dict) -> bool:
+    return event["kind"] == "alert" and event["text"].startswith(("⚠️", "❌"))
+
+
+def _buttons(markup) -> list:
+    if not markup:
+        return []
+    if isinstance(markup, str):
+        markup = json.loads(markup)
+    return [
+        button.get("callback_data")
+        for row in markup.get("inline_keyboard", [])
+        for button in row
+        if button.get("callback_data")
+    ]
+
+
+class FakeBotAPI:
+    """
+    Минимальный Bot API: getUpdates отдает обновления виртуальных пользователей,
+    методы отправки записываются в журнал чата и возвращают правдоподобный Message.
+    """
+
+    def __init__(self):
+        self.chats = defaultdict(ChatLog)
+        self.pending = []
+        self.calls = defaultdict(int)
+        self.support_messages = 0
+        self._update_ids = itertools.count(1)
+        self._new_updates = asyncio.Event()
+        self._callbacks = {}
+
+    # --- обновления от пользователей
+
+    def push_update(self, payload: dict):
+        payload["update_id"] = next(self._update_ids)
+        self.pending.append(payload)
+        self._new_updates.set()
+
+    async def get_updates(self, params: dict) -> list:
+        offset = int(params.get("offset") or 0)
+        if offset:
+            self.pending = [update for update in self.pending if update["update_id"] >= offset]
+        timeout = float(params.get("timeout") or 0)
+        if not self.pending and timeout:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        limit = int(params.get("limit") or 100)
+        batch = self.pending[:limit]
+        return batch
+
+    def register_callback(self, callback_id: str, chat_id: int):
+        self._callbacks[callback_id] = chat_id
+
+    # --- ответы бота
+
+    def message_payload(self, chat_id: int, message_id: int, text: str = None) -> dict:
+        message = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "supergroup"},
+            "from": BOT_USER,
+        }
+        if text is not None:
+            message["text"] = text
+        return message
+
+    def _record(self, kind: str, params: dict, message_id: int = None) -> dict:
+        try:
+            chat_id = int(params.get("chat_id") or 0)
+        except ValueError:
+            # Каналы по @username
+            chat_id = 0
+        if chat_id == config.SUPPORT_CHAT_ID or chat_id <= 0:
+            self.support_messages += 1
+        chat = self.chats[chat_id]
+        if message_id is None:
+            message_id = chat.next_message_id()
+        text = params.get("text") or params.get("caption")
+        markup = params.get("reply_markup")
+        if isinstance(markup, str):
+            markup = json.loads(markup)
+        chat.messages[message_id] = {"text": text, "markup": markup}
+        chat.add({"kind": kind, "message_id": message_id, "text": text or "",
+                  "buttons": _buttons(markup), "at": time.perf_counter()})
+        return self.message_payload(chat_id, message_id, text)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        params = dict(await request.post())
+        result = True
+
+        if method == "getUpdates":
+            result = await self.get_updates(params)
+        elif method == "getMe":
+            result = BOT_USER
+        elif method == "sendMessage":
+            result = self._record("message", params)
+        elif method in ("editMessageText", "editMessageReplyMarkup", "editMessageCaption"):
+            result = self._record("edit", params, int(params.get("message_id") or 0) or None)
+        elif method in ("sendDocument", "sendPhoto"):
+            field = params.get("document") or params.get("photo")
+            size = 0
+            if hasattr(field, "file"):
+                field.file.seek(0, os.SEEK_END)
+                size = field.file.tell()
+            result = self._record("document", params)
+            result["document"] = {"file_id": f"doc-{result['message_id']}",
+                                  "file_unique_id": f"u{result['message_id']}", "file_size": size}
+        elif method == "answerCallbackQuery":
+            chat_id = self._callbacks.pop(params.get("callback_query_id"), None)
+            if chat_id is not None and params.get("text"):
+                self.chats[chat_id].add({"kind": "alert", "text": params["text"], "buttons": [],
+                                         "at": time.perf_counter()})
+
+        return web.json_response({"ok": True, "result": result})
+
+    def create_app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        return app
+
+
+# ---------------------------------------------------------------- пользователи
+
+
+class StepFailed(Exception):
+    def __init__(self, step: str, reason: str):
+        super().__init__(f"{step}: {reason}")
+        self.step = step
+        self.reason = reason
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.failures = defaultdict(lambda: defaultdict(int))
+        self.completed = 0
+        self.started = 0
+        self.updates = 0
+        self.documents = 0
+
+
+class VirtualUser:
+    def __init__(self, user_id: int, api: FakeBotAPI, stats: Stats, args, rng: random.Random):
+        self.user_id = user_id
+        self.api = api
+        self.stats = stats
+        self.args = args
+        self.rng = rng
+        self.chat = api.chats[user_id]
+        self.cursor = 0
+        self.last = None
+        self._message_ids = itertools.count(1)
+        self._callback_ids = itertools.count(1)
+        self.user = {"id": user_id, "is_bot": False, "first_name": f"Load{user_id % 100000}",
+                     "username": f"load_{user_id}", "language_code": "ru"}
+
+    # --- отправка обновлений
+
+    def _send_text(self, text: str):
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": self.user_id, "type": "private", "first_name": self.user["first_name"]},
+            "from": self.user,
+            "text": text,
+        }
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        self.api.push_update({"message": message})
+        self.stats.updates += 1
+
+    def _send_callback(self, data: str):
+        event = self.last
+        stored = self.chat.messages.get(event["message_id"], {}) if event else {}
+        message = self.api.message_payload(self.user_id, event["message_id"] if event else 1, stored.get("text") or "")
+        if stored.get("markup"):
+            message["reply_markup"] = stored["markup"]
+        callback_id = f"{self.user_id}-{next(self._callback_ids)}"
+        self.api.register_callback(callback_id, self.user_id)
+        self.api.push_update({"callback_query": {
+            "id": callback_id, "from": self.user, "chat_instance": str(self.user_id),
+            "data": data, "message": message,
+        }})
+        self.stats.updates += 1
+
+    # --- ожидание ответа
+
+    async def _wait(self, step: str, predicate=None, record: bool = True, started: float = None):
+        """Ждет ответ бота с клавиатурой (или документ/всплывающее сообщение)."""
+        predicate = predicate or (lambda event: event["buttons"] or event["kind"] == "document" or _is_error(event))
+        event, self.cursor = await self.chat.wait_for(predicate, self.cursor, self.args.step_timeout)
+        if event is None:
+            raise StepFailed(step, "нет ответа")
+        if _is_error(event):
+            raise StepFailed(step, event["text"][:60])
+        if record:
+            self.stats.latencies[step].append(event["at"] - started)
+        if event["buttons"]:
+            self.last = event
+        return event
+
+    async def act(self, step: str, *, text: str = None, data: str = None, predicate=None) -> dict:
+        if self.args.think:
+            await asyncio.sleep(self.rng.uniform(0, self.args.think))
+        started = time.perf_counter()
+        if text is not None:
+            self._send_text(text)
+        else:
+            self._send_callback(data)
+        return await self._wait(step, predicate, started=started)
+
+    def _pick(self, step: str, prefix: str, event: dict = None, choose=None) -> str:
+        options = [data for data in (event or self.last)["buttons"] if data.startswith(prefix)]
+        if choose:
+            options = [data for data in options if choose(data)] or options
+        if not options:
+            raise StepFailed(step, f"нет кнопки {prefix}*")
+        return self.rng.choice(options)
+
+    # --- сценарий
+
+    async def run(self):
+        self.stats.started += 1
+        event = await self.act("start", text="/start")
+        event = await self.act("catalog", data=self._pick("start", "catalog", event))
+
+        template_filter = category_filter = None
+        if self.args.template:
+            template_filter = lambda data: data in self.args.template_callbacks  # noqa: E731
+            category_filter = lambda data: data in self.args.template_categories  # noqa: E731
+        for _ in range(3):
+            catalog_event = event
+            event = await self.act("category", data=self._pick("catalog", "category_", event, category_filter))
+            if any(data.startswith("doc_") for data in event["buttons"]):
+                break
+            # Пустая категория: возвращаемся в каталог и выбираем другую
+            event = await self.act("catalog", data=self._pick("category", "catalog", event))
+        else:
+            raise StepFailed("category", f"нет документов в категориях ({len(catalog_event['buttons'])} кнопок)")
+        event = await self.act("document", data=self._pick("category", "doc_", event, template_filter))
+        event = await self.act("fill", data=self._pick("document", "fill_", event))
+        event = await self.fill(event)
+
+        event = await self.act("confirm", data="confirm_document")
+        event = await self.act("checkout", data=self._pick("confirm", "checkout", event))
+        event = await self.act("pay", data=self._pick("checkout", "pay_with_yookassa", event))
+        self._pick("pay", "check_payment", event)
+
+        # Документы отправляются до ответа на check_payment — ищем их с момента нажатия
+        started = time.perf_counter()
+        delivery_cursor = self.cursor
+        for _ in range(self.args.pending_checks + 1):
+            event = await self.act(
+                "check_payment", data="check_payment",
+                predicate=lambda item: (
+                    item["kind"] == "alert" and item["text"].startswith(("ℹ️", "⏳", "⚠️", "❌"))
+                    or (item["buttons"] and "check_payment" not in item["buttons"])
+                )
+            )
+            if event["kind"] != "alert":
+                break
+            await asyncio.sleep(self.args.check_interval)
+        else:
+            raise StepFailed("check_payment", "платеж не подтвержден")
+        if event["text"].startswith("⚠️"):
+            raise StepFailed("delivery", "ошибка генерации документов")
+        self.cursor = delivery_cursor
+        await self._wait("delivery", lambda item: item["kind"] == "document", started=started)
+        self.stats.documents += 1
+        self.stats.completed += 1
+
+    async def fill(self, event: dict) -> dict:
+        """Отвечает на вопросы анкеты, пока бот не предложит подтвердить документ."""
+        attempts = defaultdict(int)
+        repeat_items = defaultdict(int)
+        for _ in range(self.args.max_answers):
+            buttons = event["buttons"]
+            if "confirm_document" in buttons:
+                return event
+            if "use_last_draft_no" in buttons:
+                event = await self.act("answer", data="use_last_draft_no")
+                continue
+
+            prefill = [data for data in buttons if data.startswith("prefill_keep_")]
+            choices = [data for data in buttons if data.startswith("ch_")]
+            multi = [data for data in buttons if data.startswith("multi_") and not data.endswith(":done")]
+            repeat_add = [data for data in buttons if data.startswith("repeat_add_")]
+            repeat_done = [data for data in buttons if data.startswith("repeat_done_")]
+
+            if prefill:
+                event = await self.act("answer", data=prefill[0])
+            elif choices:
+                event = await self.act("answer", data=choices[0])
+            elif multi:
+                # Отмечаем первый вариант, затем «Готово»
+                done = next(data for data in buttons if data.endswith(":done"))
+                attempts[done] += 1
+                event = await self.act("answer", data=multi[0] if attempts[done] == 1 else done)
+            elif repeat_add and repeat_items[repeat_add[0]] < self.args.items:
+                repeat_items[repeat_add[0]] += 1
+                event = await self.act("answer", data=repeat_add[0])
+            elif repeat_done:
+                event = await self.act("answer", data=repeat_done[0])
+            else:
+                skip = [data for data in buttons if data.startswith("skip_")]
+                key = skip[0] if skip else event["text"][:40]
+                attempts[key] += 1
+                if attempts[key] > 2 and skip:
+                    # Пример не прошел проверку дважды — пропускаем вопрос
+                    event = await self.act("answer", data=skip[0])
+                else:
+                    event = await self.act("answer", text=self._answer_for(event["text"]))
+        raise StepFailed("answer", "слишком много вопросов")
+
+    def _answer_for(self, text: str) -> str:
+        match = EXAMPLE_RE.search(text)
+        if match:
+            return match.group(1).strip()
+        if "дат" in text.lower():
+            return DATE_ANSWER
+        return DEFAULT_ANSWER
+
+
+# ---------------------------------------------------------------- запуск
+
+
+class LogCounter(logging.Handler):
+    """Считает предупреждения и ошибки бота, отдельно — блокировки SQLite."""
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.by_level = defaultdict(int)
+        self.locked = 0
+        self.by_logger = defaultdict(int)
+
+    def emit(self, record: logging.LogRecord):
+        self.by_level[record.levelname] += 1
+        if record.levelno >= logging.ERROR:
+            self.by_logger[record.name] += 1
+        message = record.getMessage()
+        if record.exc_info and record.exc_info[1] is not None:
+            message += str(record.exc_info[1])
+        if "database is locked" in message:
+            self.locked += 1
+
+
+async def sample_loop_lag(lags: list, interval: float = 0.1):
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, loop.time() - started - interval))
+
+
+def prepare_environment(work_dir: Path, args):
+    config.DATABASE_DIR = work_dir
+    config.DATABASE_PATH = work_dir / "bot.db"
+    config.FSM_DATABASE_PATH = work_dir / "fsm.db"
+    config.GENERATED_DOCUMENTS_PATH = work_dir / "generated"
+    config.TEMP_PATH = work_dir / "temp"
+    config.GENERATED_DOCUMENTS_PATH.mkdir()
+    config.TEMP_PATH.mkdir()
+    config.DB_TRACE_ENABLED = True
+    config.OUTBOUND_GLOBAL_RATE = args.outbound_rate
+    config.OUTBOUND_PER_CHAT_INTERVAL = args.per_chat_interval
+
+
+async def run(args) -> dict:
+    from bot import create_dispatcher
+    from database import init_db
+    from database.fsm_storage import SQLiteStorage
+    from database.promocodes import initialize_default_promocodes
+    from database.tracing import get_handler_query_stats, get_query_stats, reset_query_stats
+    from services.outbound import start_outbound_queue, stop_outbound_queue
+    from services.template_catalog import catalog
+
+    init_db()
+    initialize_default_promocodes()
+    catalog.load()
+    if args.template:
+        entries = [catalog.get(name) for name in args.template if catalog.get(name)]
+        if not entries:
+            raise SystemExit("Ни один из --template не найден в каталоге")
+        args.template_categories = {f"category_{entry['category']}" for entry in entries}
+        args.template_callbacks = {
+            f"doc_{entry['category']}_{entry['metadata'].get('id', entry['template_name'])}" for entry in entries
+        }
+    reset_query_stats()
+
+    yookassa = FakeYooKassa(args.yookassa_latency, args.pending_checks)
+    yookassa.install()
+
+    api = FakeBotAPI()
+    runner = web.AppRunner(api.create_app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    session = AiohttpSession(api=TelegramAPIServer.from_base(f"http://127.0.0.1:{port}"))
+    bot = Bot(token=config.BOT_TOKEN, session=session)
+    storage = SQLiteStorage() if args.fsm == "sqlite" else MemoryStorage()
+    dp = create_dispatcher(storage)
+    start_outbound_queue(bot)
+    polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, polling_timeout=1))
+
+    stats = Stats()
+    lags = []
+    lag_task = asyncio.create_task(sample_loop_lag(lags))
+    rng = random.Random(args.seed)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def user_task(index: int):
+        if args.ramp:
+            await asyncio.sleep(args.ramp * index / args.users)
+        async with semaphore:
+            user = VirtualUser(FIRST_USER_ID + index, api, stats, args, random.Random(rng.random()))
+            try:
+                await user.run()
+            except StepFailed as e:
+                stats.failures[e.step][e.reason] += 1
+            except Exception as e:
+                stats.failures["harness"][f"{type(e).__name__}: {e}"[:80]] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user_task(index) for index in range(args.users)))
+    duration = time.perf_counter() - started
+
+    lag_task.cancel()
+    # Хранилище FSM (в том числе SQLite) закрывает сам Dispatcher при остановке polling
+    await dp.stop_polling()
+    await asyncio.gather(polling, return_exceptions=True)
+    await stop_outbound_queue()
+    await bot.session.close()
+    await runner.cleanup()
+
+    return {
+        'users': args.users,
+        'concurrency': args.concurrency,
+        'fsm': args.fsm,
+        'duration_sec': round(duration, 3),
+        'updates': stats.updates,
+        'updates_per_sec': round(stats.updates / duration, 1) if duration else 0.0,
+        'completed': stats.completed,
+        'failed': sum(sum(reasons.values()) for reasons in stats.failures.values()),
+        'failures': {step: dict(reasons) for step, reasons in stats.failures.items()},
+        'documents_delivered': stats.documents,
+        'steps': {
+            step: {
+                'count': len(values),
+                'p50_ms': round(percentile(values, 0.5) * 1000, 1),
+                'p95_ms': round(percentile(values, 0.95) * 1000, 1),
+                'max_ms': round(max(values) * 1000, 1),
+            }
+            for step in STEPS for values in [stats.latencies.get(step)] if values
+        },
+        'bot_api_calls': dict(sorted(api.calls.items())),
+        'yookassa': {'created': yookassa.created, 'checked': yookassa.checked},
+        'event_loop_lag_ms': {
+            'p50': round(percentile(lags, 0.5) * 1000, 1),
+            'p95': round(percentile(lags, 0.95) * 1000, 1),
+            'max': round(max(lags, default=0.0) * 1000, 1),
+        },
+        'db': {
+            'queries': sum(item['calls'] for item in get_query_stats()),
+            'time_sec': round(sum(item['total'] for item in get_query_stats()), 3),
+            'top_statements': [
+                {'statement': item['statement'][:200], 'calls': item['calls'],
+                 'total_ms': round(item['total'] * 1000, 1), 'max_ms': round(item['max'] * 1000, 1)}
+                for item in get_query_stats(args.top)
+            ],
+            'handlers': [
+                {'handler': item['handler'], 'updates': item['updates'],
+                 'queries_per_update': round(item['avg'], 1), 'max_queries': item['max'],
+                 'db_ms_per_update': round(item['time'] / item['updates'] * 1000, 2) if item['updates'] else 0.0}
+                for item in get_handler_query_stats(args.top)
+            ],
+        },
+    }
+
+
+def print_report(report: dict, log_counter: LogCounter):
+    print(f"Пользователей: {report['users']} (одновременно до {report['concurrency']}), FSM: {report['fsm']}")
+    print(f"Длительность: {report['duration_sec']:.1f} сек, обновлений: {report['updates']} "
+          f"({report['updates_per_sec']:.1f}/сек)")
+    print(f"Завершили сценарий: {report['completed']}, с ошибкой: {report['failed']}, "
+          f"документов доставлено: {report['documents_delivered']}")
+    for step, reasons in report['failures'].items():
+        for reason, count in reasons.items():
+            print(f"  ошибка на шаге {step}: {reason} — {count}")
+
+    print(f"\n{'шаг':<16}{'n':>8}{'p50, мс':>12}{'p95, мс':>12}{'max, мс':>12}")
+    for step, stats in report['steps'].items():
+        print(f"{step:<16}{stats['count']:>8}{stats['p50_ms']:>12.1f}{stats['p95_ms']:>12.1f}{stats['max_ms']:>12.1f}")
+
+    lag = report['event_loop_lag_ms']
+    print(f"\nЗадержка event loop: p50 {lag['p50']} мс, p95 {lag['p95']} мс, max {lag['max']} мс")
+    db = report['db']
+    print(f"SQLite: запросов {db['queries']}, время {db['time_sec']} сек, "
+          f"ошибок «database is locked»: {log_counter.locked}")
+    print("Запросов на обновление по обработчикам:")
+    for item in db['handlers']:
+        print(f"  {item['handler']:<48} {item['queries_per_update']:>6} (макс. {item['max_queries']}), "
+              f"{item['db_ms_per_update']} мс")
+    print("Самые дорогие запросы:")
+    for item in db['top_statements']:
+        print(f"  {item['total_ms']:>10.1f} мс  x{item['calls']:<6} {item['statement'][:100]}")
+    if log_counter.by_level:
+        print(f"Логи бота: {dict(log_counter.by_level)}; ошибки по логгерам: {dict(log_counter.by_logger)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200, help="виртуальных пользователей")
+    parser.add_argument("--concurrency", type=int, default=50, help="одновременно активных пользователей")
+    parser.add_argument("--ramp", type=float, default=0.0, help="секунд на постепенный запуск пользователей")
+    parser.add_argument("--think", type=float, default=0.0, help="пауза пользователя между действиями до N сек")
+    parser.add_argument("--template", action="append", help="выбирать только этот шаблон (можно несколько раз)")
+    parser.add_argument("--items", type=int, default=3, help="элементов в повторяющихся группах")
+    parser.add_argument("--max-answers", type=int, default=300, help="предел действий на анкету")
+    parser.add_argument("--fsm", choices=("memory", "sqlite"), default="memory", help="хранилище состояний FSM")
+    parser.add_argument("--yookassa-latency", type=float, default=0.05, help="задержка вызова SDK ЮKassa, сек")
+    parser.add_argument("--pending-checks", type=int, default=0, help="сколько проверок платеж остается pending")
+    parser.add_argument("--check-interval", type=float, default=1.0, help="пауза между проверками оплаты, сек")
+    parser.add_argument("--outbound-rate", type=float, default=config.OUTBOUND_GLOBAL_RATE,
+                        help="лимит исходящих сообщений в секунду")
+    parser.add_argument("--per-chat-interval", type=float, default=config.OUTBOUND_PER_CHAT_INTERVAL,
+                        help="секунд между сообщениями в один чат")
+    parser.add_argument("--step-timeout", type=float, default=60.0, help="сколько ждать ответа бота на шаге, сек")
+    parser.add_argument("--top", type=int, default=10, help="строк в топах по БД")
+    parser.add_argument("--seed", type=int, default=2025)
+    parser.add_argument("--keep", action="store_true", help="не удалять временный каталог с базой и документами")
+    parser.add_argument("--output", help="сохранить отчет в JSON")
+    parser.add_argument("--verbose", action="store_true", help="выводить предупреждения и ошибки бота")
+    args = parser.parse_args()
+
+    # Пути подменяются до импорта бота: модули database создают таблицы при импорте
+    work_dir = Path(tempfile.mkdtemp(prefix="e2e_load_"))
+    prepare_environment(work_dir, args)
+
+    # bot.py при импорте настраивает вывод логов через очередь — заменяем на счетчик
+    import bot  # noqa: F401
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.setLevel(logging.WARNING)
+    log_counter = LogCounter()
+    root.addHandler(log_counter)
+    if args.verbose:
+        root.addHandler(logging.StreamHandler(sys.stderr))
+
+    try:
+        report = asyncio.run(run(args))
+    finally:
+        if args.keep:
+            print(f"Данные стенда: {work_dir}", file=sys.stderr)
+        else:
+            import shutil
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report['log_warnings'] = dict(log_counter.by_level)
+    report['db']['locked_errors'] = log_counter.locked
+    print_report(report, log_counter)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+    return 0 if report['completed'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""
+Нагрузочная проверка погашения промокодов.
+
+Запускает сотни параллельных вызовов apply_promocode для промокода с
+ограниченным числом использований и проверяет, что лимит не превышен:
+успешных погашений, значение used_count и записей в promocode_usage
+должно быть ровно max_uses.
+
+Работает на временной копии схемы БД, рабочая база не затрагивается.
+Требует тех же переменных окружения (.env), что и бот.
+
+    python benchmarks/promocode_redemption_load.py --attempts 500 --max-uses 25
+    python benchmarks/promocode_redemption_load.py --processes
+"""
+import argparse
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import config  # noqa: E402
+
+CODE = "LOADTEST"
+
+
+def _use_database(db_path: str):
+    config.DATABASE_PATH = Path(db_path)
+
+
+def _redeem(args: tuple) -> bool:
+    from database.promocodes import apply_promocode
+
+    user_id, order_id = args
+    return apply_promocode(CODE, user_id, order_id) is not None
+
+
+def prepare_database(db_path: str, max_uses: int):
+    _use_database(db_path)
+    from database import init_db
+    from database.promocodes import create_promocode
+
+    init_db()
+    if not create_promocode(CODE, 10, max_uses=max_uses):
+        raise RuntimeError("Не удалось создать тестовый промокод")
+
+
+def read_counters(db_path: str) -> tuple:
+    conn = sqlite3.connect(db_path)
+    try:
+        used_count = conn.execute("SELECT used_count FROM promocodes WHERE code = ?", (CODE,)).fetchone()[0]
+        usage_rows = conn.execute("""
+            SELECT COUNT(*) FROM promocode_usage pu
+            JOIN promocodes p ON p.id = pu.promocode_id
+            WHERE p.code = ?
+        """, (CODE,)).fetchone()[0]
+        return used_count, usage_rows
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--attempts", type=int, default=300, help="число параллельных погашений")
+    parser.add_argument("--max-uses", type=int, default=20, help="лимит использований промокода")
+    parser.add_argument("--workers", type=int, default=64, help="размер пула")
+    parser.add_argument("--processes", action="store_true", help="процессы вместо потоков")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = str(Path(tmp_dir) / "load.db")
+        prepare_database(db_path, args.max_uses)
+
+        # Каждое погашение — отдельный пользователь и заказ
+        jobs = [(100000 + i, 1 + i) for i in range(args.attempts)]
+        if args.processes:
+            executor = ProcessPoolExecutor(args.workers, initializer=_use_database, initargs=(db_path,))
+        else:
+            executor = ThreadPoolExecutor(args.workers)
+
+        started = time.perf_counter()
+        with executor:
+            results = list(executor.map(_redeem, jobs))
+        elapsed = time.perf_counter() - started
+
+        succeeded = sum(results)
+        used_count, usage_rows = read_counters(db_path)
+
+    print(f"Попыток: {args.attempts}, лимит: {args.max_uses}, "
+          f"режим: {'процессы' if args.processes else 'потоки'} x{args.workers}")
+    print(f"Успешных погашений: {succeeded}")
+    print(f"used_count: {used_count}, записей в promocode_usage: {usage_rows}")
+    print(f"Время: {elapsed:.2f} сек ({args.attempts / elapsed:.0f} попыток/сек)")
+
+    if succeeded == used_count == usage_rows == min(args.max_uses, args.attempts):
+        print("OK: лимит использований соблюден")
+        return 0
+    print("FAIL: лимит использований нарушен")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
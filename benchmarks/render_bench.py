@@ -0,0 +1,296 @@
+"""
+Бенчмарк генерации документов по всем шаблонам.
+
+Для каждого шаблона из documents/templates/{contracts,website} строятся
+правдоподобные ответы из полей example в questions.json (варианты choice —
+первый вариант, повторяющиеся группы — --items элементов), затем отдельно
+замеряются этапы: подготовка данных, render_template, convert_html_to_pdf
+и convert_html_to_docx. В отчете — p50/p95 по этапам, размер результата и
+пиковый RSS процесса.
+
+    python benchmarks/render_bench.py --repeat 10 --output render.json
+    python benchmarks/render_bench.py --isolate --baseline render.json
+    python benchmarks/render_bench.py --template rental_contract_2025 --stages render,pdf
+
+--isolate запускает каждый шаблон в отдельном процессе, чтобы пиковый RSS
+относился к одному шаблону. С --baseline результаты сравниваются с
+сохраненным отчетом: если p50 этапа вырос больше чем на --threshold
+(и больше чем на --min-delta мс), скрипт завершается с кодом 1.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import database  # noqa: E402,F401  (как в bot.py: database импортируется раньше services)
+from config import config  # noqa: E402
+from services.document_generator import (  # noqa: E402
+    convert_html_to_docx, convert_html_to_pdf, get_template_path, render_template
+)
+from services.template_catalog import catalog  # noqa: E402
+from services.template_registry import get_data_schema, get_flow, get_questions  # noqa: E402
+
+CATEGORIES = ('contracts', 'website')
+STAGES = ('prepare', 'render', 'pdf', 'docx')
+
+# Значения для вопросов без example
+DEFAULT_VALUES = {
+    'number': "150000",
+    'date': "15.03.2025",
+    'text': "Пример",
+}
+
+
+def _example(question: dict) -> str:
+    if question.get('example'):
+        return str(question['example'])
+    if 'date' in question.get('step', '').lower():
+        return DEFAULT_VALUES['date']
+    return DEFAULT_VALUES.get(question.get('type'), DEFAULT_VALUES['text'])
+
+
+def build_answers(template_name: str, items: int = 5) -> dict:
+    """Ответы, которые дал бы пользователь, отвечая примерами на каждый заданный вопрос."""
+    questions = get_questions(template_name) or []
+    flow = get_flow(template_name)
+    answers = {}
+    index = flow.next_index(answers, 0)
+    while index < len(questions):
+        question = questions[index]
+        question_type = question.get('type')
+        options = question.get('options') or []
+        if question_type == 'choice' and options:
+            answers[str(index)] = options[0]
+        elif question_type == 'multi_select' and options:
+            answers[str(index)] = options[:2]
+        elif question_type == 'repeat':
+            answers[str(index)] = [
+                {field['step']: _example(field) for field in question.get('fields', [])}
+                for _ in range(items)
+            ]
+        else:
+            answers[str(index)] = _example(question)
+        index = flow.next_index(answers, index + 1)
+    return answers
+
+
+def percentile(values: list, fraction: float) -> float:
+    """Перцентиль с линейной интерполяцией."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def peak_rss_kb() -> int:
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # В macOS ru_maxrss в байтах, в Linux — в килобайтах
+    return usage // 1024 if platform.system() == 'Darwin' else usage
+
+
+def _timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def bench_template(template_name: str, stages: tuple, repeat: int, warmup: int, items: int, out_dir: Path) -> dict:
+    if catalog.get(template_name) is None:
+        return {'error': "шаблона нет в каталоге (проверьте metadata.json)"}
+    template_path = get_template_path(template_name, "autogen")
+    if template_path is None:
+        return {'error': "шаблон autogen не найден"}
+
+    answers = build_answers(template_name, items)
+    schema = get_data_schema(template_name)
+    timings = {stage: [] for stage in stages}
+    sizes = {}
+    rss_before = peak_rss_kb()
+    pdf_path = str(out_dir / f"{template_name}.pdf")
+    docx_path = str(out_dir / f"{template_name}.docx")
+
+    for iteration in range(warmup + repeat):
+        measured = iteration >= warmup
+        if 'prepare' in stages:
+            _, elapsed = _timed(schema.prepare, answers)
+            if measured:
+                timings['prepare'].append(elapsed)
+        # HTML нужен для конвертации, поэтому рендерится всегда
+        html, elapsed = _timed(render_template, template_path, answers)
+        if measured and 'render' in stages:
+            timings['render'].append(elapsed)
+        sizes['html'] = len(html.encode('utf-8'))
+        for stage, converter, path in (('pdf', convert_html_to_pdf, pdf_path), ('docx', convert_html_to_docx, docx_path)):
+            if stage not in stages:
+                continue
+            ok, elapsed = _timed(converter, html, path)
+            if not ok:
+                return {'error': f"не удалось создать {stage}"}
+            if measured:
+                timings[stage].append(elapsed)
+            sizes[stage] = os.path.getsize(path)
+
+    rss_after = peak_rss_kb()
+    return {
+        'answers': len(answers),
+        'stages': {
+            stage: {
+                'p50_ms': round(percentile(values, 0.5) * 1000, 3),
+                'p95_ms': round(percentile(values, 0.95) * 1000, 3),
+                'min_ms': round(min(values) * 1000, 3),
+                'max_ms': round(max(values) * 1000, 3),
+            }
+            for stage, values in timings.items() if values
+        },
+        'size_bytes': sizes,
+        'peak_rss_kb': rss_after,
+        'rss_growth_kb': rss_after - rss_before,
+    }
+
+
+def list_templates(selected: list = None) -> list:
+    """Все каталоги шаблонов на диске, включая те, что не попали в каталог бота."""
+    names = [
+        template_dir.name
+        for category in CATEGORIES
+        for template_dir in sorted((config.TEMPLATES_PATH / category).iterdir())
+        if (template_dir / "questions.json").exists()
+    ]
+    if selected:
+        unknown = set(selected) - set(names)
+        if unknown:
+            raise SystemExit(f"Неизвестные шаблоны: {', '.join(sorted(unknown))}")
+        return [name for name in names if name in selected]
+    return names
+
+
+def run_isolated(template_name: str, args) -> dict:
+    """Один шаблон в отдельном процессе: пиковый RSS не смешивается с другими шаблонами."""
+    command = [
+        sys.executable, __file__, "--template", template_name, "--json",
+        "--repeat", str(args.repeat), "--warmup", str(args.warmup),
+        "--items", str(args.items), "--stages", ",".join(args.stages),
+    ]
+    completed = subprocess.run(command, capture_output=True, text=True)
+    try:
+        return json.loads(completed.stdout)['templates'][template_name]
+    except (ValueError, KeyError):
+        stderr = completed.stderr.strip()
+        return {'error': stderr.splitlines()[-1] if stderr else f"процесс завершился с кодом {completed.returncode}"}
+
+
+def compare(results: dict, baseline: dict, threshold: float, min_delta_ms: float) -> list:
+    """Регрессии: (шаблон, этап, было p50, стало p50) для этапов, ставших медленнее порога."""
+    regressions = []
+    for template_name, result in results['templates'].items():
+        old = baseline.get('templates', {}).get(template_name)
+        if not old or 'stages' not in old or 'stages' not in result:
+            continue
+        for stage, stats in result['stages'].items():
+            old_stats = old['stages'].get(stage)
+            if not old_stats:
+                continue
+            before, after = old_stats['p50_ms'], stats['p50_ms']
+            if after > before * (1 + threshold) and after - before > min_delta_ms:
+                regressions.append((template_name, stage, before, after))
+    return regressions
+
+
+def print_table(results: dict):
+    stages = results['stages']
+    header = f"{'шаблон':<36}" + "".join(f"{stage + ' p50/p95, мс':>24}" for stage in stages) + f"{'PDF, КБ':>10}{'RSS, МБ':>10}"
+    print(header)
+    for template_name, result in results['templates'].items():
+        if 'error' in result:
+            print(f"{template_name:<36}  ошибка: {result['error']}")
+            continue
+        row = f"{template_name:<36}"
+        for stage in stages:
+            stats = result['stages'].get(stage)
+            row += f"{stats['p50_ms']:>12.1f}/{stats['p95_ms']:<11.1f}" if stats else f"{'-':>24}"
+        pdf_size = result['size_bytes'].get('pdf')
+        row += f"{pdf_size / 1024:>10.1f}" if pdf_size else f"{'-':>10}"
+        row += f"{result['peak_rss_kb'] / 1024:>10.1f}"
+        print(row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--template", action="append", help="только этот шаблон (можно несколько раз)")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"этапы через запятую: {','.join(STAGES)}")
+    parser.add_argument("--repeat", type=int, default=5, help="замеров на шаблон")
+    parser.add_argument("--warmup", type=int, default=1, help="прогревочных прогонов (не учитываются)")
+    parser.add_argument("--items", type=int, default=5, help="элементов в повторяющихся группах")
+    parser.add_argument("--isolate", action="store_true", help="каждый шаблон в отдельном процессе")
+    parser.add_argument("--output", help="сохранить отчет в JSON (его можно использовать как --baseline)")
+    parser.add_argument("--baseline", help="сравнить с сохраненным отчетом")
+    parser.add_argument("--threshold", type=float, default=0.2, help="допустимый рост p50 (доля)")
+    parser.add_argument("--min-delta", type=float, default=5.0, help="игнорировать рост p50 меньше стольких мс")
+    parser.add_argument("--json", action="store_true", help="вывести отчет JSON в stdout вместо таблицы")
+    parser.add_argument("--verbose", action="store_true", help="не заглушать логи генератора")
+    args = parser.parse_args()
+
+    args.stages = tuple(stage for stage in args.stages.split(",") if stage)
+    unknown_stages = set(args.stages) - set(STAGES)
+    if unknown_stages:
+        parser.error(f"неизвестные этапы: {', '.join(sorted(unknown_stages))}")
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+
+    results = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'repeat': args.repeat,
+        'items': args.items,
+        'stages': list(args.stages),
+        'templates': {},
+    }
+    with tempfile.TemporaryDirectory(prefix="render_bench_") as out_dir:
+        for template_name in list_templates(args.template):
+            if args.isolate:
+                results['templates'][template_name] = run_isolated(template_name, args)
+            else:
+                try:
+                    results['templates'][template_name] = bench_template(
+                        template_name, args.stages, args.repeat, args.warmup, args.items, Path(out_dir)
+                    )
+                except Exception as e:
+                    results['templates'][template_name] = {'error': f"{type(e).__name__}: {e}"}
+            if not args.json:
+                print(f"  {template_name}: готово", file=sys.stderr)
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        print_table(results)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding='utf-8')
+
+    failed = [name for name, result in results['templates'].items() if 'error' in result]
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding='utf-8'))
+        regressions = compare(results, baseline, args.threshold, args.min_delta)
+        for template_name, stage, before, after in regressions:
+            print(f"РЕГРЕССИЯ {template_name} {stage}: p50 {before:.1f} -> {after:.1f} мс", file=sys.stderr)
+        if not regressions:
+            print(f"Регрессий относительно {args.baseline} нет", file=sys.stderr)
+        if regressions:
+            return 1
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
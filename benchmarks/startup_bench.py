@@ -0,0 +1,276 @@
+"""
+Профиль холодного запуска бота.
+
+1. `python -X importtime -c "import bot"` в отдельном процессе: суммарное
+   время импорта, топ модулей по собственному и накопленному времени,
+   время по пакетам верхнего уровня. Если при запуске импортируются
+   библиотеки рендеринга (WeasyPrint, Jinja2, python-docx), это отмечается
+   отдельно — они должны загружаться при первом документе.
+2. Время до первого обновления: bot.main() запускается в отдельном процессе
+   против локального поддельного Bot API (из e2e_load.py) с временной базой;
+   замеряется время от запуска процесса до первого getUpdates и до ответа
+   бота на /start.
+
+    python benchmarks/startup_bench.py
+    python benchmarks/startup_bench.py --repeat 5 --top 30 --output startup.json
+    python benchmarks/startup_bench.py --skip-first-update
+
+С --target скрипт завершается с кодом 1, если медиана времени до ответа
+на первое обновление больше заданного числа секунд.
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+BENCHMARKS = Path(__file__).resolve().parent
+# Модули бота здесь не импортируются: импорт меряется в отдельных процессах
+sys.path.insert(0, str(ROOT))
+
+# Библиотеки, которые не должны импортироваться при запуске бота
+RENDERING_MODULES = ('weasyprint', 'jinja2', 'docx', 'mammoth', 'bs4', 'cairocffi', 'pydyf')
+
+IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+
+# Поддельные учетные данные: дочерний процесс говорит только с локальным стендом
+CHILD_ENV = {
+    "BOT_TOKEN": "123456:LOADTEST",
+    "BOT_MODE": "polling",
+    "YOOKASSA_SHOP_ID": "loadtest",
+    "YOOKASSA_SECRET_KEY": "loadtest",
+    "METRICS_ENABLED": "false",
+    "WEBAPP_ENABLED": "false",
+    "LOG_FILE_ENABLED": "false",
+    "LOG_CONSOLE_ENABLED": "false",
+    "FSM_STORAGE": "memory",
+    "TEMPLATES_WATCH_INTERVAL": "0",
+}
+
+
+def child_env(extra: dict = None) -> dict:
+    env = dict(os.environ)
+    env.update(CHILD_ENV)
+    env.setdefault("ADMIN_IDS", "1")
+    env.setdefault("SUPPORT_CHAT_ID", "-1000000000001")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(ROOT), env.get("PYTHONPATH")]))
+    env.update(extra or {})
+    return env
+
+
+# ---------------------------------------------------------------- importtime
+
+
+def parse_importtime(stderr: str) -> list:
+    """Строки отчета -X importtime: [{'module', 'self_us', 'cumulative_us', 'depth'}]."""
+    entries = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            entries.append({'module': module, 'self_us': int(self_us),
+                            'cumulative_us': int(cumulative_us), 'depth': len(indent) // 2})
+    return entries
+
+
+def measure_imports(target: str) -> dict:
+    command = [sys.executable, "-X", "importtime", "-c", f"import {target}"]
+    started = time.perf_counter()
+    completed = subprocess.run(command, cwd=ROOT, env=child_env(), capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    entries = parse_importtime(completed.stderr)
+    if completed.returncode != 0 or not entries:
+        stderr = completed.stderr.strip().splitlines()
+        raise SystemExit(f"Импорт {target} завершился ошибкой: {stderr[-1] if stderr else completed.returncode}")
+
+    total = next((entry['cumulative_us'] for entry in entries if entry['module'] == target), 0)
+    by_package = defaultdict(int)
+    for entry in entries:
+        by_package[entry['module'].split('.')[0]] += entry['self_us']
+    return {
+        'wall_s': wall,
+        'total_us': total,
+        'modules': len(entries),
+        'entries': entries,
+        'by_package': dict(by_package),
+        'rendering_imported': sorted({
+            entry['module'].split('.')[0] for entry in entries
+            if entry['module'].split('.')[0] in RENDERING_MODULES
+        }),
+    }
+
+
+def summarize_imports(runs: list, top: int) -> dict:
+    """Медианы по нескольким запускам: время импорта, топ модулей и пакетов."""
+    self_times = defaultdict(list)
+    cumulative_times = defaultdict(list)
+    package_times = defaultdict(list)
+    for run in runs:
+        for entry in run['entries']:
+            self_times[entry['module']].append(entry['self_us'])
+            cumulative_times[entry['module']].append(entry['cumulative_us'])
+        for package, value in run['by_package'].items():
+            package_times[package].append(value)
+
+    def top_of(values: dict) -> list:
+        medians = {name: statistics.median(times) for name, times in values.items()}
+        return [{'name': name, 'ms': round(value / 1000, 2)}
+                for name, value in sorted(medians.items(), key=lambda item: item[1], reverse=True)[:top]]
+
+    return {
+        'total_ms': round(statistics.median(run['total_us'] for run in runs) / 1000, 1),
+        'process_wall_ms': round(statistics.median(run['wall_s'] for run in runs) * 1000, 1),
+        'modules': runs[-1]['modules'],
+        'top_self': top_of(self_times),
+        'top_cumulative': top_of(cumulative_times),
+        'top_packages': top_of(package_times),
+        'rendering_imported': runs[-1]['rendering_imported'],
+    }
+
+
+# ---------------------------------------------------------------- первое обновление
+
+
+def run_child(work_dir: str):
+    """Дочерний процесс: временная база и bot.main() против поддельного Bot API."""
+    from config import config
+
+    work = Path(work_dir)
+    config.DATABASE_DIR = work
+    config.DATABASE_PATH = work / "bot.db"
+    config.FSM_DATABASE_PATH = work / "fsm.db"
+    config.GENERATED_DOCUMENTS_PATH = work / "generated"
+    config.TEMP_PATH = work / "temp"
+
+    import bot
+    asyncio.run(bot.main())
+
+
+async def measure_first_update(timeout: float) -> dict:
+    sys.path.insert(0, str(BENCHMARKS))
+    os.environ.update(CHILD_ENV)
+    from aiohttp import web
+    from e2e_load import FakeBotAPI
+
+    class TimedBotAPI(FakeBotAPI):
+        first_get_updates = None
+
+        async def get_updates(self, params: dict) -> list:
+            if self.first_get_updates is None:
+                self.first_get_updates = time.perf_counter()
+            return await super().get_updates(params)
+
+    api = TimedBotAPI()
+    runner = web.AppRunner(api.create_app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    user_id = 7_000_000_001
+    user = {"id": user_id, "is_bot": False, "first_name": "Startup"}
+    # Обновление уже ждет в очереди: бот получит его первым же getUpdates
+    api.push_update({"message": {
+        "message_id": 1, "date": int(time.time()), "text": "/start", "from": user,
+        "chat": {"id": user_id, "type": "private", "first_name": "Startup"},
+        "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+    }})
+
+    with tempfile.TemporaryDirectory(prefix="startup_bench_") as work_dir:
+        env = child_env({"TELEGRAM_API_URL": f"http://127.0.0.1:{port}", "RENDER_PRELOAD_DELAY": "-1"})
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, __file__, "--child", work_dir],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+        )
+        try:
+            event, _ = await api.chats[user_id].wait_for(lambda event: event["kind"] == "message", 0, timeout)
+            replied = time.perf_counter()
+        finally:
+            process.terminate()
+            try:
+                _, stderr = await asyncio.to_thread(process.communicate, timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                stderr = ""
+            await runner.cleanup()
+
+    if event is None:
+        lines = (stderr or "").strip().splitlines()
+        raise SystemExit(f"Бот не ответил на /start за {timeout} сек: {lines[-1] if lines else 'нет вывода'}")
+    return {
+        'first_get_updates_s': (api.first_get_updates - started) if api.first_get_updates else None,
+        'first_reply_s': replied - started,
+    }
+
+
+# ---------------------------------------------------------------- отчет
+
+
+def print_report(report: dict):
+    imports = report['imports']
+    print(f"Импорт bot: {imports['total_ms']:.0f} мс (процесс целиком {imports['process_wall_ms']:.0f} мс), "
+          f"модулей: {imports['modules']}")
+    if imports['rendering_imported']:
+        print(f"  ВНИМАНИЕ: при запуске импортируются библиотеки рендеринга: {', '.join(imports['rendering_imported'])}")
+    for title, key in (("Пакеты (собственное время модулей)", 'top_packages'),
+                       ("Модули по собственному времени", 'top_self'),
+                       ("Модули по накопленному времени", 'top_cumulative')):
+        print(f"\n{title}:")
+        for item in imports[key]:
+            print(f"  {item['ms']:>10.1f} мс  {item['name']}")
+
+    first_update = report.get('first_update')
+    if first_update:
+        print("\nВремя до первого обновления (медиана по запускам):")
+        print(f"  первый getUpdates: {first_update['first_get_updates_s']:.2f} сек")
+        print(f"  ответ на /start:   {first_update['first_reply_s']:.2f} сек "
+              f"(все запуски: {', '.join(f'{value:.2f}' for value in first_update['runs'])})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="запусков каждого замера")
+    parser.add_argument("--top", type=int, default=20, help="строк в топах модулей")
+    parser.add_argument("--module", default="bot", help="что импортировать для -X importtime")
+    parser.add_argument("--skip-first-update", action="store_true", help="только профиль импорта")
+    parser.add_argument("--timeout", type=float, default=60.0, help="сколько ждать ответа бота, сек")
+    parser.add_argument("--target", type=float, help="допустимое время до ответа на первое обновление, сек")
+    parser.add_argument("--output", help="сохранить отчет в JSON")
+    parser.add_argument("--child", metavar="WORK_DIR", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child)
+        return 0
+
+    report = {'imports': summarize_imports([measure_imports(args.module) for _ in range(args.repeat)], args.top)}
+    if not args.skip_first_update:
+        runs = [asyncio.run(measure_first_update(args.timeout)) for _ in range(args.repeat)]
+        report['first_update'] = {
+            'first_get_updates_s': statistics.median(run['first_get_updates_s'] or 0.0 for run in runs),
+            'first_reply_s': statistics.median(run['first_reply_s'] for run in runs),
+            'runs': [run['first_reply_s'] for run in runs],
+        }
+
+    print_report(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+
+    if args.target is not None and 'first_update' in report:
+        if report['first_update']['first_reply_s'] > args.target:
+            print(f"Время до первого ответа больше {args.target} сек", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""
+Микробенчмарк проверки ответов.
+
+Сравнивает validate_field (валидатор ищется по параметрам вопроса),
+заранее скомпилированные валидаторы из реестра и validate_many на
+вопросах всех шаблонов, а также parse_date с перебором форматов strptime.
+
+    python benchmarks/validators_bench.py --repeat 20000
+"""
+import argparse
+import sys
+import timeit
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import database  # noqa: E402,F401  (как в bot.py: database импортируется раньше services)
+from services.validators import (  # noqa: E402
+    DATE_FORMATS, compile_validators, parse_date, validate_field, validate_many
+)
+
+# Значения, покрывающие все виды проверок
+SAMPLE_VALUES = {
+    'number': "12500.50",
+    'email': "client@example.com",
+    'phone': "+7 (912) 345-67-89",
+    'date': "15.03.2025",
+    'inn': "7707083893",
+    'ogrn': "1027700132195",
+    'okved': "62.01",
+    'text': "ООО «Ромашка»",
+}
+
+SAMPLE_QUESTIONS = [
+    {'step': 'amount', 'type': 'number', 'label': 'Сумма', 'required': True},
+    {'step': 'email', 'type': 'email', 'label': 'Email'},
+    {'step': 'phone', 'type': 'phone', 'label': 'Телефон'},
+    {'step': 'contract_date', 'type': 'date', 'label': 'Дата'},
+    {'step': 'customer_inn', 'type': 'text', 'label': 'ИНН'},
+    {'step': 'customer_ogrn', 'type': 'text', 'label': 'ОГРН'},
+    {'step': 'okved', 'type': 'okved', 'label': 'ОКВЭД'},
+    {'step': 'customer_name', 'type': 'text', 'label': 'Наименование', 'required': True},
+]
+
+DATE_SAMPLES = ["15.03.2025", "2025-03-15", "2025-03-15 12:30:00", "15/03/2025", "31.02.2025", "завтра"]
+
+
+def _strptime_loop(value):
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(str(value), date_format)
+        except (ValueError, TypeError):
+            continue
+    return None
+
+
+def _sample_value(question: dict) -> str:
+    step = question.get('step', '')
+    for kind in ('inn', 'ogrn', 'okved'):
+        if kind in step:
+            return SAMPLE_VALUES[kind]
+    return SAMPLE_VALUES.get(question.get('type'), SAMPLE_VALUES['text'])
+
+
+def load_all_questions() -> list:
+    from services.document_service import load_questions
+    from services.template_catalog import catalog
+
+    questions = []
+    for section in ('contracts', 'website'):
+        for entry in catalog.get_category(section):
+            questions.extend(load_questions(entry['template_name']) or [])
+    return questions
+
+
+def report(name: str, seconds: float, calls: int):
+    print(f"{name:<40} {seconds * 1e6 / calls:8.2f} мкс/вызов")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5000, help="число повторов для каждого замера")
+    parser.add_argument("--templates", action="store_true", help="вопросы всех шаблонов вместо встроенного набора")
+    args = parser.parse_args()
+
+    questions = load_all_questions() if args.templates else SAMPLE_QUESTIONS
+    answers = {str(index): _sample_value(question) for index, question in enumerate(questions)}
+    validators = compile_validators(questions)
+    calls = args.repeat * len(questions)
+    print(f"Вопросов: {len(questions)}, повторов: {args.repeat}")
+
+    seconds = timeit.timeit(
+        lambda: [validate_field(question, answers[str(index)]) for index, question in enumerate(questions)],
+        number=args.repeat
+    )
+    report("validate_field", seconds, calls)
+
+    seconds = timeit.timeit(
+        lambda: [validator(answers[str(index)]) for index, validator in enumerate(validators)],
+        number=args.repeat
+    )
+    report("скомпилированный валидатор", seconds, calls)
+
+    seconds = timeit.timeit(lambda: validate_many(questions, answers, validators), number=args.repeat)
+    report("validate_many", seconds, calls)
+
+    date_calls = args.repeat * len(DATE_SAMPLES)
+    for value in DATE_SAMPLES:
+        if parse_date(value) != _strptime_loop(value):
+            print(f"FAIL: parse_date расходится с strptime на {value!r}")
+            return 1
+    report("strptime (перебор форматов)",
+           timeit.timeit(lambda: [_strptime_loop(value) for value in DATE_SAMPLES], number=args.repeat), date_calls)
+    report("parse_date",
+           timeit.timeit(lambda: [parse_date(value) for value in DATE_SAMPLES], number=args.repeat), date_calls)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
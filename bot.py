@@ -3,9 +3,12 @@ import asyncio
 import sys
 import datetime
 from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.fsm.storage.memory import MemoryStorage
 from config import config
 from database import init_db
+from database.fsm_storage import SQLiteStorage
 from handlers import (
     base,
     catalog,
@@ -22,69 +25,145 @@ from handlers import (
 )
 from database.promocodes import initialize_default_promocodes, create_seasonal_promocode
 from services.notifications import notify_support_about_new_promocode
-from services.background_tasks import send_daily_stats
+from services.background_tasks import send_daily_stats, sweep_storage
+from services.broadcast import resume_unfinished_broadcasts
+from services.outbound import start_outbound_queue, stop_outbound_queue
+from services.webhook_server import run_webhook, create_web_app, start_web_app, start_metrics_server
+from services.metrics import monitor_event_loop_lag, get_metrics_sink, PrometheusSink
+from services.logging_setup import setup_logging, get_logging_metrics
+from services.handler_metrics import setup_handler_metrics
+from services.health import TelegramPollMiddleware, get_health_metrics
+from services.template_catalog import catalog as template_catalog, watch_templates
+from services.document_generator import preload_rendering_stack
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    stream=sys.stdout
-)
+# Настройка логирования: файл и stdout пишет фоновый поток
+setup_logging()
 logger = logging.getLogger('doc_bot')
 
 
-async def main():
-    """Основная функция запуска бота"""
-    try:
-        # Инициализация базы данных
-        init_db()
-        logger.info("База данных инициализирована")
+def create_dispatcher(storage=None) -> Dispatcher:
+    """Диспетчер со всеми роутерами и middleware (используется и нагрузочным стендом)."""
+    dp = Dispatcher(storage=storage or MemoryStorage())
+
+    # Регистрация роутеров
+    dp.include_router(base.router)
+    dp.include_router(catalog.router)
+    dp.include_router(filling.router)
+    dp.include_router(payment.router)
+    dp.include_router(order_history.router)
+    dp.include_router(admin.router)
+    dp.include_router(feedback.router)
+    dp.include_router(partners.router)
+    dp.include_router(templates.router)
+    dp.include_router(drafts.router)
+    dp.include_router(support.router)
+    dp.include_router(utils.router)
+
+    # Метрики обработчиков и запросов к БД
+    if config.METRICS_ENABLED or config.DB_TRACE_ENABLED:
+        setup_handler_metrics(dp)
+    return dp
+
 
-        # Инициализация промокодов
-        initialize_default_promocodes()
-        logger.info("Базовые промокоды инициализированы")
+def bootstrap_storage():
+    """База данных, базовые промокоды и каталог шаблонов (синхронно, выполняется в потоке)."""
+    init_db()
+    logger.info("База данных инициализирована")
 
-        # Проверяем, не начался ли новый месяц
+    initialize_default_promocodes()
+    logger.info("Базовые промокоды инициализированы")
+
+    # Каталог шаблонов строится один раз при запуске
+    template_catalog.load()
+
+
+async def check_seasonal_promocode(bot: Bot):
+    """Первого числа месяца создает сезонный промокод и сообщает о нем администраторам."""
+    try:
         today = datetime.datetime.now()
-        if today.day == 1:
-            logger.info("Сегодня первое число месяца, создаем новый сезонный промокод")
-            seasonal_promo = create_seasonal_promocode()
-            if seasonal_promo:
-                # Уведомляем администраторов
-                await notify_support_about_new_promocode(seasonal_promo['code'], seasonal_promo['discount'])
-        else:
+        if today.day != 1:
             logger.info("Сегодня не первое число месяца, сезонный промокод не создается")
+            return
+
+        logger.info("Сегодня первое число месяца, создаем новый сезонный промокод")
+        seasonal_promo = create_seasonal_promocode()
+        if seasonal_promo:
+            # Уведомляем администраторов
+            await notify_support_about_new_promocode(
+                bot=bot,
+                promocode_code=seasonal_promo['code'],
+                discount=seasonal_promo['discount']
+            )
+    except Exception as e:
+        logger.error(f"Ошибка при создании сезонного промокода: {e}", exc_info=True)
+
+
+async def preload_rendering(delay: float):
+    """Загружает WeasyPrint в потоке, когда бот уже принимает обновления."""
+    await asyncio.sleep(delay)
+    await asyncio.to_thread(preload_rendering_stack)
+
+
+async def main():
+    """Основная функция запуска бота"""
+    try:
+        # База данных и каталог готовятся в потоке, пока бот подключается к Telegram
+        bootstrap = asyncio.create_task(asyncio.to_thread(bootstrap_storage))
 
         # Создание бота и диспетчера
-        bot = Bot(token=config.BOT_TOKEN)
-        storage = MemoryStorage()
-        dp = Dispatcher(storage=storage)
+        session = AiohttpSession(api=TelegramAPIServer.from_base(config.TELEGRAM_API_URL)) if config.TELEGRAM_API_URL else None
+        bot = Bot(token=config.BOT_TOKEN, session=session)
+        # Время последнего успешного getUpdates для /health и /ready
+        bot.session.middleware(TelegramPollMiddleware())
+        storage = SQLiteStorage() if config.FSM_STORAGE == "sqlite" else MemoryStorage()
+        dp = create_dispatcher(storage)
 
         # Сохраняем бота в глобальную переменную для использования в других модулях
         sys.modules['bot'] = type('bot', (), {'bot': bot})()
 
-        # Регистрация роутеров
-        dp.include_router(base.router)
-        dp.include_router(catalog.router)
-        dp.include_router(filling.router)
-        dp.include_router(payment.router)
-        dp.include_router(order_history.router)
-        dp.include_router(admin.router)
-        dp.include_router(feedback.router)
-        dp.include_router(partners.router)
-        dp.include_router(templates.router)
-        dp.include_router(drafts.router)
-        dp.include_router(support.router)
-        dp.include_router(utils.router)
-
-        # Запуск фоновых задач
+        # Все исходящие сообщения идут через общую очередь с лимитами
+        start_outbound_queue(bot)
+        dp.shutdown.register(stop_outbound_queue)
+
+        if config.BOT_MODE == "polling":
+            await asyncio.gather(bootstrap, bot.delete_webhook(drop_pending_updates=config.DROP_PENDING_UPDATES))
+        else:
+            await bootstrap
+
+        # Запуск фоновых задач (задержка event loop нужна и метрикам, и /ready)
         logger.info("Запуск фоновых задач...")
+        asyncio.create_task(monitor_event_loop_lag())
+        asyncio.create_task(check_seasonal_promocode(bot))
         asyncio.create_task(send_daily_stats())
+        if config.STORAGE_SWEEP_INTERVAL_HOURS > 0:
+            asyncio.create_task(sweep_storage())
+        if config.TEMPLATES_WATCH_INTERVAL > 0:
+            asyncio.create_task(watch_templates())
+        if config.RENDER_PRELOAD_DELAY >= 0:
+            asyncio.create_task(preload_rendering(config.RENDER_PRELOAD_DELAY))
+        if config.METRICS_ENABLED:
+            sink = get_metrics_sink()
+            if isinstance(sink, PrometheusSink):
+                sink.add_collector(get_logging_metrics)
+                sink.add_collector(get_health_metrics)
+            metrics_runner = await start_metrics_server()
+            dp.shutdown.register(metrics_runner.cleanup)
+        resumed = resume_unfinished_broadcasts(bot)
+        if resumed:
+            logger.info(f"Возобновлено незавершенных рассылок: {resumed}")
 
         # Запуск бота
-        logger.info("Запуск бота...")
-        await bot.delete_webhook(drop_pending_updates=True)
-        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+        if config.BOT_MODE == "webhook":
+            logger.info("Запуск бота в режиме webhook...")
+            await run_webhook(bot, dp)
+        else:
+            logger.info("Запуск бота в режиме polling...")
+            runner = await start_web_app(create_web_app(bot)) if config.WEBAPP_ENABLED else None
+            try:
+                await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+            finally:
+                if runner:
+                    await runner.cleanup()
 
     except Exception as e:
         logger.critical(f"Критическая ошибка при запуске бота: {e}", exc_info=True)
@@ -15,6 +15,43 @@ class Config:
     ADMIN_IDS = [int(id) for id in os.getenv("ADMIN_IDS", "").split(",") if id.strip()]
     BOT_USERNAME = os.getenv("BOT_USERNAME", "your_bot_username")
 
+    # Режим получения обновлений: polling или webhook
+    BOT_MODE = os.getenv("BOT_MODE", "polling").strip().lower()
+    DROP_PENDING_UPDATES = os.getenv("DROP_PENDING_UPDATES", "false").lower() == "true"  # сбрасывать очередь обновлений при старте
+    WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "").rstrip("/")  # публичный адрес, например https://bot.example.com
+    WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+    WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")  # проверяется в заголовке X-Telegram-Bot-Api-Secret-Token
+    WEBHOOK_MAX_CONCURRENT_UPDATES = int(os.getenv("WEBHOOK_MAX_CONCURRENT_UPDATES", "100"))  # обновлений в обработке одновременно
+    WEBAPP_HOST = os.getenv("WEBAPP_HOST", "0.0.0.0")
+    WEBAPP_PORT = int(os.getenv("WEBAPP_PORT", "8080"))
+    WEBAPP_ENABLED = os.getenv("WEBAPP_ENABLED", "false").lower() == "true"  # HTTP-сервер (ЮKassa, health) в режиме polling
+    YOOKASSA_WEBHOOK_PATH = os.getenv("YOOKASSA_WEBHOOK_PATH", "/yookassa/webhook")  # HTTP-уведомления ЮKassa
+    HEALTH_PATH = os.getenv("HEALTH_PATH", "/health")
+    READY_PATH = os.getenv("READY_PATH", "/ready")  # 503, если процесс перегружен (рендеринг, event loop, БД, диск)
+    HEALTH_CACHE_SECONDS = float(os.getenv("HEALTH_CACHE_SECONDS", "5"))  # как часто /health и /ready обращаются к БД
+    HEALTH_DB_TIMEOUT = float(os.getenv("HEALTH_DB_TIMEOUT", "1"))  # секунд ожидания блокировки SQLite при проверке
+    HEALTH_MAX_LOOP_LAG = float(os.getenv("HEALTH_MAX_LOOP_LAG", "1"))  # задержка event loop, при которой /ready отвечает 503
+    HEALTH_MIN_FREE_DISK_MB = int(os.getenv("HEALTH_MIN_FREE_DISK_MB", "200"))  # свободного места не меньше
+    HEALTH_POLL_STALE_SECONDS = float(os.getenv("HEALTH_POLL_STALE_SECONDS", "90"))  # polling: столько без успешного getUpdates — не готов
+    TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "")  # свой сервер Bot API (локальный telegram-bot-api), пусто — api.telegram.org
+    RENDER_PRELOAD_DELAY = float(os.getenv("RENDER_PRELOAD_DELAY", "5"))  # через сколько секунд после запуска загрузить WeasyPrint, <0 — при первом документе
+    RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "2"))  # потоков генерации документов
+    RENDER_READY_MAX_QUEUE = int(os.getenv("RENDER_READY_MAX_QUEUE", "4"))  # документов в очереди при занятых потоках, после которых /ready отвечает 503
+
+    # Метрики (текстовый формат Prometheus)
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")  # по умолчанию /metrics доступен только локально
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+    METRICS_PATH = os.getenv("METRICS_PATH", "/metrics")
+    LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "1"))  # секунд между замерами задержки event loop
+    LOOP_LAG_WARNING = float(os.getenv("LOOP_LAG_WARNING", "0.5"))  # задержка, после которой пишется предупреждение
+
+    # Профилирование по команде /profile в чате поддержки
+    PROFILE_MAX_SECONDS = int(os.getenv("PROFILE_MAX_SECONDS", "120"))  # максимальная длительность семплирования стеков
+    PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "10"))  # интервал между снимками стеков
+    PROFILE_MAX_DOCUMENT_CALLS = int(os.getenv("PROFILE_MAX_DOCUMENT_CALLS", "20"))  # максимум профилируемых вызовов generate_document
+    PROFILE_STATS_LIMIT = int(os.getenv("PROFILE_STATS_LIMIT", "40"))  # строк в отчете cProfile
+
     # Настройки каналов и чатов
     REVIEWS_CHANNEL_ID = int(os.getenv("REVIEWS_CHANNEL_ID", "-1000000000000"))
     TELEGRAM_CHANNEL = os.getenv("TELEGRAM_CHANNEL", "@your_channel")
@@ -23,15 +60,48 @@ class Config:
     # Пути к файлам
     DATABASE_DIR = BASE_DIR / "DocGeneratorBot" / "database"
     DATABASE_PATH = DATABASE_DIR / "bot.db"
+    FSM_DATABASE_PATH = DATABASE_DIR / "fsm.db"  # отдельный файл, чтобы запись состояний не блокировала основную БД
+    DB_LOCK_TIMEOUT = float(os.getenv("DB_LOCK_TIMEOUT", "30"))  # секунд ожидания блокировки SQLite в транзакциях на запись
+    DB_TRACE_ENABLED = os.getenv("DB_TRACE_ENABLED", "true").lower() == "true"  # учет времени и числа запросов к БД (/dbstats)
+    DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "200"))  # запросы дольше этого пишутся в лог медленных запросов
+    DB_UPDATE_QUERIES_WARNING = int(os.getenv("DB_UPDATE_QUERIES_WARNING", "50"))  # предупреждение, если обновление выполнило столько запросов
+    DB_STATS_TOP = int(os.getenv("DB_STATS_TOP", "10"))  # сколько запросов показывать в /dbstats по умолчанию
+
+    # Хранилище состояний FSM: sqlite (переживает перезапуск) или memory
+    FSM_STORAGE = os.getenv("FSM_STORAGE", "sqlite").strip().lower()
+    FSM_STATE_TTL_HOURS = int(os.getenv("FSM_STATE_TTL_HOURS", "72"))  # через сколько часов неактивности состояние удаляется
 
     # Пути к документам
     DOCUMENTS_PATH = BASE_DIR / "DocGeneratorBot" / "documents"
     TEMPLATES_PATH = BASE_DIR / "DocGeneratorBot" / "documents" / "templates"
+    TEMPLATES_WATCH_INTERVAL = float(os.getenv("TEMPLATES_WATCH_INTERVAL", "5"))  # секунд между проверками изменений шаблонов (0 — не следить)
     GENERATED_DOCUMENTS_PATH = BASE_DIR / "DocGeneratorBot" / "documents" / "generated"
     STATIC_PATH = BASE_DIR / "DocGeneratorBot" / "documents" / "static"
     TEMP_PATH = BASE_DIR / "DocGeneratorBot" / "temp"
     LOGS_PATH = BASE_DIR / "DocGeneratorBot" / "logs" / "bot.log"
 
+    # Хранение сгенерированных документов (их можно удалять: при скачивании из истории они создаются заново)
+    DOCUMENT_RETENTION_DAYS = int(os.getenv("DOCUMENT_RETENTION_DAYS", "30"))  # удалять документы старше, 0 — не удалять по возрасту
+    DOCUMENT_USER_QUOTA_MB = int(os.getenv("DOCUMENT_USER_QUOTA_MB", "50"))  # место на пользователя, 0 — без ограничения
+    DOCUMENT_USER_MAX_FILES = int(os.getenv("DOCUMENT_USER_MAX_FILES", "100"))  # файлов на пользователя, 0 — без ограничения
+    DOCUMENT_STORAGE_QUOTA_MB = int(os.getenv("DOCUMENT_STORAGE_QUOTA_MB", "5120"))  # всего на все документы, 0 — без ограничения
+    DOCUMENT_MIN_AGE_MINUTES = int(os.getenv("DOCUMENT_MIN_AGE_MINUTES", "60"))  # более свежие файлы квоты не удаляют
+    DOCUMENT_DEDUP_ENABLED = os.getenv("DOCUMENT_DEDUP_ENABLED", "true").lower() == "true"  # одинаковые файлы заменяются жесткими ссылками
+    DOCUMENT_DEDUP_MIN_BYTES = int(os.getenv("DOCUMENT_DEDUP_MIN_BYTES", "4096"))  # меньшие файлы не сравниваются
+    STORAGE_SWEEP_INTERVAL_HOURS = float(os.getenv("STORAGE_SWEEP_INTERVAL_HOURS", "6"))  # период очистки, 0 — не запускать
+    TEMP_RETENTION_DAYS = int(os.getenv("TEMP_RETENTION_DAYS", "1"))  # срок хранения файлов в TEMP_PATH
+
+    # Логирование: запись в файл и stdout идет в фоновом потоке через очередь
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    LOG_LEVELS = os.getenv("LOG_LEVELS", "aiogram.event=WARNING")  # уровни отдельных логгеров: doc_bot.admin=DEBUG,aiogram.event=WARNING
+    LOG_FILE_ENABLED = os.getenv("LOG_FILE_ENABLED", "true").lower() == "true"  # JSON-строки в LOGS_PATH с ротацией
+    LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))  # размер файла лога до ротации
+    LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))  # сколько старых файлов лога хранить
+    LOG_CONSOLE_ENABLED = os.getenv("LOG_CONSOLE_ENABLED", "true").lower() == "true"
+    LOG_CONSOLE_FORMAT = os.getenv("LOG_CONSOLE_FORMAT", "text").strip().lower()  # text или json
+    LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))  # при переполнении очереди записи отбрасываются
+    LOG_REDACT_FIELDS = os.getenv("LOG_REDACT_FIELDS", "passport,inn,phone,snils")  # значения этих полей скрываются в логах
+
     # Настройки платежной системы
     YOOKASSA_SHOP_ID = os.getenv("YOOKASSA_SHOP_ID")
     YOOKASSA_SECRET_KEY = os.getenv("YOOKASSA_SECRET_KEY")
@@ -45,6 +115,20 @@ class Config:
 
     # Настройки для рассылки
     NEWSLETTER_INTERVAL = int(os.getenv("NEWSLETTER_INTERVAL", "24"))  # часы
+    BROADCAST_GLOBAL_RATE = float(os.getenv("BROADCAST_GLOBAL_RATE", "20"))  # сообщений рассылки в секунду (часть общего лимита)
+    BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "20"))  # одновременных отправок
+    BROADCAST_BATCH_SIZE = int(os.getenv("BROADCAST_BATCH_SIZE", "200"))  # получателей за одну порцию (шаг курсора)
+
+    # Настройки очереди исходящих сообщений
+    OUTBOUND_WORKERS = int(os.getenv("OUTBOUND_WORKERS", "8"))  # параллельных отправок из очереди
+    OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", "28"))  # сообщений в секунду на весь бот
+    OUTBOUND_PER_CHAT_INTERVAL = float(os.getenv("OUTBOUND_PER_CHAT_INTERVAL", "1.0"))  # секунд между сообщениями в личный чат
+    OUTBOUND_GROUP_CHAT_INTERVAL = float(os.getenv("OUTBOUND_GROUP_CHAT_INTERVAL", "3.0"))  # секунд между сообщениями в группу
+    OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", "3"))  # повторов при RetryAfter/сетевых ошибках
+    SUPPORT_DIGEST_WINDOW = float(os.getenv("SUPPORT_DIGEST_WINDOW", "10"))  # секунд, за которые уведомления поддержки склеиваются в сводку
+
+    # Кэш цен
+    PRICE_CACHE_TTL = int(os.getenv("PRICE_CACHE_TTL", "300"))  # секунд до принудительного перечитывания цен из БД
 
     # Настройки для админ-панели
     ADMIN_BOT_TOKEN = os.getenv("ADMIN_BOT_TOKEN", "")  # Для отдельного бота админ-уведомлений
@@ -73,6 +157,12 @@ if not config.YOOKASSA_SHOP_ID or not config.YOOKASSA_SECRET_KEY or config.YOOKA
 if config.SUPPORT_CHAT_ID == 0:
     raise ValueError("Не установлен SUPPORT_CHAT_ID в .env файле")
 
+if config.BOT_MODE not in ("polling", "webhook"):
+    raise ValueError("BOT_MODE должен быть polling или webhook")
+
+if config.BOT_MODE == "webhook" and (not config.WEBHOOK_BASE_URL or not config.WEBHOOK_SECRET):
+    raise ValueError("Для режима webhook необходимо установить WEBHOOK_BASE_URL и WEBHOOK_SECRET в .env файле")
+
 # Создаем необходимые директории
 for path in [
     config.DOCUMENTS_PATH,
@@ -1,11 +1,10 @@
 import logging
-import sqlite3
 import os
 from pathlib import Path
 from config import config
+from database.tracing import traced_connect
 
 logger = logging.getLogger('doc_bot.database')
-logger.info("database/__init__.py ЗАГРУЖЕН УСПЕШНО")
 
 
 def init_db():
@@ -16,7 +15,7 @@ def init_db():
         db_path.parent.mkdir(parents=True, exist_ok=True)
 
         # Подключаемся к базе данных
-        conn = sqlite3.connect(str(db_path))
+        conn = traced_connect(str(db_path))
         cursor = conn.cursor()
 
         # Создаем таблицу пользователей
@@ -138,6 +137,12 @@ def init_db():
         )
         ''')
 
+        # Тип скидки промокода: percent (процент) или fixed (сумма в рублях)
+        cursor.execute("PRAGMA table_info(promocodes)")
+        if 'discount_type' not in [column[1] for column in cursor.fetchall()]:
+            cursor.execute("ALTER TABLE promocodes ADD COLUMN discount_type TEXT NOT NULL DEFAULT 'percent'")
+            logger.info("Добавлена колонка promocodes.discount_type")
+
         # Создаем таблицу использования промокодов
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS promocode_usage (
@@ -228,10 +233,28 @@ def init_db():
             INSERT OR IGNORE INTO prices (service_type, price) VALUES ('autogen', 249.0)
         """)
 
+        # Переопределения цен для отдельных шаблонов
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS template_prices (
+                template_name TEXT NOT NULL,
+                service_type TEXT NOT NULL,               -- 'template' или 'autogen'
+                price INTEGER NOT NULL,
+                PRIMARY KEY (template_name, service_type)
+            )
+        """)
+
         # Сохраняем изменения и закрываем соединение
         conn.commit()
         conn.close()
 
+        # Таблицы черновиков, рассылок и артефактов создаются здесь, а не при импорте модулей
+        from database.drafts import init_last_drafts_table
+        from database.broadcasts import init_broadcasts_table
+        from database.artifacts import init_artifacts_table
+        init_last_drafts_table()
+        init_broadcasts_table()
+        init_artifacts_table()
+
         logger.info("База данных успешно инициализирована и заполнена тестовыми данными")
         return True
 
@@ -0,0 +1,156 @@
+import logging
+from config import config
+from database.tracing import traced_connect
+
+logger = logging.getLogger('doc_bot.db.artifacts')
+
+# Пар (id, format) в одном DELETE: по два параметра на пару, лимит параметров старых SQLite — 999
+_BATCH_SIZE = 400
+
+
+def init_artifacts_table():
+    """Создаёт таблицу сгенерированных файлов (артефактов) и их связей с заказами."""
+    conn = None
+    try:
+        conn = traced_connect(config.DATABASE_PATH)
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS document_artifacts (
+                id TEXT NOT NULL,                   -- 32 hex-символа, имя файла без расширения
+                format TEXT NOT NULL,               -- pdf / docx
+                path TEXT NOT NULL,                 -- относительно GENERATED_DOCUMENTS_PATH: ab/cd/<id>.pdf
+                user_id INTEGER,
+                order_id INTEGER,
+                order_item_id INTEGER,
+                template_name TEXT,
+                file_name TEXT,                     -- читаемое имя без расширения для отправки в Telegram
+                size INTEGER,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (id, format)
+            )
+        ''')
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_document_artifacts_order ON document_artifacts (order_id, order_item_id)"
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_document_artifacts_user ON document_artifacts (user_id, created_at)"
+        )
+        conn.commit()
+        logger.info("Таблица document_artifacts инициализирована")
+    except Exception as e:
+        logger.error(f"Ошибка при создании таблицы document_artifacts: {e}", exc_info=True)
+    finally:
+        if conn:
+            conn.close()
+
+
+def record_artifacts(artifacts: list) -> bool:
+    """
+    Сохраняет записи об артефактах одной транзакцией. Каждый элемент — dict
+    с ключами id, format, path и необязательными user_id, order_id,
+    order_item_id, template_name, file_name, size, created_at.
+    """
+    if not artifacts:
+        return True
+    conn = None
+    try:
+        conn = traced_connect(config.DATABASE_PATH)
+        cursor = conn.cursor()
+        cursor.executemany("""
+            INSERT OR REPLACE INTO document_artifacts (
+                id, format, path, user_id, order_id, order_item_id,
+                template_name, file_name, size, created_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+        """, [(
+            artifact['id'], artifact['format'], artifact['path'], artifact.get('user_id'),
+            artifact.get('order_id'), artifact.get('order_item_id'), artifact.get('template_name'),
+            artifact.get('file_name'), artifact.get('size'), artifact.get('created_at')
+        ) for artifact in artifacts])
+        conn.commit()
+        return True
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении артефактов: {e}", exc_info=True)
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+
+def get_order_artifacts(order_id: int) -> dict:
+    """
+    Последние артефакты позиций заказа: {order_item_id: {format: {'path', 'file_name'}}},
+    path — абсолютный. Файл мог быть удален очисткой хранилища: проверяет вызывающий.
+    """
+    conn = None
+    try:
+        conn = traced_connect(config.DATABASE_PATH)
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT order_item_id, format, path, file_name
+            FROM document_artifacts
+            WHERE order_id = ? AND order_item_id IS NOT NULL
+            ORDER BY created_at
+        """, (order_id,))
+        result = {}
+        # Более поздние записи перезаписывают ранние: остается последняя генерация
+        for order_item_id, file_format, path, file_name in cursor.fetchall():
+            result.setdefault(order_item_id, {})[file_format] = {
+                'path': str(config.GENERATED_DOCUMENTS_PATH / path), 'file_name': file_name
+            }
+        return result
+    except Exception as e:
+        logger.error(f"Ошибка при получении артефактов заказа {order_id}: {e}", exc_info=True)
+        return {}
+    finally:
+        if conn:
+            conn.close()
+
+
+def get_artifact_owners(prefix: str) -> dict:
+    """
+    Владельцы артефактов, чей id начинается с prefix: {id: user_id}.
+    Диапазон по первичному ключу, поэтому запрос читает только нужную часть индекса.
+    """
+    conn = None
+    try:
+        conn = traced_connect(config.DATABASE_PATH)
+        cursor = conn.cursor()
+        # После последней hex-цифры «f» идет «g»: [prefix, prefix + 'g') — все id с этим префиксом
+        cursor.execute("""
+            SELECT id, user_id FROM document_artifacts
+            WHERE id >= ? AND id < ?
+        """, (prefix, prefix + 'g'))
+        return dict(cursor.fetchall())
+    except Exception as e:
+        logger.error(f"Ошибка при получении владельцев артефактов {prefix}*: {e}", exc_info=True)
+        return {}
+    finally:
+        if conn:
+            conn.close()
+
+
+def delete_artifacts(keys: list) -> int:
+    """Удаляет записи по списку (id, format); возвращает число удаленных строк."""
+    if not keys:
+        return 0
+    conn = None
+    try:
+        conn = traced_connect(config.DATABASE_PATH)
+        cursor = conn.cursor()
+        deleted = 0
+        for start in range(0, len(keys), _BATCH_SIZE):
+            batch = keys[start:start + _BATCH_SIZE]
+            cursor.execute(
+                f"DELETE FROM document_artifacts WHERE (id, format) IN (VALUES {', '.join(['(?, ?)'] * len(batch))})",
+                [value for key in batch for value in key]
+            )
+            deleted += cursor.rowcount
+        conn.commit()
+        return deleted
+    except Exception as e:
+        logger.error(f"Ошибка при удалении записей об артефактах: {e}", exc_info=True)
+        return 0
+    finally:
+        if conn:
+            conn.close()
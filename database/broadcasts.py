@@ -0,0 +1,214 @@
+import logging
+from config import config
+from database.tracing import traced_connect
+
+logger = logging.getLogger('doc_bot.broadcasts')
+
+BROADCAST_AUDIENCES = ('subscribers', 'all')
+
+
+def init_broadcasts_table():
+    """Создаёт таблицу рассылок с курсором прогресса."""
+    conn = None
+    try:
+        conn = traced_connect(config.DATABASE_PATH)
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS broadcasts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                admin_id INTEGER,
+                text TEXT NOT NULL,
+                audience TEXT NOT NULL DEFAULT 'subscribers',  -- subscribers / all
+                status TEXT NOT NULL DEFAULT 'running',        -- running / finished / cancelled
+                last_user_id INTEGER NOT NULL DEFAULT 0,       -- курсор: все id <= обработаны
+                total INTEGER DEFAULT 0,
+                sent INTEGER DEFAULT 0,
+                failed INTEGER DEFAULT 0,
+                blocked INTEGER DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                finished_at TIMESTAMP
+            )
+        ''')
+        conn.commit()
+        logger.info("Таблица broadcasts инициализирована")
+    except Exception as e:
+        logger.error(f"Ошибка при создании таблицы broadcasts: {e}", exc_info=True)
+    finally:
+        if conn:
+            conn.close()
+
+
+def _row_to_broadcast(row) -> dict:
+    return {
+        'id': row[0],
+        'admin_id': row[1],
+        'text': row[2],
+        'audience': row[3],
+        'status': row[4],
+        'last_user_id': row[5],
+        'total': row[6],
+        'sent': row[7],
+        'failed': row[8],
+        'blocked': row[9],
+        'created_at': row[10],
+        'updated_at': row[11],
+        'finished_at': row[12]
+    }
+
+
+def count_broadcast_recipients(audience: str = 'subscribers') -> int:
+    conn = None
+    try:
+        conn = traced_connect(config.DATABASE_PATH)
+        cursor = conn.cursor()
+        if audience == 'all':
+            cursor.execute("SELECT COUNT(*) FROM users")
+        else:
+            cursor.execute("SELECT COUNT(*) FROM news_subscribers")
+        return cursor.fetchone()[0]
+    except Exception as e:
+        logger.error(f"Ошибка при подсчете получателей рассылки: {e}", exc_info=True)
+        return 0
+    finally:
+        if conn:
+            conn.close()
+
+
+def create_broadcast(text: str, admin_id: int = None, audience: str = 'subscribers') -> int:
+    if audience not in BROADCAST_AUDIENCES:
+        logger.error(f"Неизвестная аудитория рассылки: {audience}")
+        return None
+
+    conn = None
+    try:
+        total = count_broadcast_recipients(audience)
+        conn = traced_connect(config.DATABASE_PATH)
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO broadcasts (admin_id, text, audience, total)
+            VALUES (?, ?, ?, ?)
+        """, (admin_id, text, audience, total))
+        conn.commit()
+        logger.info(f"Создана рассылка #{cursor.lastrowid} ({audience}, получателей: {total})")
+        return cursor.lastrowid
+    except Exception as e:
+        logger.error(f"Ошибка при создании рассылки: {e}", exc_info=True)
+        return None
+    finally:
+        if conn:
+            conn.close()
+
+
+def get_broadcast(broadcast_id: int) -> dict:
+    conn = None
+    try:
+        conn = traced_connect(config.DATABASE_PATH)
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT id, admin_id, text, audience, status, last_user_id, total,
+                   sent, failed, blocked, created_at, updated_at, finished_at
+            FROM broadcasts WHERE id = ?
+        """, (broadcast_id,))
+        row = cursor.fetchone()
+        return _row_to_broadcast(row) if row else None
+    except Exception as e:
+        logger.error(f"Ошибка при получении рассылки {broadcast_id}: {e}", exc_info=True)
+        return None
+    finally:
+        if conn:
+            conn.close()
+
+
+def get_unfinished_broadcasts() -> list:
+    conn = None
+    try:
+        conn = traced_connect(config.DATABASE_PATH)
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT id, admin_id, text, audience, status, last_user_id, total,
+                   sent, failed, blocked, created_at, updated_at, finished_at
+            FROM broadcasts WHERE status = 'running'
+            ORDER BY id
+        """)
+        return [_row_to_broadcast(row) for row in cursor.fetchall()]
+    except Exception as e:
+        logger.error(f"Ошибка при получении незавершенных рассылок: {e}", exc_info=True)
+        return []
+    finally:
+        if conn:
+            conn.close()
+
+
+def get_broadcast_recipients(audience: str, after_user_id: int, limit: int) -> list:
+    """
+    Возвращает следующую порцию получателей (по возрастанию id) после курсора.
+    При ошибке БД — None, чтобы не спутать ее с концом списка.
+    """
+    conn = None
+    try:
+        conn = traced_connect(config.DATABASE_PATH)
+        cursor = conn.cursor()
+        if audience == 'all':
+            cursor.execute(
+                "SELECT id FROM users WHERE id > ? ORDER BY id LIMIT ?",
+                (after_user_id, limit)
+            )
+        else:
+            cursor.execute(
+                "SELECT user_id FROM news_subscribers WHERE user_id > ? ORDER BY user_id LIMIT ?",
+                (after_user_id, limit)
+            )
+        return [row[0] for row in cursor.fetchall()]
+    except Exception as e:
+        logger.error(f"Ошибка при получении получателей рассылки: {e}", exc_info=True)
+        return None
+    finally:
+        if conn:
+            conn.close()
+
+
+def update_broadcast_progress(broadcast_id: int, last_user_id: int, sent: int, failed: int, blocked: int) -> bool:
+    """Сдвигает курсор рассылки и прибавляет счетчики обработанной порции."""
+    conn = None
+    try:
+        conn = traced_connect(config.DATABASE_PATH)
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE broadcasts
+            SET last_user_id = ?,
+                sent = sent + ?,
+                failed = failed + ?,
+                blocked = blocked + ?,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        """, (last_user_id, sent, failed, blocked, broadcast_id))
+        conn.commit()
+        return cursor.rowcount > 0
+    except Exception as e:
+        logger.error(f"Ошибка при обновлении прогресса рассылки {broadcast_id}: {e}", exc_info=True)
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+
+def finish_broadcast(broadcast_id: int, status: str = 'finished') -> bool:
+    conn = None
+    try:
+        conn = traced_connect(config.DATABASE_PATH)
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE broadcasts
+            SET status = ?, updated_at = CURRENT_TIMESTAMP, finished_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        """, (status, broadcast_id))
+        conn.commit()
+        return cursor.rowcount > 0
+    except Exception as e:
+        logger.error(f"Ошибка при завершении рассылки {broadcast_id}: {e}", exc_info=True)
+        return False
+    finally:
+        if conn:
+            conn.close()
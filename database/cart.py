@@ -16,6 +16,7 @@ import json
 from datetime import datetime
 from pathlib import Path
 from config import config
+from database.tracing import traced_connect
 from services.pricing import get_template_price, get_autogeneration_price
 logger = logging.getLogger('doc_bot.db.cart')
 
@@ -25,7 +26,7 @@ def get_connection():
     try:
         db_path = Path(config.DATABASE_PATH) if isinstance(config.DATABASE_PATH, str) else config.DATABASE_PATH
         db_path.parent.mkdir(parents=True, exist_ok=True)
-        conn = sqlite3.connect(str(db_path))
+        conn = traced_connect(str(db_path))
         conn.row_factory = sqlite3.Row
         logger.debug(f"Подключение к БД установлено: {db_path}")
         create_tables_if_not_exist(conn)
@@ -1,11 +1,10 @@
 import logging
-import sqlite3
 import json
 from datetime import datetime, timedelta
 from config import config
+from database.tracing import traced_connect
 
 logger = logging.getLogger('doc_bot.drafts')
-logger.info("database/drafts.py ЗАГРУЖЕН УСПЕШНО")
 
 def save_draft(user_id: int, template_id: int, document_name: str, answers: dict, current_index: int,
                total_questions: int, category: str = None, doc_info: dict = None) -> int:
@@ -13,7 +12,7 @@ def save_draft(user_id: int, template_id: int, document_name: str, answers: dict
     Сохраняет временный черновик заполнения документа (с истечением срока).
     """
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
 
         expires_at = datetime.now() + timedelta(hours=config.DRAFT_EXPIRATION_HOURS)
@@ -43,7 +42,7 @@ def save_draft(user_id: int, template_id: int, document_name: str, answers: dict
 
 def get_user_drafts(user_id: int) -> list:
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
 
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -84,7 +83,7 @@ def get_user_drafts(user_id: int) -> list:
 
 def get_draft(user_id: int, draft_id: int = None, template_id: int = None) -> dict:
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
 
         query = "SELECT * FROM drafts WHERE user_id = ?"
@@ -134,7 +133,7 @@ def get_draft(user_id: int, draft_id: int = None, template_id: int = None) -> di
 
 def delete_draft(user_id: int, draft_id: int = None, template_id: int = None) -> bool:
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
 
         query = "DELETE FROM drafts WHERE user_id = ?"
@@ -161,7 +160,7 @@ def delete_draft(user_id: int, draft_id: int = None, template_id: int = None) ->
 
 def clear_expired_drafts() -> int:
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
 
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -179,7 +178,7 @@ def clear_expired_drafts() -> int:
 def init_last_drafts_table():
     """Создаёт таблицу для хранения последних черновиков по шаблону."""
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
 
         cursor.execute('''
@@ -202,7 +201,7 @@ def init_last_drafts_table():
 
 def save_last_template_draft(user_id: int, template_id: str, answers: dict) -> bool:
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
         data_str = json.dumps(answers, ensure_ascii=False)
 
@@ -224,7 +223,7 @@ def save_last_template_draft(user_id: int, template_id: str, answers: dict) -> b
 
 def get_last_template_draft(user_id: int, template_id: str) -> dict:
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
 
         cursor.execute('''
@@ -248,7 +247,7 @@ def get_last_template_draft(user_id: int, template_id: str) -> dict:
 
 def clear_last_drafts(user_id: int = None, template_id: str = None) -> int:
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
 
         if user_id is not None and template_id is not None:
@@ -270,5 +269,3 @@ def clear_last_drafts(user_id: int = None, template_id: str = None) -> int:
     finally:
         if conn:
             conn.close()
-
-init_last_drafts_table()
\ No newline at end of file
@@ -0,0 +1,131 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from config import config
+
+logger = logging.getLogger('doc_bot.fsm_storage')
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM-хранилище aiogram в SQLite.
+
+    Состояние и данные хранятся в одной строке на ключ (upsert), база работает
+    в режиме WAL, поэтому файл можно разделять между несколькими процессами
+    бота. Записи, которые не обновлялись дольше `ttl` секунд, считаются
+    устаревшими и периодически удаляются.
+
+    Все запросы выполняются в одном выделенном потоке, которому принадлежит
+    соединение: ожидание блокировки файла (busy_timeout) не останавливает
+    event loop, а запросы к соединению не пересекаются.
+    """
+
+    def __init__(self, db_path=None, ttl: int = None, cleanup_every: int = 500):
+        self.db_path = str(db_path or config.FSM_DATABASE_PATH)
+        self.ttl = ttl if ttl is not None else config.FSM_STATE_TTL_HOURS * 3600
+        self.cleanup_every = cleanup_every
+        self._writes = 0
+        self._closed = False
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fsm-sqlite")
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS fsm_storage (
+                key TEXT PRIMARY KEY,
+                state TEXT,
+                data TEXT,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_fsm_storage_updated_at ON fsm_storage (updated_at)")
+        logger.info(f"FSM-хранилище SQLite инициализировано: {self.db_path}")
+
+    @staticmethod
+    def _build_key(key: StorageKey) -> str:
+        parts = [str(key.bot_id), str(key.chat_id), str(key.user_id)]
+        if key.thread_id:
+            parts.append(f"t{key.thread_id}")
+        if key.business_connection_id:
+            parts.append(f"b{key.business_connection_id}")
+        parts.append(key.destiny)
+        return ":".join(parts)
+
+    async def _execute(self, query: str, params: tuple = ()):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, lambda: self._conn.execute(query, params).fetchone()
+        )
+
+    async def _after_write(self):
+        self._writes += 1
+        if self._writes % self.cleanup_every == 0:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self.cleanup_expired)
+
+    async def _fetch(self, key: StorageKey, column: str):
+        row = await self._execute(
+            f"SELECT {column} FROM fsm_storage WHERE key = ? AND updated_at > ?",
+            (self._build_key(key), time.time() - self.ttl)
+        )
+        return row[0] if row else None
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state_value = state.state if isinstance(state, State) else state
+        await self._execute('''
+            INSERT INTO fsm_storage (key, state, data, updated_at) VALUES (?, ?, NULL, ?)
+            ON CONFLICT(key) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at
+        ''', (self._build_key(key), state_value, time.time()))
+        await self._after_write()
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return await self._fetch(key, "state")
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        data_value = json.dumps(data, ensure_ascii=False, default=str) if data else None
+        await self._execute('''
+            INSERT INTO fsm_storage (key, state, data, updated_at) VALUES (?, NULL, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at
+        ''', (self._build_key(key), data_value, time.time()))
+        await self._after_write()
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        raw = await self._fetch(key, "data")
+        if not raw:
+            return {}
+        try:
+            return json.loads(raw)
+        except json.JSONDecodeError:
+            logger.warning(f"Поврежденные данные FSM для ключа {self._build_key(key)}, сбрасываем")
+            return {}
+
+    def cleanup_expired(self) -> int:
+        """
+        Удаляет устаревшие записи и пустые строки (без состояния и данных).
+        Вызывается в потоке хранилища.
+        """
+        try:
+            cursor = self._conn.execute(
+                "DELETE FROM fsm_storage WHERE updated_at <= ? OR (state IS NULL AND data IS NULL)",
+                (time.time() - self.ttl,)
+            )
+            if cursor.rowcount:
+                logger.info(f"Удалено устаревших записей FSM: {cursor.rowcount}")
+            return cursor.rowcount
+        except Exception as e:
+            logger.error(f"Ошибка при очистке FSM-хранилища: {e}", exc_info=True)
+            return 0
+
+    async def close(self) -> None:
+        # Закрыть могут и Dispatcher при остановке, и вызывающий код: повторный вызов ничего не делает
+        if self._closed:
+            return
+        self._closed = True
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._conn.close)
+        self._executor.shutdown(wait=False)
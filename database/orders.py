@@ -5,6 +5,8 @@ from datetime import datetime
 from pathlib import Path
 from typing import List, Dict, Any, Optional
 from config import config
+from database.artifacts import get_order_artifacts
+from database.tracing import traced_connect
 
 logger = logging.getLogger('doc_bot.db.orders')
 
@@ -15,7 +17,7 @@ def get_connection():
         db_path = Path(config.DATABASE_PATH) if isinstance(config.DATABASE_PATH, str) else config.DATABASE_PATH
         db_path.parent.mkdir(parents=True, exist_ok=True)
 
-        conn = sqlite3.connect(str(db_path))
+        conn = traced_connect(str(db_path))
         conn.row_factory = sqlite3.Row
         logger.debug(f"Подключение к БД установлено: {db_path}")
         create_tables_if_not_exists(conn)
@@ -507,6 +509,7 @@ def get_order_by_id_full(order_id: int) -> Optional[dict]:
             WHERE order_id = ?
         """, (order_id,))
         items = cursor.fetchall()
+        artifacts = get_order_artifacts(order_id)
 
         items_list = []
         for item in items:
@@ -516,14 +519,15 @@ def get_order_by_id_full(order_id: int) -> Optional[dict]:
                 filled_data = {}
                 logger.warning(f"Не удалось декодировать filled_data для позиции {item['id']}")
 
+            files = artifacts.get(item['id'], {})
             items_list.append({
                 'id': item['id'],
                 'doc_id': item['doc_id'],
                 'doc_name': item['doc_name'],
                 'price': item['price'],
                 'filled_data': filled_data,
-                'pdf_path': None,
-                'docx_path': None,
+                'pdf_path': files['pdf']['path'] if 'pdf' in files else None,
+                'docx_path': files['docx']['path'] if 'docx' in files else None,
                 'created_at': item['created_at']
             })
 
@@ -594,6 +598,29 @@ def delete_order(order_id: int) -> bool:
         return False
 
 
+def get_pending_orders_backlog(timeout: float = None) -> Optional[dict]:
+    """
+    Заказы, ожидающие оплаты: {'count', 'oldest_created_at'}. Отдельное соединение
+    с коротким timeout и без проверки схемы: функция вызывается из проверки состояния.
+    """
+    conn = None
+    try:
+        conn = traced_connect(str(config.DATABASE_PATH), timeout=timeout if timeout is not None else config.DB_LOCK_TIMEOUT)
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT COUNT(*), MIN(created_at) FROM orders
+            WHERE status = 'pending'
+        """)
+        count, oldest = cursor.fetchone()
+        return {'count': count, 'oldest_created_at': oldest}
+    except Exception as e:
+        logger.error(f"Ошибка при подсчете неоплаченных заказов: {e}", exc_info=True)
+        return None
+    finally:
+        if conn:
+            conn.close()
+
+
 def get_orders_stats() -> dict:
     try:
         conn = get_connection()
@@ -655,6 +682,62 @@ def update_order_payment(order_id: int, payment_id: str, payment_data: dict = No
         return False
 
 
+def mark_order_paid(order_id: int) -> bool:
+    """
+    Переводит заказ в статус 'paid', только если он еще не оплачен.
+    Возвращает True ровно один раз — тому, кто первым подтвердил оплату
+    (кнопка проверки или уведомление ЮKassa), чтобы документы не выдавались дважды.
+    """
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE orders
+            SET status = 'paid', updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND status IN ('created', 'pending')
+        """, (order_id,))
+        conn.commit()
+        rows_affected = cursor.rowcount
+        conn.close()
+
+        if rows_affected > 0:
+            logger.info(f"Заказ {order_id} отмечен как оплаченный")
+            return True
+        logger.info(f"Заказ {order_id} уже обработан или не найден, повторная отметка оплаты пропущена")
+        return False
+
+    except Exception as e:
+        logger.error(f"Ошибка при отметке оплаты заказа {order_id}: {e}", exc_info=True)
+        return False
+
+
+def get_last_order_item_data(user_id: int, doc_id) -> dict:
+    """Данные последнего заказанного пользователем экземпляра документа (для повторного заполнения)."""
+    conn = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT oi.filled_data
+            FROM order_items oi
+            JOIN orders o ON o.id = oi.order_id
+            WHERE o.user_id = ? AND oi.doc_id = ?
+            ORDER BY oi.id DESC
+            LIMIT 1
+        """, (user_id, doc_id))
+        row = cursor.fetchone()
+        if not row:
+            return None
+        return json.loads(row['filled_data'])
+
+    except Exception as e:
+        logger.error(f"Ошибка при получении данных прошлого заказа пользователя {user_id}: {e}", exc_info=True)
+        return None
+    finally:
+        if conn:
+            conn.close()
+
+
 def get_order_items(order_id: int):
     try:
         conn = get_connection()
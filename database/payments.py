@@ -2,6 +2,7 @@ import sqlite3
 import logging
 from datetime import datetime
 from config import config
+from database.tracing import traced_connect
 
 logger = logging.getLogger('doc_bot.db.payments')
 
@@ -9,7 +10,7 @@ def get_connection():
     try:
         db_path = config.DATABASE_PATH
         db_path.parent.mkdir(parents=True, exist_ok=True)
-        conn = sqlite3.connect(str(db_path))
+        conn = traced_connect(str(db_path))
         conn.row_factory = sqlite3.Row
         logger.debug(f"Подключение к БД установлено: {db_path}")
         return conn
@@ -34,15 +35,33 @@ def create_payment(user_id: int, order_id: int, amount: float, payment_system: s
         logger.error(f"Ошибка создания платежа для пользователя {user_id}: {e}", exc_info=True)
         return None
 
-def update_payment_status(payment_id: int, status: str):
+def attach_external_payment_id(payment_id: int, external_id: str):
+    """Связывает локальный платеж с идентификатором платежа в ЮKassa."""
     try:
         conn = get_connection()
         cursor = conn.cursor()
         cursor.execute('''
             UPDATE payments
-            SET status = ?, updated_at = CURRENT_TIMESTAMP
+            SET payment_id = ?, updated_at = CURRENT_TIMESTAMP
             WHERE id = ?
-        ''', (status, payment_id))
+        ''', (external_id, payment_id))
+        conn.commit()
+        conn.close()
+        return True
+    except Exception as e:
+        logger.error(f"Ошибка привязки платежа ЮKassa {external_id} к платежу {payment_id}: {e}", exc_info=True)
+        return False
+
+def update_payment_status(payment_id, status: str):
+    """Обновляет статус по локальному id или по идентификатору платежа в ЮKassa."""
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE payments
+            SET status = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? OR payment_id = ?
+        ''', (status, payment_id, str(payment_id)))
         conn.commit()
         conn.close()
         logger.info(f"Статус платежа {payment_id} обновлен на {status}")
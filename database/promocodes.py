@@ -1,19 +1,18 @@
 import logging
-import sqlite3
 import datetime
 from config import config
+from database.tracing import traced_connect
 
 logger = logging.getLogger('doc_bot.promocodes')
-logger.info("database/promocodes.py ЗАГРУЖЕН УСПЕШНО")
 
 
 def get_all_promocodes() -> list:
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
 
         cursor.execute("""
-            SELECT p.*, 
+            SELECT p.id, p.code, p.discount, p.max_uses, p.used_count, p.expires_at, p.created_at, p.updated_at,
                    (SELECT COUNT(*) FROM promocode_usage WHERE promocode_id = p.id) as usage_count
             FROM promocodes p
             ORDER BY p.created_at DESC
@@ -45,9 +44,10 @@ def get_all_promocodes() -> list:
             conn.close()
 
 
-def create_promocode(code: str, discount: int, max_uses: int = 1, expires_at: datetime.datetime = None) -> dict:
+def create_promocode(code: str, discount: int, max_uses: int = 1, expires_at: datetime.datetime = None,
+                     discount_type: str = 'percent') -> dict:
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
         cursor.execute("SELECT id FROM promocodes WHERE code = ?", (code,))
         existing = cursor.fetchone()
@@ -57,9 +57,9 @@ def create_promocode(code: str, discount: int, max_uses: int = 1, expires_at: da
             return None
         cursor.execute("""
             INSERT INTO promocodes (
-                code, discount, max_uses, used_count, expires_at
-            ) VALUES (?, ?, ?, ?, ?)
-        """, (code, discount, max_uses, 0, expires_at))
+                code, discount, discount_type, max_uses, used_count, expires_at
+            ) VALUES (?, ?, ?, ?, ?, ?)
+        """, (code, discount, discount_type, max_uses, 0, expires_at))
 
         conn.commit()
 
@@ -74,7 +74,8 @@ def create_promocode(code: str, discount: int, max_uses: int = 1, expires_at: da
             'used_count': promo[4],
             'expires_at': promo[5],
             'created_at': promo[6],
-            'updated_at': promo[7]
+            'updated_at': promo[7],
+            'discount_type': discount_type
         }
 
     except Exception as e:
@@ -87,7 +88,7 @@ def create_promocode(code: str, discount: int, max_uses: int = 1, expires_at: da
 
 def update_promocode(promo_id: int, **kwargs) -> bool:
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
 
         # Формируем запрос на обновление
@@ -131,120 +132,144 @@ def update_promocode(promo_id: int, **kwargs) -> bool:
             conn.close()
 
 
-def check_promocode(code: str, user_id: int) -> dict:
+def get_promocode_context(code: str, user_id: int = None) -> dict:
+    """
+    Загружает все, что нужно для проверки промокода, одним запросом:
+    сам промокод, использовал ли его пользователь и есть ли у него оплаченные заказы.
+    """
+    conn = None
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
-
-        # Получаем промокод
-        cursor.execute("SELECT * FROM promocodes WHERE code = ?", (code,))
-        promo = cursor.fetchone()
-
-        if not promo:
-            logger.warning(f"Промокод {code} не найден")
-            return None
-
-        promo_id = promo[0]
-        discount = promo[2]
-        max_uses = promo[3]
-        used_count = promo[4]
-        expires_at = promo[5]
-
-        # Проверяем, не истек ли срок действия
-        if expires_at:
-            try:
-                current_time = datetime.datetime.now()
-                expires_at_dt = datetime.datetime.strptime(expires_at, "%Y-%m-%d %H:%M:%S")
-
-                if current_time > expires_at_dt:
-                    logger.warning(f"Промокод {code} истек")
-                    return None
-            except (ValueError, TypeError) as e:
-                logger.error(f"Ошибка при сравнении даты промокода: {e}")
-                return None
-        if used_count >= max_uses:
-            logger.warning(f"Достигнуто максимальное количество использований промокода {code}")
+        cursor.execute("""
+            SELECT p.id, p.code, p.discount, p.discount_type, p.max_uses, p.used_count, p.expires_at,
+                   EXISTS(
+                       SELECT 1 FROM promocode_usage pu
+                       WHERE pu.promocode_id = p.id AND pu.user_id = ?
+                   ) AS user_used,
+                   EXISTS(
+                       SELECT 1 FROM orders o
+                       WHERE o.user_id = ? AND o.status IN ('paid', 'completed')
+                   ) AS has_paid_order
+            FROM promocodes p
+            WHERE p.code = ?
+        """, (user_id, user_id, code))
+        row = cursor.fetchone()
+        if not row:
             return None
-        if code != "FRIENDS100" and not code.startswith('1RUB'):
-            cursor.execute("""
-                SELECT id FROM promocode_usage 
-                WHERE promocode_id = ? AND user_id = ?
-            """, (promo_id, user_id))
-
-            if cursor.fetchone():
-                logger.warning(f"Пользователь {user_id} уже использовал промокод {code}")
-                return None
-        if code == "WELCOME20":
-            cursor.execute("""
-                SELECT id FROM orders 
-                WHERE user_id = ? AND status IN ('paid', 'completed')
-            """, (user_id,))
-
-            if cursor.fetchone():
-                logger.warning(f"Пользователь {user_id} уже совершал заказы, промокод WELCOME20 недоступен")
-                return None
 
         return {
-            'promo_id': promo_id,
-            'code': code,
-            'discount': discount,
-            'user_id': user_id
+            'id': row[0],
+            'code': row[1],
+            'discount': row[2],
+            'discount_type': row[3] or 'percent',
+            'max_uses': row[4],
+            'used_count': row[5],
+            'expires_at': row[6],
+            'user_used': bool(row[7]),
+            'has_paid_order': bool(row[8])
         }
 
     except Exception as e:
-        logger.error(f"Ошибка при проверке промокода: {e}", exc_info=True)
+        logger.error(f"Ошибка при загрузке промокода {code}: {e}", exc_info=True)
         return None
     finally:
         if conn:
             conn.close()
 
 
+def check_promocode(code: str, user_id: int) -> dict:
+    # Ленивый импорт для избежания циклических импортов
+    from services.promo_engine import evaluate_promocode
+
+    result = evaluate_promocode(code, user_id)
+    if not result['valid']:
+        return None
+
+    return {
+        'promo_id': result['promo_id'],
+        'code': result['code'],
+        'discount': result['discount'],
+        'discount_type': result['discount_type'],
+        'user_id': user_id
+    }
+
+
 def apply_promocode(code: str, user_id: int, order_id: int) -> dict:
+    """
+    Атомарно погашает промокод для заказа.
+
+    Проверка и списание выполняются в одной транзакции BEGIN IMMEDIATE:
+    счетчик увеличивается условным UPDATE (used_count < max_uses), поэтому
+    при одновременных оформлениях лимит использований не будет превышен.
+    Возвращает None, если промокод недоступен.
+    """
+    # Ленивый импорт для избежания циклических импортов
+    from services.promo_engine import is_reusable_by_user
+
+    conn = None
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH, timeout=config.DB_LOCK_TIMEOUT, isolation_level=None)
         cursor = conn.cursor()
 
-        # Получаем промокод
-        cursor.execute("SELECT * FROM promocodes WHERE code = ?", (code,))
+        # Сразу берем блокировку на запись, чтобы проверка и списание не разделялись
+        cursor.execute("BEGIN IMMEDIATE")
+
+        cursor.execute(
+            "SELECT id, discount, discount_type, expires_at FROM promocodes WHERE code = ?",
+            (code,)
+        )
         promo = cursor.fetchone()
 
         if not promo:
+            conn.rollback()
             logger.warning(f"Промокод {code} не найден")
             return None
 
-        promo_id = promo[0]
-        discount = promo[2]
+        promo_id, discount, discount_type, expires_at = promo
         is_ruble_promo = code.startswith('1RUB')
 
-        if not is_ruble_promo:
+        if expires_at and datetime.datetime.now() > datetime.datetime.strptime(expires_at, "%Y-%m-%d %H:%M:%S"):
+            conn.rollback()
+            logger.warning(f"Промокод {code} истек")
+            return None
+
+        if not is_reusable_by_user(code):
             cursor.execute("""
-                SELECT id FROM promocode_usage 
+                SELECT 1 FROM promocode_usage 
                 WHERE promocode_id = ? AND user_id = ?
             """, (promo_id, user_id))
 
             if cursor.fetchone():
+                conn.rollback()
                 logger.warning(f"Пользователь {user_id} уже использовал промокод {code}")
                 return None
 
+        # Списываем использование, только если лимит еще не исчерпан
+        cursor.execute("""
+            UPDATE promocodes 
+            SET used_count = used_count + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND used_count < max_uses
+        """, (promo_id,))
+
+        if cursor.rowcount == 0:
+            conn.rollback()
+            logger.warning(f"Достигнуто максимальное количество использований промокода {code}")
+            return None
+
         # Записываем использование
         cursor.execute("""
             INSERT INTO promocode_usage (promocode_id, user_id, order_id)
             VALUES (?, ?, ?)
         """, (promo_id, user_id, order_id))
 
-        # Обновляем счетчик использований
-        cursor.execute("""
-            UPDATE promocodes 
-            SET used_count = used_count + 1 
-            WHERE id = ?
-        """, (promo_id,))
-
         conn.commit()
 
         return {
             'promo_id': promo_id,
             'code': code,
             'discount': discount,
+            'discount_type': discount_type or 'percent',
             'user_id': user_id,
             'order_id': order_id,
             'is_ruble_promo': is_ruble_promo  # Добавляем флаг
@@ -252,6 +277,8 @@ def apply_promocode(code: str, user_id: int, order_id: int) -> dict:
 
     except Exception as e:
         logger.error(f"Ошибка при применении промокода: {e}", exc_info=True)
+        if conn and conn.in_transaction:
+            conn.rollback()
         return None
     finally:
         if conn:
@@ -260,7 +287,7 @@ def apply_promocode(code: str, user_id: int, order_id: int) -> dict:
 
 def get_promocode_usage(promo_id: int) -> list:
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
 
         cursor.execute("""
@@ -339,7 +366,7 @@ def create_seasonal_promocode():
             next_year += 1
 
         expires_at = datetime.datetime(next_year, next_month, 1).strftime("%Y-%m-%d %H:%M:%S")
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
         cursor.execute("SELECT id FROM promocodes WHERE code = ?", (code,))
         existing = cursor.fetchone()
@@ -370,10 +397,10 @@ def create_seasonal_promocode():
 
 def get_promocode_by_code(code: str) -> dict:
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
         cursor.execute("""
-            SELECT p.*, 
+            SELECT p.id, p.code, p.discount, p.max_uses, p.used_count, p.expires_at, p.created_at, p.updated_at,
                    (SELECT COUNT(*) FROM promocode_usage WHERE promocode_id = p.id) as usage_count,
                    (SELECT SUM(o.total_price) 
                     FROM promocode_usage pu
@@ -459,7 +486,7 @@ def get_promocode_by_code(code: str) -> dict:
 
 def add_referral(referrer_id: int, referred_id: int) -> bool:
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
 
         cursor.execute("""
@@ -479,7 +506,7 @@ def add_referral(referrer_id: int, referred_id: int) -> bool:
 
 def get_referral_count(user_id: int) -> int:
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
 
         cursor.execute("""
@@ -516,11 +543,11 @@ def create_ruble_promocode(user_id: int) -> str:
 
 def get_user_ruble_promocodes(user_id: int) -> list:
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
 
         cursor.execute("""
-            SELECT p.*, 
+            SELECT p.id, p.code, p.discount, p.max_uses, p.used_count, p.expires_at, p.created_at, p.updated_at,
                    (SELECT COUNT(*) FROM promocode_usage WHERE promocode_id = p.id) as usage_count
             FROM promocodes p
             WHERE p.code LIKE ? AND p.used_count = 0
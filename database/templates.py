@@ -1,16 +1,15 @@
 import logging
-import sqlite3
 import os
 import json
 from pathlib import Path
 from config import config
+from database.tracing import traced_connect
 
 logger = logging.getLogger('doc_bot.templates')
-logger.info("database/templates.py ЗАГРУЖЕН УСПЕШНО")
 
 def get_templates() -> list:
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
 
         cursor.execute("SELECT id, name, category, description, template_name, created_at FROM templates ORDER BY category, name")
@@ -38,7 +37,7 @@ def get_templates() -> list:
 
 def get_template_by_id(template_id: int) -> dict:
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
 
         cursor.execute("SELECT id, name, category, description, template_name, created_at FROM templates WHERE id = ?", (template_id,))
@@ -66,7 +65,7 @@ def get_template_by_id(template_id: int) -> dict:
 
 def get_templates_by_category(category: str) -> list:
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
         valid_categories = ["business", "realestate", "logistics", "website"]
         if category not in valid_categories and category != "all":
@@ -114,7 +113,7 @@ def create_template(name: str, category: str, description: str, template_name: s
             logger.error(f"Недопустимая категория: {category}. Допустимые категории: {valid_categories}")
             return None
 
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
 
         cursor.execute("""
@@ -147,7 +146,7 @@ def update_template(template_id: int, name: str = None, category: str = None,
                 logger.error(f"Недопустимая категория: {category}. Допустимые категории: {valid_categories}")
                 return False
 
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
         set_clause = []
         values = []
@@ -190,7 +189,7 @@ def update_template(template_id: int, name: str = None, category: str = None,
 
 def get_user_templates(user_id: int) -> list:
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
 
         cursor.execute("""
@@ -229,7 +228,7 @@ def get_user_templates(user_id: int) -> list:
 
 def create_user_template(user_id: int, name: str, document_type: str, data: dict) -> int:
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
         data_str = str(data)
 
@@ -253,7 +252,7 @@ def create_user_template(user_id: int, name: str, document_type: str, data: dict
 
 def get_user_template_by_id(user_id: int, template_id: int) -> dict:
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
 
         cursor.execute("""
@@ -290,7 +289,7 @@ def get_user_template_by_id(user_id: int, template_id: int) -> dict:
 
 def update_user_template(template_id: int, data: dict) -> bool:
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
         data_str = str(data)
 
@@ -314,7 +313,7 @@ def update_user_template(template_id: int, data: dict) -> bool:
 
 def delete_user_template(user_id: int, template_id: int) -> bool:
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
 
         cursor.execute("""
@@ -336,7 +335,7 @@ def delete_user_template(user_id: int, template_id: int) -> bool:
 
 def get_template_by_name(template_name: str) -> dict:
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
 
         cursor.execute("SELECT id, name, category, description, template_name, created_at FROM templates WHERE template_name = ?", (template_name,))
@@ -364,7 +363,7 @@ def get_template_by_name(template_name: str) -> dict:
 
 def get_all_templates() -> list:
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
 
         cursor.execute("SELECT id, name, category, description, template_name, created_at FROM templates ORDER BY category, name")
@@ -458,7 +457,7 @@ def seed_templates():
     ]
 
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
 
         # Проверяем, есть ли уже шаблоны в базе данных
@@ -0,0 +1,246 @@
+import logging
+import re
+import sqlite3
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from functools import lru_cache
+from config import config
+
+logger = logging.getLogger('doc_bot.db.tracing')
+slow_logger = logging.getLogger('doc_bot.db.slow')
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_COMMENT_RE = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+_SPACE_RE = re.compile(r"\s+")
+
+# Текущее обновление: словарь контекста из HandlerMetricsMiddleware
+# ({'handler': ..., 'queries': ..., 'query_time': ...})
+_current_trace = ContextVar('db_trace', default=None)
+
+_lock = threading.Lock()
+# Отпечаток запроса -> [вызовов, суммарное время, максимум, строк]
+_statements = {}
+# Обработчик -> [обновлений, запросов, максимум запросов за обновление, время в БД]
+_handlers = {}
+_started_at = time.time()
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(sql: str) -> str:
+    """
+    Отпечаток запроса: литералы заменены на ?, списки IN (?, ?, ?) свернуты,
+    комментарии убраны, пробелы нормализованы. Одинаковые запросы с разными значениями совпадают.
+    """
+    normalized = _STRING_RE.sub("?", _COMMENT_RE.sub(" ", sql))
+    normalized = _NUMBER_RE.sub("?", normalized)
+    normalized = _SPACE_RE.sub(" ", normalized).strip()
+    return _IN_LIST_RE.sub("IN (...)", normalized)
+
+
+def _caller() -> str:
+    """Функция пакета database, из которой выполнен запрос (только для медленного лога)."""
+    frame = sys._getframe(1)
+    while frame is not None and frame.f_code.co_filename == __file__:
+        frame = frame.f_back
+    if frame is None:
+        return "unknown"
+    module = frame.f_globals.get('__name__', '')
+    return f"{module}.{frame.f_code.co_name}"
+
+
+def _record(statement: str, elapsed: float, rows: int, new_call: bool, statement_elapsed: float):
+    with _lock:
+        stats = _statements.get(statement)
+        if stats is None:
+            stats = _statements[statement] = [0, 0.0, 0.0, 0]
+        if new_call:
+            stats[0] += 1
+        stats[1] += elapsed
+        if statement_elapsed > stats[2]:
+            stats[2] = statement_elapsed
+        stats[3] += rows
+
+    context = _current_trace.get()
+    if context is not None:
+        if new_call:
+            context['queries'] = context.get('queries', 0) + 1
+        context['query_time'] = context.get('query_time', 0.0) + elapsed
+
+
+class TracedCursor(sqlite3.Cursor):
+    """
+    Курсор, который учитывает время выполнения и число прочитанных строк.
+    SQLite читает результат лениво, поэтому время выборки тоже входит в запрос.
+    """
+
+    _statement = None
+    _elapsed = 0.0
+    _rows = 0
+    _slow_logged = False
+
+    def _account(self, elapsed: float, rows: int, new_call: bool = False):
+        self._elapsed += elapsed
+        self._rows += rows
+        _record(self._statement, elapsed, rows, new_call, self._elapsed)
+        if not self._slow_logged and self._elapsed * 1000 >= config.DB_SLOW_QUERY_MS:
+            self._slow_logged = True
+            context = _current_trace.get()
+            handler = context.get('handler', 'unhandled') if context is not None else 'background'
+            slow_logger.warning(
+                f"Медленный запрос {self._elapsed * 1000:.1f} мс, строк: {self._rows}, "
+                f"обработчик: {handler}, функция: {_caller()}: {self._statement}"
+            )
+
+    def _start(self, sql: str):
+        self._statement = fingerprint(sql)
+        self._elapsed = 0.0
+        self._rows = 0
+        self._slow_logged = False
+
+    def execute(self, sql, parameters=()):
+        self._start(sql)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._account(time.perf_counter() - started, 0, new_call=True)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._start(sql)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._account(time.perf_counter() - started, 0, new_call=True)
+
+    def executescript(self, sql_script):
+        self._start(sql_script)
+        started = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            self._account(time.perf_counter() - started, 0, new_call=True)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        if self._statement is not None:
+            self._account(time.perf_counter() - started, 0 if row is None else 1)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        if self._statement is not None:
+            self._account(time.perf_counter() - started, len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        if self._statement is not None:
+            self._account(time.perf_counter() - started, len(rows))
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            if self._statement is not None:
+                self._account(time.perf_counter() - started, 0)
+            raise
+        if self._statement is not None:
+            self._account(time.perf_counter() - started, 1)
+        return row
+
+
+class TracedConnection(sqlite3.Connection):
+    """Соединение, все курсоры которого трассируются (включая conn.execute)."""
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+def traced_connect(database, **kwargs) -> sqlite3.Connection:
+    """sqlite3.connect с трассировкой запросов (если DB_TRACE_ENABLED)."""
+    if config.DB_TRACE_ENABLED:
+        kwargs.setdefault('factory', TracedConnection)
+    return sqlite3.connect(database, **kwargs)
+
+
+def start_update_trace(context: dict):
+    """Начинает подсчет запросов обновления; context заполняется по ходу обработки."""
+    context.setdefault('queries', 0)
+    context.setdefault('query_time', 0.0)
+    return _current_trace.set(context)
+
+
+def finish_update_trace(token, context: dict):
+    """Завершает подсчет запросов обновления и добавляет его в статистику обработчика."""
+    _current_trace.reset(token)
+    queries = context.get('queries', 0)
+    handler = context.get('handler', 'unhandled')
+    with _lock:
+        stats = _handlers.get(handler)
+        if stats is None:
+            stats = _handlers[handler] = [0, 0, 0, 0.0]
+        stats[0] += 1
+        stats[1] += queries
+        if queries > stats[2]:
+            stats[2] = queries
+        stats[3] += context.get('query_time', 0.0)
+    if queries >= config.DB_UPDATE_QUERIES_WARNING:
+        logger.warning(
+            f"Обработчик {handler} выполнил {queries} запросов к БД "
+            f"за одно обновление ({context.get('query_time', 0.0) * 1000:.1f} мс)"
+        )
+
+
+def get_query_stats(limit: int = None, order_by: str = 'total') -> list:
+    """Топ запросов: [{'statement', 'calls', 'total', 'avg', 'max', 'rows'}], время в секундах."""
+    with _lock:
+        items = [
+            {'statement': statement, 'calls': calls, 'total': total,
+             'avg': total / calls if calls else 0.0, 'max': max_time, 'rows': rows}
+            for statement, (calls, total, max_time, rows) in _statements.items()
+        ]
+    items.sort(key=lambda item: item[order_by], reverse=True)
+    return items[:limit] if limit else items
+
+
+def get_handler_query_stats(limit: int = None) -> list:
+    """Запросы к БД по обработчикам: [{'handler', 'updates', 'queries', 'avg', 'max', 'time'}]."""
+    with _lock:
+        items = [
+            {'handler': handler, 'updates': updates, 'queries': queries,
+             'avg': queries / updates if updates else 0.0, 'max': max_queries, 'time': query_time}
+            for handler, (updates, queries, max_queries, query_time) in _handlers.items()
+        ]
+    items.sort(key=lambda item: item['queries'], reverse=True)
+    return items[:limit] if limit else items
+
+
+def get_tracing_started_at() -> float:
+    return _started_at
+
+
+def reset_query_stats():
+    global _started_at
+    with _lock:
+        _statements.clear()
+        _handlers.clear()
+        _started_at = time.time()
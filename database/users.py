@@ -1,15 +1,14 @@
 import logging
-import sqlite3
 import json
 from datetime import datetime, timedelta
 from config import config
+from database.tracing import traced_connect
 
 logger = logging.getLogger('doc_bot.users')
-logger.info("database/users.py ЗАГРУЖЕН УСПЕШНО")
 
 def get_or_create_user(user_id: str, username: str, first_name: str, last_name: str, language_code: str, referrer_id: int = None) -> int:
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
 
         # Проверяем, существует ли пользователь
@@ -59,7 +58,7 @@ def get_or_create_user(user_id: str, username: str, first_name: str, last_name:
 
 def get_user_by_id(user_id: int) -> dict:
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
 
         cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
@@ -120,7 +119,7 @@ def get_user_by_id(user_id: int) -> dict:
 def get_user_balance(user_id: int) -> float:
 
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
 
         cursor.execute("""
@@ -144,7 +143,7 @@ def get_user_balance(user_id: int) -> float:
 
 def update_user_balance(user_id: int, new_balance: float) -> bool:
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
 
         cursor.execute("""
@@ -164,7 +163,7 @@ def update_user_balance(user_id: int, new_balance: float) -> bool:
 
 def get_all_users() -> list:
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
 
         cursor.execute("SELECT * FROM users ORDER BY registered_at DESC")
@@ -211,7 +210,7 @@ def get_all_users() -> list:
 
 def get_partner_stats(user_id: int) -> dict:
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
         cursor.execute("SELECT COUNT(*) FROM users WHERE referrer_id = ?", (user_id,))
         invited = cursor.fetchone()[0]
@@ -248,7 +247,7 @@ def get_partner_stats(user_id: int) -> dict:
 
 def use_partner_points(user_id: int, points: float, order_id: int, description: str = None) -> bool:
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
         stats = get_partner_stats(user_id)
         if stats['available_points'] < points:
@@ -271,7 +270,7 @@ def use_partner_points(user_id: int, points: float, order_id: int, description:
 
 def add_partner_points(user_id: int, points: float, order_id: int, description: str = None) -> bool:
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
         cursor.execute("""
             INSERT INTO partner_points (user_id, points, order_id, description)
@@ -291,7 +290,7 @@ def add_partner_points(user_id: int, points: float, order_id: int, description:
 
 def get_user_referrals(user_id: int) -> list:
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
 
         cursor.execute("""
@@ -328,7 +327,7 @@ def get_referral_link(user_id: int) -> str:
 
 def get_referrer_id(user_id: int) -> int:
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
 
         cursor.execute("SELECT referrer_id FROM users WHERE id = ?", (user_id,))
@@ -348,7 +347,7 @@ def get_referrer_id(user_id: int) -> int:
 
 def add_news_subscriber(user_id: int) -> bool:
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
 
         # Проверяем, существует ли подписка
@@ -389,7 +388,7 @@ def add_news_subscriber(user_id: int) -> bool:
 
 def remove_news_subscriber(user_id: int) -> bool:
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
 
         # Удаляем из таблицы подписчиков
@@ -415,7 +414,7 @@ def remove_news_subscriber(user_id: int) -> bool:
 
 def get_news_subscribers() -> list:
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
 
         cursor.execute("SELECT user_id FROM news_subscribers")
@@ -433,7 +432,7 @@ def get_news_subscribers() -> list:
 
 def get_new_users_count(days: int = 7) -> int:
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
 
         # Вычисляем дату начала периода
@@ -463,7 +462,7 @@ def get_user_reviews_count(user_id: int) -> int:
 
 def save_user_data(user_id: int, template_name: str, filled_data: dict) -> bool:
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
 
         # Проверяем, существует ли уже запись
@@ -501,7 +500,7 @@ def save_user_data(user_id: int, template_name: str, filled_data: dict) -> bool:
 
 def get_user_data(user_id: int, template_name: str = None) -> dict:
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
+        conn = traced_connect(config.DATABASE_PATH)
         cursor = conn.cursor()
 
         if template_name:
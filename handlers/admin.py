@@ -1,15 +1,18 @@
+import asyncio
 import logging
 import json
 import re
 import datetime
 from aiogram import Router, F
-from aiogram.types import CallbackQuery, Message, InlineKeyboardButton, InlineKeyboardMarkup
+from aiogram.types import (
+    CallbackQuery, Message, InlineKeyboardButton, InlineKeyboardMarkup, BufferedInputFile
+)
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from config import config
 from database.users import (
     get_all_users, get_user_by_id, get_user_referrals, get_partner_stats,
-    get_new_users_count, get_news_subscribers
+    get_new_users_count
 )
 from database.orders import (
     get_all_orders, get_order_by_id_full, update_order_status as db_update_order_status,
@@ -21,12 +24,25 @@ from database.promocodes import (
 from database.templates import get_all_templates, create_template as db_create_template
 from database.cart import get_cart_items
 from services.pricing import (
-    get_template_price, get_autogeneration_price, update_price_in_db, get_price_for_type
+    get_template_price, get_autogeneration_price, update_price_in_db, get_price_for_type,
+    get_price_overrides, set_template_price_override
 )
+from services.template_catalog import catalog
 from services.notifications import (
     send_daily_stats_report, send_monthly_stats_report, send_yearly_stats_report
 )
+from database.broadcasts import count_broadcast_recipients, get_unfinished_broadcasts
+from services.broadcast import start_broadcast, cancel_running_broadcast
+from services.outbound import get_outbound_metrics, send_document, PRIORITY_STATS
+from services.profiling import (
+    sample_stacks, is_sampling, format_collapsed, top_leaf_frames,
+    arm_document_profiling, disarm_document_profiling, get_document_profiler
+)
+from database.tracing import (
+    get_query_stats, get_handler_query_stats, get_tracing_started_at, reset_query_stats
+)
 from services.file_utils import get_logs_path
+from services.storage import get_storage_usage, get_last_sweep, sweep_generated_documents, format_bytes
 from texts.messages import ADMIN_PANEL_TEXT
 
 logger = logging.getLogger('doc_bot.admin')
@@ -909,42 +925,29 @@ async def confirm_broadcast(callback: CallbackQuery, state: FSMContext):
             await state.clear() # Очищаем состояние
             return
 
-        subscribers = get_news_subscribers()
-
-        if not subscribers:
-             await callback.message.edit_text(
+        if not count_broadcast_recipients('subscribers'):
+            await callback.message.edit_text(
                 "❌ Нет подписчиков для рассылки.",
                 reply_markup=InlineKeyboardMarkup(inline_keyboard=[
                     [InlineKeyboardButton(text="⬅️ Назад", callback_data="admin_panel")]
                 ])
             )
-             await state.clear()
-             return
-
-
-        success_count = 0
-        fail_count = 0
+            return
 
-        for user_id_sub in subscribers:
-            try:
-                # Отправляем сообщение каждому подписчику
-                await callback.send_message(chat_id=user_id_sub, text=text, parse_mode="HTML")
-                success_count += 1
-                # Небольшая задержка, чтобы избежать ограничений Telegram API
-                # import asyncio
-                # await asyncio.sleep(0.1)
-            except Exception as e:
-                logger.error(f"Ошибка отправки рассылки пользователю {user_id_sub}: {e}")
-                fail_count += 1
+        # Рассылка идет в фоне с ограничением скорости, отчет придет по завершении
+        broadcast_id = start_broadcast(callback.bot, text, admin_id=user_id)
+        if not broadcast_id:
+            await callback.answer("⚠️ Не удалось создать рассылку", show_alert=True)
+            return
 
         await callback.message.edit_text(
-            f"📤 Рассылка завершена!\n"
-            f"✅ Успешно: {success_count}\n"
-            f"❌ Ошибок: {fail_count}",
+            f"📤 Рассылка #{broadcast_id} запущена.\n"
+            f"Отчет о результатах придет отдельным сообщением.",
             reply_markup=InlineKeyboardMarkup(inline_keyboard=[
                 [InlineKeyboardButton(text="⬅️ Назад", callback_data="admin_panel")]
             ])
         )
+        await callback.answer()
 
     except Exception as e:
         logger.error(f"Ошибка при отправке рассылки: {e}", exc_info=True)
@@ -984,15 +987,15 @@ async def handle_stats_request(message: Message):
         command = message.text.strip().lower()
         if "/stats daily" in command or "/stats day" in command:
             # Отправляем ежедневную статистику
-            await send_daily_stats_report()
+            await send_daily_stats_report(bot=message.bot)
             await message.reply("📊 Ежедневная статистика отправлена в группу.")
         elif "/stats monthly" in command or "/stats month" in command:
             # Отправляем ежемесячную статистику
-            await send_monthly_stats_report()
+            await send_monthly_stats_report(bot=message.bot)
             await message.reply("📊 Ежемесячная статистика отправлена в группу.")
         elif "/stats yearly" in command or "/stats year" in command:
             # Отправляем годовую статистику
-            await send_yearly_stats_report()
+            await send_yearly_stats_report(bot=message.bot)
             await message.reply("📊 Годовая статистика отправлена в группу.")
         elif "/stats" in command:
             # Отправляем краткую статистику
@@ -1044,4 +1047,319 @@ async def handle_promocodes_request(message: Message):
         await message.reply(promocodes_text)
     except Exception as e:
         logger.error(f"Ошибка при обработке команды /promocodes в группе: {e}", exc_info=True)
-        await message.reply("⚠️ Произошла ошибка при обработке команды.")
\ No newline at end of file
+        await message.reply("⚠️ Произошла ошибка при обработке команды.")
+
+
+@router.message(F.text.startswith("/queue"))
+async def handle_queue_request(message: Message):
+    # Проверяем, что сообщение пришло в чат поддержки от администратора
+    if str(message.chat.id) != str(config.SUPPORT_CHAT_ID):
+        return
+
+    if not is_admin(message.from_user.id):
+        return
+
+    try:
+        metrics = get_outbound_metrics()
+        by_priority = metrics['sent_by_priority']
+        await message.reply(
+            f"📬 Очередь исходящих сообщений:\n"
+            f"В очереди: {metrics['queue_size']} (отложено: {metrics['delayed']})\n"
+            f"Отправлено: {metrics['sent']} (документы: {by_priority['document']}, "
+            f"пользователи: {by_priority['user']}, статистика: {by_priority['stats']}, "
+            f"рассылки: {by_priority['marketing']})\n"
+            f"Ошибок: {metrics['failed']}, повторов: {metrics['retried']}, "
+            f"RetryAfter: {metrics['rate_limited']}\n"
+            f"Склеено в сводки: {metrics['coalesced']} (сводок: {metrics['digests']})\n"
+            f"Ожидание в очереди: среднее {metrics['wait_avg']:.2f} сек, макс. {metrics['wait_max']:.2f} сек"
+        )
+    except Exception as e:
+        logger.error(f"Ошибка при обработке команды /queue в группе: {e}", exc_info=True)
+        await message.reply("⚠️ Произошла ошибка при обработке команды.")
+
+
+@router.message(F.text.startswith("/broadcast_cancel"))
+async def handle_broadcast_cancel_request(message: Message):
+    """/broadcast_cancel [id] — остановить рассылку; без id — список идущих рассылок."""
+    if str(message.chat.id) != str(config.SUPPORT_CHAT_ID):
+        return
+
+    if not is_admin(message.from_user.id):
+        return
+
+    try:
+        args = message.text.split()[1:]
+        if not args:
+            running = get_unfinished_broadcasts()
+            if not running:
+                await message.reply("📤 Сейчас нет идущих рассылок.")
+                return
+            lines = ["📤 Идущие рассылки:"]
+            for broadcast in running:
+                lines.append(
+                    f"• #{broadcast['id']}: отправлено {broadcast['sent']}, ошибок {broadcast['failed']} "
+                    f"(с {broadcast['created_at']})"
+                )
+            lines.append("\nОстановить: /broadcast_cancel <id>")
+            await message.reply("\n".join(lines))
+            return
+
+        if not args[0].isdigit():
+            await message.reply("ℹ️ Использование: /broadcast_cancel <id>")
+            return
+
+        broadcast_id = int(args[0])
+        if cancel_running_broadcast(broadcast_id):
+            logger.info(f"Администратор {message.from_user.id} остановил рассылку #{broadcast_id}")
+            await message.reply(f"⛔ Рассылка #{broadcast_id} остановлена.")
+        else:
+            await message.reply(f"⚠️ Рассылка #{broadcast_id} не найдена или уже завершена.")
+    except Exception as e:
+        logger.error(f"Ошибка при обработке команды /broadcast_cancel в группе: {e}", exc_info=True)
+        await message.reply("⚠️ Произошла ошибка при обработке команды.")
+
+
+@router.message(F.text.startswith("/dbstats"))
+async def handle_dbstats_request(message: Message):
+    """/dbstats [N|reset] — топ запросов к БД по суммарному времени и запросы по обработчикам."""
+    if str(message.chat.id) != str(config.SUPPORT_CHAT_ID):
+        return
+
+    if not is_admin(message.from_user.id):
+        return
+
+    try:
+        args = message.text.split()[1:]
+        if args and args[0].lower() == "reset":
+            reset_query_stats()
+            await message.reply("🗄 Статистика запросов к БД сброшена.")
+            return
+        if not config.DB_TRACE_ENABLED:
+            await message.reply("Трассировка запросов отключена (DB_TRACE_ENABLED=false).")
+            return
+
+        limit = int(args[0]) if args and args[0].isdigit() else config.DB_STATS_TOP
+        statements = get_query_stats(limit)
+        if not statements:
+            await message.reply("Запросов к БД пока не было.")
+            return
+
+        since = datetime.datetime.fromtimestamp(get_tracing_started_at()).strftime('%d.%m.%Y %H:%M')
+        lines = [f"🗄 Топ-{len(statements)} запросов по суммарному времени (с {since}):"]
+        for number, item in enumerate(statements, 1):
+            statement = item['statement']
+            if len(statement) > 150:
+                statement = statement[:147] + "..."
+            lines.append(
+                f"{number}. {item['total'] * 1000:.0f} мс, вызовов: {item['calls']}, "
+                f"сред.: {item['avg'] * 1000:.2f} мс, макс.: {item['max'] * 1000:.1f} мс, "
+                f"строк: {item['rows']}\n   {statement}"
+            )
+
+        handlers_stats = get_handler_query_stats(limit)
+        if handlers_stats:
+            lines.append("\n📨 Запросы на одно обновление по обработчикам:")
+            for item in handlers_stats:
+                lines.append(
+                    f"• {item['handler']}: сред. {item['avg']:.1f}, макс. {item['max']}, "
+                    f"обновлений: {item['updates']}, время в БД: {item['time'] * 1000:.0f} мс"
+                )
+
+        text = "\n".join(lines)
+        # Ограничение Telegram на длину сообщения
+        if len(text) > 4000:
+            text = text[:3997] + "..."
+        await message.reply(text)
+    except Exception as e:
+        logger.error(f"Ошибка при обработке команды /dbstats в группе: {e}", exc_info=True)
+        await message.reply("⚠️ Произошла ошибка при обработке команды.")
+
+@router.message(F.text.startswith("/profile"))
+async def handle_profile_request(message: Message):
+    """
+    /profile [секунды] — семплирование стеков всех потоков, файл collapsed для flamegraph.
+    /profile docs [K|off] — cProfile для следующих K вызовов generate_document.
+    """
+    if str(message.chat.id) != str(config.SUPPORT_CHAT_ID):
+        return
+
+    if not is_admin(message.from_user.id):
+        return
+
+    try:
+        args = message.text.split()[1:]
+        if args and args[0].lower() == "docs":
+            await _handle_profile_docs(message, args[1:])
+            return
+
+        seconds = int(args[0]) if args and args[0].isdigit() else 30
+        seconds = max(1, min(seconds, config.PROFILE_MAX_SECONDS))
+        if is_sampling():
+            await message.reply("⏳ Семплирование уже идет, дождитесь его окончания.")
+            return
+
+        await message.reply(f"🔬 Семплирование стеков на {seconds} сек...")
+        result = await asyncio.to_thread(sample_stacks, seconds)
+        if result is None:
+            await message.reply("⏳ Семплирование уже идет, дождитесь его окончания.")
+            return
+
+        stacks, samples = result
+        lines = [f"🔬 Профиль за {seconds} сек: {samples} снимков, {len(stacks)} уникальных стеков.",
+                 "Чаще всего на вершине стека:"]
+        for frame, count in top_leaf_frames(stacks):
+            lines.append(f"• {frame}: {count}")
+        lines.append("Файл открывается в speedscope.app или flamegraph.pl.")
+        caption = "\n".join(lines)
+        # Ограничение Telegram на длину подписи
+        if len(caption) > 1024:
+            caption = caption[:1021] + "..."
+
+        filename = f"profile_{datetime.datetime.now():%Y%m%d_%H%M%S}.collapsed.txt"
+        await message.reply_document(
+            BufferedInputFile(format_collapsed(stacks).encode('utf-8'), filename=filename),
+            caption=caption
+        )
+    except Exception as e:
+        logger.error(f"Ошибка при обработке команды /profile в группе: {e}", exc_info=True)
+        await message.reply("⚠️ Произошла ошибка при обработке команды.")
+
+async def _handle_profile_docs(message: Message, args: list):
+    if args and args[0].lower() == "off":
+        profiler = disarm_document_profiling()
+        if profiler is None:
+            await message.reply("Профилирование генерации документов не включено.")
+        elif profiler.finish():
+            await message.reply("🔬 Профилирование выключено, отчет по собранным вызовам отправлен.")
+        else:
+            await message.reply("🔬 Профилирование выключено, документы за это время не генерировались.")
+        return
+
+    if get_document_profiler() is not None:
+        await message.reply("⏳ Профилирование генерации документов уже включено (/profile docs off — выключить).")
+        return
+
+    calls = int(args[0]) if args and args[0].isdigit() else 1
+    calls = max(1, min(calls, config.PROFILE_MAX_DOCUMENT_CALLS))
+    loop = asyncio.get_running_loop()
+    chat_id, bot = message.chat.id, message.bot
+
+    def on_done(report: str, profiled: int):
+        # Вызывается там, где шла генерация, поэтому отправка передается в event loop
+        filename = f"generate_document_{datetime.datetime.now():%Y%m%d_%H%M%S}.txt"
+        asyncio.run_coroutine_threadsafe(
+            send_document(
+                chat_id, BufferedInputFile(report.encode('utf-8'), filename=filename),
+                priority=PRIORITY_STATS, bot=bot, wait=False,
+                caption=f"🔬 cProfile generate_document: {profiled} вызовов"
+            ),
+            loop
+        )
+
+    arm_document_profiling(calls, on_done)
+    await message.reply(
+        f"🔬 Следующие {calls} вызовов generate_document будут профилированы, "
+        f"отчет придет в этот чат. /profile docs off — выключить."
+    )
+
+@router.message(F.text.startswith("/storage"))
+async def handle_storage_request(message: Message):
+    """/storage [sweep] — место под сгенерированные документы и результат последней очистки."""
+    if str(message.chat.id) != str(config.SUPPORT_CHAT_ID):
+        return
+
+    if not is_admin(message.from_user.id):
+        return
+
+    try:
+        args = message.text.split()[1:]
+        if args and args[0].lower() == "sweep":
+            await message.reply("🧹 Очистка документов запущена...")
+            stats = await asyncio.to_thread(sweep_generated_documents)
+            if stats is None:
+                await message.reply("⏳ Очистка уже идет или завершилась ошибкой, подробности в логе.")
+                return
+        else:
+            stats = get_last_sweep()
+
+        usage = await asyncio.to_thread(get_storage_usage)
+        lines = [
+            "💾 Сгенерированные документы:",
+            f"• Занято: {format_bytes(usage['bytes'])} из {config.DOCUMENT_STORAGE_QUOTA_MB} МБ",
+            f"• Файлов: {usage['files']}, пользователей: {usage['users']}",
+            f"• Хранение: {config.DOCUMENT_RETENTION_DAYS} дн., на пользователя: "
+            f"{config.DOCUMENT_USER_QUOTA_MB} МБ / {config.DOCUMENT_USER_MAX_FILES} файлов",
+        ]
+        if stats:
+            finished = datetime.datetime.fromtimestamp(stats['finished_at']).strftime('%d.%m.%Y %H:%M')
+            lines += [
+                f"\n🧹 Последняя очистка ({finished}, {stats['duration']:.1f} сек):",
+                f"• Освобождено: {format_bytes(stats.get('reclaimed_bytes', 0))}",
+                f"• Удалено по возрасту: {stats.get('deleted_expired', 0)}, по квоте пользователя: "
+                f"{stats.get('deleted_user_quota', 0)}, по общей квоте: {stats.get('deleted_global_quota', 0)}",
+                f"• Дубликатов заменено ссылками: {stats.get('deduplicated', 0)}",
+                f"• Временных файлов удалено: {stats.get('temp_deleted', 0)}",
+            ]
+            if stats.get('migrated'):
+                lines.append(f"• Перенесено из старых каталогов: {stats['migrated']}")
+        else:
+            lines.append("\nОчистка еще не запускалась (/storage sweep — запустить сейчас).")
+        await message.reply("\n".join(lines))
+    except Exception as e:
+        logger.error(f"Ошибка при обработке команды /storage в группе: {e}", exc_info=True)
+        await message.reply("⚠️ Произошла ошибка при обработке команды.")
+
+@router.message(F.text.startswith("/template_price"))
+async def handle_template_price_request(message: Message):
+    """/template_price <шаблон> <template|autogen> <цена|off> — цена для отдельного шаблона."""
+    if str(message.chat.id) != str(config.SUPPORT_CHAT_ID):
+        return
+
+    if not is_admin(message.from_user.id):
+        return
+
+    try:
+        args = message.text.split()[1:]
+        if len(args) == 1:
+            template_name = args[0]
+            overrides = get_price_overrides(template_name)
+            if not overrides:
+                await message.reply(f"Для шаблона {template_name} действуют базовые цены.")
+            else:
+                await message.reply(
+                    f"🏷 Цены шаблона {template_name}:\n" +
+                    "\n".join(f"• {service_type}: {price} ₽" for service_type, price in overrides.items())
+                )
+            return
+
+        if len(args) != 3 or args[1] not in ("template", "autogen"):
+            await message.reply("Использование: /template_price <шаблон> <template|autogen> <цена|off>")
+            return
+
+        template_name, service_type, value = args
+        if catalog.get(template_name) is None:
+            await message.reply(f"⚠️ Шаблон {template_name} не найден")
+            return
+
+        if value.lower() == "off":
+            new_price = None
+        else:
+            try:
+                new_price = int(float(value))
+            except ValueError:
+                await message.reply("Пожалуйста, введите корректное число для цены.")
+                return
+            if new_price < 0:
+                await message.reply("Цена не может быть отрицательной.")
+                return
+
+        if set_template_price_override(template_name, service_type, new_price):
+            if new_price is None:
+                await message.reply(f"✅ Для шаблона {template_name} ({service_type}) восстановлена базовая цена")
+            else:
+                await message.reply(f"✅ Цена шаблона {template_name} ({service_type}) установлена: {new_price} ₽")
+        else:
+            await message.reply("❌ Ошибка при обновлении цены. Проверьте логи.")
+    except Exception as e:
+        logger.error(f"Ошибка при обработке команды /template_price: {e}", exc_info=True)
+        await message.reply("⚠️ Произошла ошибка при обработке команды.")
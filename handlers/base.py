@@ -16,6 +16,7 @@ from database.users import get_or_create_user
 from database.cart import get_user_cart, clear_cart
 from database.promocodes import add_referral, create_ruble_promocode
 from services.notifications import notify_support_about_support_request
+from services.outbound import send_message
 from config import config
 
 logger = logging.getLogger('doc_bot.base')
@@ -81,8 +82,9 @@ async def cmd_start(message: Message, command: CommandObject, state: FSMContext)
                         promo_referrer = create_ruble_promocode(referrer_id)
                         if promo_referrer:
                             try:
-                                await message.bot.send_message(
-                                    chat_id=referrer_id,
+                                await send_message(
+                                    referrer_id,
+                                    bot=message.bot,
                                     text=f"🎁 Отлично! Пользователь перешёл по вашей ссылке.\n\n"
                                          f"Ваш бонус — промокод на <b>1 бесплатный заказ</b>: <code>{promo_referrer}</code>",
                                     parse_mode="HTML"
@@ -279,7 +281,11 @@ async def process_support_message(message: Message, state: FSMContext):
     logger.info(f"Получено сообщение в поддержку от пользователя {message.from_user.id}")
 
     try:
-        await notify_support_about_support_request(message.from_user.id, message.text)
+        await notify_support_about_support_request(
+            bot=message.bot,
+            user_id=message.from_user.id,
+            message_text=message.text
+        )
 
         await message.answer(
             "✅ Ваше сообщение отправлено в поддержку!\n\n"
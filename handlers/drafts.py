@@ -15,6 +15,7 @@ from texts.messages import (
     DRAFT_NOT_FOUND_TEXT
 )
 from handlers.filling import ask_question_callback
+from services.template_registry import get_doc_info
 
 logger = logging.getLogger('doc_bot.drafts')
 router = Router(name="drafts_router")
@@ -123,14 +124,19 @@ async def continue_draft(callback: CallbackQuery, state: FSMContext):
             await callback.answer()
             return
 
-        await state.update_data(
-            filling_document={
-                'id': draft['template_id'],
-                'name': draft['document_name'],
-            },
-            answers=draft['answers'],
-            current_question=draft['current_index']
-        )
+        doc_info = get_doc_info(draft['template_id'])
+        if not doc_info:
+            await callback.answer("❌ Шаблон черновика больше недоступен", show_alert=True)
+            return
+
+        await state.set_data({
+            'template_name': draft['template_id'],
+            'category': doc_info.get('category'),
+            'fill_type': 'autogen',
+            'current_question': draft['current_index'],
+            'answers': draft['answers'],
+            'use_last_draft': False
+        })
         await ask_question_callback(callback, state)
 
     except Exception as e:
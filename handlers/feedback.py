@@ -11,6 +11,7 @@ from aiogram.filters import StateFilter
 from config import config
 from database.users import get_user_reviews_count
 from database.orders import get_user_orders
+from services.outbound import send_message
 
 logger = logging.getLogger('doc_bot.feedback')
 router = Router()
@@ -193,8 +194,9 @@ async def process_publish_type(callback: CallbackQuery, state: FSMContext):
         )
 
     try:
-        await callback.message.bot.send_message(
-            chat_id=config.REVIEWS_CHANNEL_ID,
+        await send_message(
+            config.REVIEWS_CHANNEL_ID,
+            bot=callback.bot,
             text=publish_text,
             parse_mode="HTML"
         )
@@ -1,3 +1,5 @@
+import html
+import io
 import logging
 from datetime import datetime
 from aiogram import Router, F
@@ -5,11 +7,15 @@ from aiogram.types import CallbackQuery, Message, InlineKeyboardButton, InlineKe
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from config import config
-from services.document_service import get_template_by_id_from_filesystem, get_template_info, load_questions
-from services.pricing import get_template_price, get_autogeneration_price
-from services.validators import validate_field
+from services.document_service import get_template_by_id_from_filesystem, get_template_info
+from services.template_registry import get_template_entry, get_questions, get_doc_info, get_flow, get_validators
+from services.validators import compile_validator
+from services.bulk_fill import (
+    parse_key_value_text, parse_bulk_file, apply_bulk_answers, build_bulk_example, MAX_BULK_FILE_SIZE
+)
 from database.cart import add_to_cart, get_user_cart
 from database.drafts import save_draft, delete_draft, get_last_template_draft, save_last_template_draft
+from database.orders import get_last_order_item_data
 from texts.messages import (
     FILLING_QUESTION_TEXT,
     FILLING_REVIEW_TEXT,
@@ -34,6 +40,9 @@ FIELDS_NEVER_FROM_DRAFT = {
     "date_of_signature"
 }
 
+# Ограничение числа элементов повторяющейся группы, если в questions.json не задано max_items
+REPEAT_MAX_ITEMS = 50
+
 
 class FillingStates(StatesGroup):
     WAITING_FOR_ANSWER = State()
@@ -41,9 +50,8 @@ class FillingStates(StatesGroup):
     SELECTING_MULTI = State()
     WAITING_FOR_CHOICE = State()
     USE_LAST_DRAFT_DECISION = State()
-    INVENTORY_ASKING_NAME = State()
-    INVENTORY_ASKING_QUANTITY = State()
-    INVENTORY_ASKING_CONDITION = State()
+    REPEAT_FIELD = State()
+    BULK_INPUT = State()
 
 
 def format_item_count(count: int) -> str:
@@ -95,6 +103,23 @@ def create_prefill_keyboard(step_index: str) -> InlineKeyboardMarkup:
     ])
 
 
+def with_bulk_fill_button(markup: InlineKeyboardMarkup, question_index: int, data: dict) -> InlineKeyboardMarkup:
+    """На первом вопросе предлагает заполнить анкету одним сообщением."""
+    if question_index == 0 and not data.get("answers"):
+        markup.inline_keyboard.append(
+            [InlineKeyboardButton(text="📋 Заполнить списком или файлом", callback_data="bulk_fill")]
+        )
+    return markup
+
+
+def get_next_question_index(data: dict, current_index: int) -> int:
+    flow = get_flow(data["template_name"])
+    if data.get("bulk_fill"):
+        # После пакетного заполнения спрашиваем только недостающие и ошибочные поля
+        return flow.next_unanswered(data["answers"], current_index)
+    return flow.next_index(data["answers"], current_index)
+
+
 @router.callback_query(F.data.startswith("fill_"))
 async def start_filling(callback: CallbackQuery, state: FSMContext):
     """Начинает процесс заполнения документа"""
@@ -119,23 +144,23 @@ async def start_filling(callback: CallbackQuery, state: FSMContext):
             await callback.answer("❌ Шаблон не найден", show_alert=True)
             return
 
-        template_info = get_template_info(template['template_name'], category_key)
-        questions = load_questions(template['template_name'])
-        if not questions:
-            logger.error(f"Вопросы для шаблона {template['template_name']} не найдены")
+        template_name = template['template_name']
+        if not get_template_entry(template_name, category_key):
+            logger.error(f"Вопросы для шаблона {template_name} не найдены")
             await callback.answer("❌ Не удалось загрузить вопросы для заполнения", show_alert=True)
             return
 
-        last_draft = get_last_template_draft(user_id, doc_id)
-        if last_draft is not None:
-            await state.update_data(
-                category=category_key,
-                doc_id=doc_id,
-                doc_info=template_info,
-                fill_type=fill_type,
-                questions=questions,
-                last_draft=last_draft
-            )
+        # В состоянии храним только ссылку на шаблон, вопросы берутся из реестра
+        await state.set_data({
+            'template_name': template_name,
+            'category': category_key,
+            'fill_type': fill_type,
+            'current_question': 0,
+            'answers': {},
+            'use_last_draft': False
+        })
+
+        if get_last_template_draft(user_id, template_name) is not None:
             await callback.message.edit_text(
                 "📝 Найден ваш последний договор.\nИспользовать его данные как основу?",
                 reply_markup=InlineKeyboardMarkup(inline_keyboard=[
@@ -145,16 +170,6 @@ async def start_filling(callback: CallbackQuery, state: FSMContext):
             )
             await state.set_state(FillingStates.USE_LAST_DRAFT_DECISION)
         else:
-            await state.update_data(
-                category=category_key,
-                doc_id=doc_id,
-                doc_info=template_info,
-                fill_type=fill_type,
-                questions=questions,
-                current_question=0,
-                answers={},
-                use_last_draft=False
-            )
             await ask_question_callback(callback, state)
 
     except Exception as e:
@@ -164,11 +179,14 @@ async def start_filling(callback: CallbackQuery, state: FSMContext):
 
 @router.callback_query(F.data == "use_last_draft_yes")
 async def use_last_draft_yes(callback: CallbackQuery, state: FSMContext):
+    # Черновик читается один раз и живет в состоянии, пока идет заполнение (до первой проверки)
     data = await state.get_data()
+    last_draft = get_last_template_draft(callback.from_user.id, data["template_name"]) or {}
     await state.update_data(
         current_question=0,
         answers={},
-        use_last_draft=True
+        use_last_draft=bool(last_draft),
+        last_draft=last_draft
     )
     await ask_question_callback(callback, state)
     await callback.answer()
@@ -185,78 +203,36 @@ async def use_last_draft_no(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
-async def check_condition_and_get_next_valid_question_index(questions: list, answers: dict, current_index: int) -> int:
-    index = current_index
-    while index < len(questions):
-        question = questions[index]
-        condition_str = question.get("condition")
-
-        if condition_str:
-            if "==" in condition_str:
-                left_side, right_side = condition_str.split("==", 1)
-                left_side = left_side.strip()
-                right_side = right_side.strip().strip("'\"")
-
-                dependent_question_index = None
-                for idx, q in enumerate(questions):
-                    if q.get("step") == left_side:
-                        dependent_question_index = str(idx)
-                        break
-
-                if dependent_question_index is not None:
-                    user_answer = answers.get(dependent_question_index)
-                    if user_answer != right_side:
-                        logger.debug(f"Условие '{condition_str}' не выполнено для вопроса {index}, пропускаем.")
-                        index += 1
-                        continue
-                    else:
-                        logger.debug(f"Условие '{condition_str}' выполнено для вопроса {index}.")
-                        break
-                else:
-                    logger.warning(f"Зависимый вопрос '{left_side}' не найден для условия '{condition_str}' в вопросе {index}.")
-                    index += 1
-                    continue
-            else:
-                logger.warning(f"Неподдерживаемый формат условия '{condition_str}' в вопросе {index}.")
-                index += 1
-                continue
-        else:
-            logger.debug(f"Нет условия для вопроса {index}, задаём его.")
-            break
+def get_prefill_value(data: dict, question: dict, question_index: int):
+    """Значение из последнего черновика пользователя, если он решил его использовать."""
+    step_name = question.get("step")
+    if (
+        not data.get("use_last_draft")
+        or step_name is None
+        or step_name in FIELDS_NEVER_FROM_DRAFT
+        or str(question_index) in data["answers"]
+    ):
+        return None
 
-    return index
+    last_draft = data.get("last_draft") or {}
+    return last_draft.get(str(question_index)) or last_draft.get(step_name)
 
 
 async def ask_question_callback(callback: CallbackQuery, state: FSMContext):
     try:
         data = await state.get_data()
-        doc_id = data.get("doc_id")
-        questions = data["questions"]
+        template_name = data["template_name"]
+        questions = get_questions(template_name)
         current_question_index = data["current_question"]
 
-        # === СПЕЦИАЛЬНАЯ ЛОГИКА ДЛЯ ОПИСИ ИМУЩЕСТВА ===
-        if doc_id == "inventory_2025":
-            if current_question_index >= len(questions):
-                # Перешли к динамической части
-                add_first = data["answers"].get("6")  # индекс вопроса add_first_item
-                if add_first == "Нет":
-                    await finalize_inventory_filling(callback, state)
-                    return
-                else:
-                    await state.update_data(inventory_item_index=1)
-                    await ask_inventory_name(callback, state, 1)
-                    return
-
-        # === СТАНДАРТНАЯ ЛОГИКА ===
-        use_last_draft = data.get("use_last_draft", False)
-        last_draft = data.get("last_draft", {})
-        next_valid_question_index = await check_condition_and_get_next_valid_question_index(
-            questions, data["answers"], current_question_index
-        )
+        next_valid_question_index = get_next_question_index(data, current_question_index)
 
         if next_valid_question_index >= len(questions):
+            # Пакетный режим и подстановка из черновика — только до первой проверки,
+            # дальше «Изменить» проходит все вопросы
+            await state.update_data(bulk_fill=False, use_last_draft=False, last_draft=None)
             await save_draft_to_db(callback.from_user.id, data)
-            save_last_template_draft(callback.from_user.id, data["doc_id"], data["answers"])
+            save_last_template_draft(callback.from_user.id, template_name, data["answers"])
             await show_review_message(callback, state)
             return
 
@@ -265,21 +241,16 @@ async def ask_question_callback(callback: CallbackQuery, state: FSMContext):
             current_question_index = next_valid_question_index
 
         question = questions[current_question_index]
-        step_name = question.get("step")
-
-        should_use_prefill = (
-            use_last_draft
-            and step_name is not None
-            and step_name not in FIELDS_NEVER_FROM_DRAFT
-            and str(current_question_index) not in data["answers"]
-        )
+        if question.get("type") == "repeat":
+            await ask_repeat_question(callback.message, state, current_question_index, edit=True)
+            return
 
-        prefill_value = None
-        if should_use_prefill:
-            prefill_value = last_draft.get(str(current_question_index)) or last_draft.get(step_name)
+        prefill_value = get_prefill_value(data, question, current_question_index)
 
         if question.get("type") == "choice":
-            markup = create_choice_keyboard(question["options"], str(current_question_index))
+            markup = with_bulk_fill_button(
+                create_choice_keyboard(question["options"], str(current_question_index)), current_question_index, data
+            )
             question_text = FILLING_QUESTION_TEXT.format(
                 question_number=current_question_index + 1,
                 total_questions=len(questions),
@@ -293,7 +264,10 @@ async def ask_question_callback(callback: CallbackQuery, state: FSMContext):
 
         if question.get("type") == "multi_select":
             selected = data["answers"].get(str(current_question_index), [])
-            markup = create_multiselect_keyboard(selected, question["options"], str(current_question_index))
+            markup = with_bulk_fill_button(
+                create_multiselect_keyboard(selected, question["options"], str(current_question_index)),
+                current_question_index, data
+            )
             await callback.message.edit_text(
                 text=question["text"] + f"\n\n{question.get('hint', '')}",
                 reply_markup=markup
@@ -323,7 +297,7 @@ async def ask_question_callback(callback: CallbackQuery, state: FSMContext):
                 [InlineKeyboardButton(text="⏭ Пропустить", callback_data=f"skip_{current_question_index}")],
                 [InlineKeyboardButton(text="🗑️ Отменить", callback_data="cancel_filling")]
             ]
-            markup = InlineKeyboardMarkup(inline_keyboard=buttons)
+            markup = with_bulk_fill_button(InlineKeyboardMarkup(inline_keyboard=buttons), current_question_index, data)
             if current_question_index == 0:
                 await callback.message.edit_text(text=question_text, parse_mode="HTML", reply_markup=markup)
             else:
@@ -335,104 +309,164 @@ async def ask_question_callback(callback: CallbackQuery, state: FSMContext):
         await callback.answer("⚠️ Произошла ошибка при задавании вопроса", show_alert=True)
 
 
-async def finalize_inventory_filling(callback: CallbackQuery, state: FSMContext):
+def format_answer(question: dict, answer) -> str:
+    """Ответ для экрана проверки; повторяющаяся группа — по элементу на строку."""
+    if question.get("type") != "repeat":
+        return str(answer)
+    if not isinstance(answer, list) or not answer:
+        return "Не указано"
+    fields = question.get("fields", [])
+    lines = []
+    for number, item in enumerate(answer, 1):
+        values = "; ".join(str(item.get(field["step"]) or "—") for field in fields)
+        lines.append(f"\n      {number}) {values}")
+    return "".join(lines)
+
+
+def build_answers_summary(questions: list, answers: dict) -> str:
+    answers_summary = ""
+    for i, question in enumerate(questions, 1):
+        answer = answers.get(str(i - 1), "Не указано")
+        answers_summary += f"{i}. {question['text']}\n   ➤ {format_answer(question, answer)}\n\n"
+    return answers_summary
+
+
+async def ask_repeat_question(message: Message, state: FSMContext, question_index: int, edit: bool = False):
+    """Повторяющаяся группа: показывает добавленные элементы и предлагает добавить еще."""
     data = await state.get_data()
-    await save_draft_to_db(callback.from_user.id, data)
-    save_last_template_draft(callback.from_user.id, data["doc_id"], data["answers"])
-    await show_review_message(callback, state)
+    question = get_questions(data["template_name"])[question_index]
+    items = data["answers"].get(str(question_index), [])
+    item_name = question.get("item_name", "элемент")
 
+    text = f"<b>{question['text']}</b>"
+    if question.get("hint"):
+        text += f"\n\n{question['hint']}"
+    if items:
+        text += f"\n\nДобавлено: {len(items)}" + format_answer(question, items)
 
-async def ask_inventory_name(callback: CallbackQuery, state: FSMContext, item_index: int):
-    text = f"➕ <b>{item_index}. Название предмета:</b>\nНапример: диван, холодильник, шкаф"
-    markup = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="⏭ Пропустить всё", callback_data="inventory_skip_all")],
-        [InlineKeyboardButton(text="🗑️ Отменить", callback_data="cancel_filling")]
-    ])
-    await callback.message.edit_text(text=text, parse_mode="HTML", reply_markup=markup)
-    await state.set_state(FillingStates.INVENTORY_ASKING_NAME)
+    buttons = []
+    if len(items) < question.get("max_items", REPEAT_MAX_ITEMS):
+        add_text = f"➕ Добавить {item_name}" if not items else "➕ Добавить еще"
+        buttons.append([InlineKeyboardButton(text=add_text, callback_data=f"repeat_add_{question_index}")])
+    # Обязательную группу нельзя завершить, пока не добавлен хотя бы один элемент
+    if items or not question.get("required"):
+        done_text = "✅ Готово" if items else "⏭ Пропустить"
+        buttons.append([InlineKeyboardButton(text=done_text, callback_data=f"repeat_done_{question_index}")])
+    buttons.append([InlineKeyboardButton(text="🗑️ Отменить", callback_data="cancel_filling")])
+    markup = InlineKeyboardMarkup(inline_keyboard=buttons)
 
+    if edit:
+        await message.edit_text(text=text, parse_mode="HTML", reply_markup=markup)
+    else:
+        await message.answer(text=text, parse_mode="HTML", reply_markup=markup)
+    await state.update_data(current_question=question_index, repeat_item=None, repeat_field=0)
+    await state.set_state(FillingStates.WAITING_FOR_CHOICE)
 
-async def ask_inventory_quantity(message: Message, state: FSMContext, item_index: int):
-    text = f"➕ <b>{item_index}. Количество:</b>\nЦелое число (например: 1, 2)"
-    markup = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="⏭ Пропустить всё", callback_data="inventory_skip_all")],
-        [InlineKeyboardButton(text="🗑️ Отменить", callback_data="cancel_filling")]
-    ])
-    await message.answer(text=text, parse_mode="HTML", reply_markup=markup)
-    await state.set_state(FillingStates.INVENTORY_ASKING_QUANTITY)
 
+async def ask_repeat_field(message: Message, state: FSMContext, question_index: int, field_index: int):
+    data = await state.get_data()
+    question = get_questions(data["template_name"])[question_index]
+    field = question["fields"][field_index]
+    item_number = len(data["answers"].get(str(question_index), [])) + 1
+
+    text = f"➕ <b>{item_number}. {field['text']}</b>"
+    if field.get("hint"):
+        text += f"\n{field['hint']}"
+    if field.get("example"):
+        text += f"\nНапример: <i>{field['example']}</i>"
+    buttons = []
+    if not field.get("required"):
+        buttons.append([InlineKeyboardButton(text="⏭ Пропустить", callback_data=f"repeat_skip_{question_index}")])
+    buttons.append([InlineKeyboardButton(text="✖️ Не добавлять", callback_data=f"repeat_back_{question_index}")])
 
-async def ask_inventory_condition(message: Message, state: FSMContext, item_index: int):
-    text = f"➕ <b>{item_index}. Состояние:</b>\nОпишите состояние (например: «хорошее, без повреждений»)"
-    markup = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="⏭ Пропустить всё", callback_data="inventory_skip_all")],
-        [InlineKeyboardButton(text="🗑️ Отменить", callback_data="cancel_filling")]
-    ])
-    await message.answer(text=text, parse_mode="HTML", reply_markup=markup)
-    await state.set_state(FillingStates.INVENTORY_ASKING_CONDITION)
+    await message.answer(text=text, parse_mode="HTML", reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons))
+    await state.update_data(repeat_field=field_index)
+    await state.set_state(FillingStates.REPEAT_FIELD)
 
 
-async def ask_add_more(message: Message, state: FSMContext, item_index: int):
-    markup = create_choice_keyboard(["Да", "Нет"], "inventory_add_more")
-    await message.answer("➕ <b>Добавить ещё предмет?</b>", reply_markup=markup, parse_mode="HTML")
-    await state.update_data(inventory_item_index=item_index)
+async def store_repeat_value(message: Message, state: FSMContext, value: str):
+    """Сохраняет поле текущего элемента и переходит к следующему полю или к списку элементов."""
+    data = await state.get_data()
+    question_index = data["current_question"]
+    question = get_questions(data["template_name"])[question_index]
+    field_index = data.get("repeat_field", 0)
+    item = dict(data.get("repeat_item") or {})
+    item[question["fields"][field_index]["step"]] = value
+
+    if field_index + 1 < len(question["fields"]):
+        await state.update_data(repeat_item=item)
+        await ask_repeat_field(message, state, question_index, field_index + 1)
+        return
+
+    # Элемент заполнен — вся группа хранится одним списком в ответе на вопрос
+    answers = data["answers"]
+    answers[str(question_index)] = answers.get(str(question_index), []) + [item]
+    await state.update_data(answers=answers, repeat_item=None)
+    await ask_repeat_question(message, state, question_index)
+
+
+@router.callback_query(F.data.startswith("repeat_add_"))
+async def repeat_add(callback: CallbackQuery, state: FSMContext):
+    question_index = int(callback.data.split("_")[-1])
+    await state.update_data(current_question=question_index, repeat_item={})
+    await ask_repeat_field(callback.message, state, question_index, 0)
+    await callback.answer()
 
 
-@router.callback_query(F.data == "inventory_skip_all")
-async def inventory_skip_all(callback: CallbackQuery, state: FSMContext):
-    await finalize_inventory_filling(callback, state)
+@router.callback_query(F.data.startswith("repeat_skip_"))
+async def repeat_skip(callback: CallbackQuery, state: FSMContext):
+    await store_repeat_value(callback.message, state, "______")
     await callback.answer()
 
 
-@router.callback_query(F.data.startswith("ch_inventory_add_more"))
-async def handle_inventory_add_more(callback: CallbackQuery, state: FSMContext):
-    choice = callback.data.split(":")[1]
-    if choice == "Нет":
-        await finalize_inventory_filling(callback, state)
-    else:
-        data = await state.get_data()
-        item_index = data.get("inventory_item_index", 1) + 1
-        await state.update_data(inventory_item_index=item_index)
-        await ask_inventory_name(callback, state, item_index)
+@router.callback_query(F.data.startswith("repeat_back_"))
+async def repeat_back(callback: CallbackQuery, state: FSMContext):
+    await ask_repeat_question(callback.message, state, int(callback.data.split("_")[-1]))
     await callback.answer()
 
 
-@router.message(FillingStates.INVENTORY_ASKING_NAME)
-async def process_inventory_name(message: Message, state: FSMContext):
+@router.callback_query(F.data.startswith("repeat_done_"))
+async def repeat_done(callback: CallbackQuery, state: FSMContext):
+    question_index = int(callback.data.split("_")[-1])
     data = await state.get_data()
-    item_index = data["inventory_item_index"]
-    answers = data.get("answers", {})
-    answers[f"item_{item_index}_name"] = message.text
-    await state.update_data(answers=answers)
-    await ask_inventory_quantity(message, state, item_index)
+    answers = data["answers"]
+    if not answers.get(str(question_index)) and get_questions(data["template_name"])[question_index].get("required"):
+        await callback.answer("Добавьте хотя бы один элемент", show_alert=True)
+        return
+    answers.setdefault(str(question_index), [])
+    await state.update_data(answers=answers, current_question=question_index + 1, repeat_item=None)
+    await ask_question_callback(callback, state)
+    await callback.answer()
 
 
-@router.message(FillingStates.INVENTORY_ASKING_QUANTITY)
-async def process_inventory_quantity(message: Message, state: FSMContext):
-    data = await state.get_data()
-    item_index = data["inventory_item_index"]
-    answers = data.get("answers", {})
-    answers[f"item_{item_index}_quantity"] = message.text
-    await state.update_data(answers=answers)
-    await ask_inventory_condition(message, state, item_index)
+@router.message(FillingStates.REPEAT_FIELD)
+async def process_repeat_field(message: Message, state: FSMContext):
+    try:
+        data = await state.get_data()
+        question = get_questions(data["template_name"])[data["current_question"]]
+        field = question["fields"][data.get("repeat_field", 0)]
 
+        if message.text is None:
+            await message.answer("Пожалуйста, отправьте ответ текстом.")
+            return
 
-@router.message(FillingStates.INVENTORY_ASKING_CONDITION)
-async def process_inventory_condition(message: Message, state: FSMContext):
-    data = await state.get_data()
-    item_index = data["inventory_item_index"]
-    answers = data.get("answers", {})
-    answers[f"item_{item_index}_condition"] = message.text
-    await state.update_data(answers=answers)
-    await ask_add_more(message, state, item_index)
+        is_valid, error_message = compile_validator(field)(message.text)
+        if not is_valid:
+            await message.answer(f"❌ {error_message}\n\nПожалуйста, введите корректное значение:")
+            return
+
+        await store_repeat_value(message, state, message.text.strip())
+    except Exception as e:
+        logger.error(f"Ошибка при заполнении элемента группы: {e}", exc_info=True)
+        await message.answer("⚠️ Произошла ошибка при обработке ответа")
 
 
 @router.callback_query(F.data.startswith("prefill_keep_"))
 async def prefill_keep(callback: CallbackQuery, state: FSMContext):
     question_index = callback.data.split("_")[-1]
     data = await state.get_data()
-    last_draft = data.get("last_draft", {})
-    question = data["questions"][int(question_index)]
+    last_draft = data.get("last_draft") or {}
+    question = get_questions(data["template_name"])[int(question_index)]
     step_name = question.get("step")
     value = last_draft.get(question_index) or last_draft.get(step_name) or "______"
 
@@ -447,7 +481,7 @@ async def prefill_keep(callback: CallbackQuery, state: FSMContext):
 async def prefill_edit(callback: CallbackQuery, state: FSMContext):
     question_index = callback.data.split("_")[-1]
     await state.update_data(editing_prefill_index=question_index)
-    question = (await state.get_data())["questions"][int(question_index)]
+    question = get_questions((await state.get_data())["template_name"])[int(question_index)]
     await callback.message.answer(
         f"✏️ Введите новое значение для:\n{question['text']}",
         reply_markup=InlineKeyboardMarkup(inline_keyboard=[
@@ -463,7 +497,7 @@ async def prefill_edit(callback: CallbackQuery, state: FSMContext):
 async def handle_choice_selection(callback: CallbackQuery, state: FSMContext):
     try:
         data = await state.get_data()
-        questions = data["questions"]
+        questions = get_questions(data["template_name"])
         answers = data.get("answers", {})
 
         parts = callback.data.split(":", 1)
@@ -513,7 +547,7 @@ async def handle_multiselect(callback: CallbackQuery, state: FSMContext):
         answers[current_question] = selected
         await state.update_data(answers=answers)
 
-        question = data["questions"][int(current_question)]
+        question = get_questions(data["template_name"])[int(current_question)]
         markup = create_multiselect_keyboard(selected, question["options"], current_question)
         await callback.message.edit_reply_markup(reply_markup=markup)
         await callback.answer()
@@ -538,11 +572,9 @@ async def process_answer(message: Message, state: FSMContext):
         else:
             current_question = data["current_question"]
 
-        questions = data["questions"]
         answers = data["answers"]
-        question = questions[current_question]
 
-        is_valid, error_message = validate_field(question, message.text)
+        is_valid, error_message = get_validators(data["template_name"])[current_question](message.text)
         if not is_valid:
             await message.answer(
                 f"❌ {error_message}\n\nПожалуйста, введите корректное значение:",
@@ -555,45 +587,33 @@ async def process_answer(message: Message, state: FSMContext):
 
         answers[str(current_question)] = message.text
         await state.update_data(current_question=current_question + 1, answers=answers)
-        await ask_next_question_from_message(message, state)
+        await ask_next_question_from_message(message, state, message.from_user.id)
 
     except Exception as e:
         logger.error(f"Ошибка при обработке ответа: {e}", exc_info=True)
         await message.answer("⚠️ Произошла ошибка при обработке ответа")
 
 
-async def ask_next_question_from_message(message: Message, state: FSMContext):
+async def ask_next_question_from_message(message: Message, state: FSMContext, user_id: int):
+    """
+    Следующий вопрос новым сообщением. user_id передается явно: после кнопки
+    message — сообщение бота, и message.from_user — сам бот.
+    """
     try:
         data = await state.get_data()
-        doc_id = data.get("doc_id")
-        questions = data["questions"]
+        template_name = data["template_name"]
+        questions = get_questions(template_name)
         current_question_index = data["current_question"]
 
-        # === СПЕЦИАЛЬНАЯ ЛОГИКА ДЛЯ ОПИСИ ИМУЩЕСТВА ===
-        if doc_id == "inventory_2025":
-            if current_question_index >= len(questions):
-                add_first = data["answers"].get("6")
-                if add_first == "Нет":
-                    await finalize_inventory_filling_from_message(message, state)
-                    return
-                else:
-                    await state.update_data(inventory_item_index=1)
-                    await message.answer("➕ <b>1. Название предмета:</b>\nНапример: диван, холодильник", parse_mode="HTML")
-                    await state.set_state(FillingStates.INVENTORY_ASKING_NAME)
-                    return
-
-        # === СТАНДАРТНАЯ ЛОГИКА ===
-        next_valid_question_index = await check_condition_and_get_next_valid_question_index(
-            questions, data["answers"], current_question_index
-        )
+        next_valid_question_index = get_next_question_index(data, current_question_index)
 
         if next_valid_question_index >= len(questions):
-            await save_draft_to_db(message.from_user.id, data)
-            save_last_template_draft(message.from_user.id, data["doc_id"], data["answers"])
-            answers_summary = ""
-            for i, question in enumerate(questions, 1):
-                answer = data["answers"].get(str(i - 1), "Не указано")
-                answers_summary += f"{i}. {question['text']}\n   ➤ {answer}\n\n"
+            # Пакетный режим и подстановка из черновика — только до первой проверки,
+            # дальше «Изменить» проходит все вопросы
+            await state.update_data(bulk_fill=False, use_last_draft=False, last_draft=None)
+            await save_draft_to_db(user_id, data)
+            save_last_template_draft(user_id, template_name, data["answers"])
+            answers_summary = build_answers_summary(questions, data["answers"])
             review_text = FILLING_REVIEW_TEXT.format(answers_summary=answers_summary)
             buttons = [
                 [InlineKeyboardButton(text="✅ Все верно", callback_data="confirm_document")],
@@ -610,6 +630,10 @@ async def ask_next_question_from_message(message: Message, state: FSMContext):
             current_question_index = next_valid_question_index
 
         question = questions[current_question_index]
+        if question.get("type") == "repeat":
+            await ask_repeat_question(message, state, current_question_index)
+            return
+
         if question.get("type") == "choice":
             markup = create_choice_keyboard(question["options"], str(current_question_index))
             question_text = FILLING_QUESTION_TEXT.format(
@@ -645,18 +669,7 @@ async def ask_next_question_from_message(message: Message, state: FSMContext):
             example_section=example_section
         )
 
-        use_last_draft = data.get("use_last_draft", False)
-        last_draft = data.get("last_draft", {})
-        step_name = question.get("step")
-        should_use_prefill = (
-            use_last_draft
-            and step_name is not None
-            and step_name not in FIELDS_NEVER_FROM_DRAFT
-            and str(current_question_index) not in data["answers"]
-        )
-        prefill_value = None
-        if should_use_prefill:
-            prefill_value = last_draft.get(str(current_question_index)) or last_draft.get(step_name)
+        prefill_value = get_prefill_value(data, question, current_question_index)
 
         if prefill_value and prefill_value != "______":
             question_text += f"\n\n<b>Текущее значение:</b> <i>{prefill_value}</i>"
@@ -677,49 +690,14 @@ async def ask_next_question_from_message(message: Message, state: FSMContext):
         await message.answer("⚠️ Произошла ошибка при задавании вопроса")
 
 
-async def finalize_inventory_filling_from_message(message: Message, state: FSMContext):
-    data = await state.get_data()
-    await save_draft_to_db(message.from_user.id, data)
-    save_last_template_draft(message.from_user.id, data["doc_id"], data["answers"])
-    answers_summary = "Опись имущества: не заполнена (выбрано «Нет»)"
-    review_text = FILLING_REVIEW_TEXT.format(answers_summary=answers_summary)
-    buttons = [
-        [InlineKeyboardButton(text="✅ Все верно", callback_data="confirm_document")],
-        [InlineKeyboardButton(text="🔄 Изменить", callback_data="change_document")],
-        [InlineKeyboardButton(text="🗑️ Отменить", callback_data="cancel_filling")]
-    ]
-    markup = InlineKeyboardMarkup(inline_keyboard=buttons)
-    await message.answer(text=review_text, parse_mode="HTML", reply_markup=markup)
-    await state.set_state(FillingStates.REVIEWING)
-
-
 async def show_review_message(callback: CallbackQuery, state: FSMContext):
     try:
         data = await state.get_data()
-        doc_id = data.get("doc_id")
+        template_name = data["template_name"]
         answers = data["answers"]
-        questions = data["questions"]
-
-        if doc_id == "inventory_2025":
-            answers_summary = ""
-            for i in range(7):
-                if i < len(questions):
-                    q = questions[i]
-                    ans = answers.get(str(i), "Не указано")
-                    answers_summary += f"{i+1}. {q['text']}\n   ➤ {ans}\n\n"
-            item_index = 1
-            while f"item_{item_index}_name" in answers:
-                name = answers.get(f"item_{item_index}_name", "")
-                qty = answers.get(f"item_{item_index}_quantity", "")
-                cond = answers.get(f"item_{item_index}_condition", "")
-                answers_summary += f"{7+item_index}. Предмет {item_index}\n   ➤ Название: {name}\n   ➤ Кол-во: {qty}\n   ➤ Состояние: {cond}\n\n"
-                item_index += 1
-        else:
-            answers_summary = ""
-            for i, question in enumerate(questions, 1):
-                answer = answers.get(str(i - 1), "Не указано")
-                answers_summary += f"{i}. {question['text']}\n   ➤ {answer}\n\n"
+        questions = get_questions(template_name)
 
+        answers_summary = build_answers_summary(questions, answers)
         review_text = FILLING_REVIEW_TEXT.format(answers_summary=answers_summary)
 
         buttons = [
@@ -747,14 +725,16 @@ async def confirm_document(callback: CallbackQuery, state: FSMContext):
     try:
         data = await state.get_data()
         category = data["category"]
-        doc_id = data["doc_id"]
-        doc_info = data["doc_info"]
+        template_name = data["template_name"]
+        doc_info = get_doc_info(template_name, category)
         fill_type = data["fill_type"]
         answers = data["answers"]
 
-        save_last_template_draft(user_id, doc_id, answers)
+        save_last_template_draft(user_id, template_name, answers)
 
-        price = get_autogeneration_price() if fill_type == "autogen" else get_template_price()
+        # Та же цена, что показана в каталоге: с учетом metadata.json и переопределений
+        template_price = get_template_info(template_name, category)['price']
+        price = template_price['autogen'] if fill_type == "autogen" else template_price['template']
         now = datetime.now()
         suffix = now.strftime("%d.%m/%H:%M")
         cart_item_id = f"{doc_info['template_name']}__{suffix}"
@@ -771,7 +751,7 @@ async def confirm_document(callback: CallbackQuery, state: FSMContext):
             filled_data=answers
         )
 
-        delete_draft(user_id, doc_id)
+        delete_draft(user_id, template_name)
         await state.clear()
 
         cart = get_user_cart(user_id)
@@ -807,7 +787,7 @@ async def confirm_document(callback: CallbackQuery, state: FSMContext):
 
 @router.callback_query(F.data == "change_document")
 async def change_document(callback: CallbackQuery, state: FSMContext):
-    await state.update_data(current_question=0)
+    await state.update_data(current_question=0, bulk_fill=False)
     await ask_question_callback(callback, state)
     await callback.answer()
 
@@ -851,14 +831,136 @@ async def skip_question(callback: CallbackQuery, state: FSMContext):
         await callback.answer("⚠️ Не удалось пропустить вопрос", show_alert=True)
 
 
+@router.callback_query(F.data == "bulk_fill")
+async def bulk_fill_start(callback: CallbackQuery, state: FSMContext):
+    """Пакетное заполнение: все ответы одним сообщением, файлом или из прошлого заказа."""
+    try:
+        data = await state.get_data()
+        template_name = data["template_name"]
+        questions = get_questions(template_name)
+        doc_info = get_doc_info(template_name, data.get("category")) or {}
+
+        example = build_bulk_example(questions)
+        if len(example) > 3000:
+            example = example[:3000].rsplit("\n", 1)[0] + "\n…"
+
+        buttons = []
+        if get_last_order_item_data(callback.from_user.id, doc_info.get("id", template_name)):
+            buttons.append([InlineKeyboardButton(text="🔁 Данные из прошлого заказа", callback_data="bulk_fill_order")])
+        buttons.append([InlineKeyboardButton(text="⬅️ Отвечать по одному", callback_data="bulk_fill_back")])
+
+        await callback.message.edit_text(
+            "📋 <b>Заполнение списком</b>\n\n"
+            "Отправьте ответы одним сообщением в формате <code>шаг: значение</code> "
+            "(вместо шага можно указать номер вопроса) или файлом .json / .csv.\n"
+            "Пропущенные и неверные поля бот спросит отдельно.\n\n"
+            f"<pre>{html.escape(example)}</pre>",
+            parse_mode="HTML",
+            reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons)
+        )
+        await state.set_state(FillingStates.BULK_INPUT)
+        await callback.answer()
+    except Exception as e:
+        logger.error(f"Ошибка при запуске пакетного заполнения: {e}", exc_info=True)
+        await callback.answer("⚠️ Произошла ошибка", show_alert=True)
+
+
+@router.callback_query(F.data == "bulk_fill_back")
+async def bulk_fill_back(callback: CallbackQuery, state: FSMContext):
+    await ask_question_callback(callback, state)
+    await callback.answer()
+
+
+def format_bulk_report(questions: list, result: dict) -> str:
+    report = f"✅ Принято ответов: {result['accepted']}"
+    if result['errors']:
+        report += "\n\n❌ <b>Нужно исправить:</b>\n" + "\n".join(
+            f"• {html.escape(questions[index]['text'])} — {html.escape(str(error))}" for index, error in sorted(result['errors'].items())
+        )
+    if result['unknown']:
+        report += "\n\n⚠️ Не распознаны поля: " + html.escape(", ".join(result['unknown'][:20]))
+    return report
+
+
+async def apply_bulk_fill(message: Message, state: FSMContext, user_id: int, raw: dict, by_index: bool = False):
+    data = await state.get_data()
+    questions = get_questions(data["template_name"])
+    result = apply_bulk_answers(
+        questions, raw, data.get("answers"), by_index=by_index, validators=get_validators(data["template_name"])
+    )
+    logger.info(
+        f"Пользователь {user_id} заполнил {data['template_name']} пакетно: "
+        f"принято {result['accepted']}, ошибок {len(result['errors'])}"
+    )
+
+    await state.update_data(answers=result['answers'], current_question=0, bulk_fill=True)
+    await message.answer(format_bulk_report(questions, result), parse_mode="HTML")
+    await ask_next_question_from_message(message, state, user_id)
+
+
+@router.callback_query(F.data == "bulk_fill_order")
+async def bulk_fill_from_order(callback: CallbackQuery, state: FSMContext):
+    try:
+        data = await state.get_data()
+        doc_info = get_doc_info(data["template_name"], data.get("category")) or {}
+        filled_data = get_last_order_item_data(callback.from_user.id, doc_info.get("id", data["template_name"]))
+        if not filled_data:
+            await callback.answer("Данные прошлого заказа не найдены", show_alert=True)
+            return
+
+        # Даты и номера документа всегда вводятся заново
+        questions = get_questions(data["template_name"])
+        raw = {
+            key: value for key, value in filled_data.items()
+            if not (str(key).isdigit() and int(key) < len(questions)
+                    and questions[int(key)].get("step") in FIELDS_NEVER_FROM_DRAFT)
+        }
+        await apply_bulk_fill(callback.message, state, callback.from_user.id, raw, by_index=True)
+        await callback.answer()
+    except Exception as e:
+        logger.error(f"Ошибка при заполнении из прошлого заказа: {e}", exc_info=True)
+        await callback.answer("⚠️ Произошла ошибка", show_alert=True)
+
+
+@router.message(FillingStates.BULK_INPUT)
+async def process_bulk_input(message: Message, state: FSMContext):
+    try:
+        if message.document:
+            if (message.document.file_size or 0) > MAX_BULK_FILE_SIZE:
+                await message.answer("❌ Файл слишком большой")
+                return
+            buffer = io.BytesIO()
+            await message.bot.download(message.document, destination=buffer)
+            try:
+                raw = parse_bulk_file(message.document.file_name, buffer.getvalue())
+            except (ValueError, UnicodeDecodeError) as e:
+                await message.answer(f"❌ Не удалось прочитать файл: {e}")
+                return
+        else:
+            raw = parse_key_value_text(message.text)
+
+        if not raw:
+            await message.answer("❌ Не найдено ни одной строки вида <code>шаг: значение</code>", parse_mode="HTML")
+            return
+
+        await apply_bulk_fill(message, state, message.from_user.id, raw)
+    except Exception as e:
+        logger.error(f"Ошибка при пакетном заполнении: {e}", exc_info=True)
+        await message.answer("⚠️ Произошла ошибка при обработке данных")
+
+
 async def save_draft_to_db(user_id: int, data: dict):
     try:
+        template_name = data["template_name"]
+        doc_info = get_doc_info(template_name, data.get("category")) or {}
         draft_id = save_draft(
             user_id=user_id,
-            template_id=data["doc_id"],
+            template_id=template_name,
+            document_name=doc_info.get("name", template_name),
             answers=data["answers"],
-            category=data["category"],
-            doc_info=data["doc_info"]
+            current_index=data.get("current_question", 0),
+            total_questions=len(get_questions(template_name)),
+            category=data.get("category")
         )
         if draft_id:
             logger.info(f"✅ Черновик {draft_id} сохранен для пользователя {user_id}")
@@ -2,10 +2,10 @@ import logging
 import os
 from datetime import datetime
 from aiogram import Router, F
-from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, InputFile
+from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, FSInputFile
 from aiogram.fsm.context import FSMContext
 from config import config
-from database.orders import get_user_orders, get_order_by_id
+from database.orders import get_user_orders, get_order_by_id, get_order_by_id_full
 from database.templates import get_template_by_id, get_template_by_name
 from database.cart import add_to_cart
 from database.users import save_user_data, get_user_data
@@ -15,9 +15,10 @@ from texts.messages import (
     DOCUMENT_DESCRIPTION_TEXT,
     ORDER_DETAILS_TEXT
 )
-from services.document_generator import generate_document
+from services.document_generator import generate_document_async
 from services.document_service import get_template_info
 from services.file_utils import get_document_path
+from services.outbound import send_document
 
 logger = logging.getLogger('doc_bot.order_history')
 router = Router(name="order_history_router")
@@ -458,44 +459,44 @@ async def download_order_document(callback: CallbackQuery, format_type: str = "p
 
         # Получаем документ и заказ
         doc = get_template_by_id(doc_id)
-        order = get_order_by_id(order_id)
+        order = get_order_by_id_full(order_id)
 
         if not doc or not order:
             await callback.answer("⚠️ Документ или заказ не найден", show_alert=True)
             await callback.answer()
             return
 
-        # Находим ответы для этого документа в заказе
-        answers = None
-        for item in order['items']:
-            if item['doc_id'] == doc_id:
-                answers = item['filled_data']
-                break
+        # Находим позицию заказа с этим документом
+        order_item = next((item for item in order['items'] if item['doc_id'] == doc_id), None)
+        answers = order_item['filled_data'] if order_item else None
 
         if not answers:
             await callback.answer("⚠️ Данные документа не найдены", show_alert=True)
             await callback.answer()
             return
 
-        # Проверяем, есть ли уже сгенерированный документ
-        document_path = None
-        if format_type == "pdf" and order.get('pdf_path'):
-            document_path = order['pdf_path']
-        elif format_type == "docx" and order.get('docx_path'):
-            document_path = order['docx_path']
+        # Проверяем, есть ли уже сгенерированный документ (document_artifacts)
+        document_path = order_item.get(f'{format_type}_path')
+        filename = f"{doc['name']}.{format_type}"
 
         # Если документ уже сгенерирован, используем его
         if document_path and os.path.exists(document_path):
             # Отправляем документ
-            await callback.message.answer_document(
-                document=InputFile(document_path),
+            await send_document(
+                callback.message.chat.id,
+                bot=callback.bot,
+                document=FSInputFile(document_path, filename=filename),
                 caption=f"Ваш документ: {doc['name']} ({format_type.upper()})"
             )
         else:
             # Генерируем документ
-            document_paths = generate_document(
+            document_paths = await generate_document_async(
                 template_name=doc['template_name'],
-                answers=answers
+                answers=answers,
+                user_id=order['user_id'],
+                doc_name=doc['name'],
+                order_id=order_id,
+                order_item_id=order_item['id']
             )
 
             if not document_paths or not document_paths.get(format_type):
@@ -504,17 +505,13 @@ async def download_order_document(callback: CallbackQuery, format_type: str = "p
                 return
 
             # Отправляем документ
-            await callback.message.answer_document(
-                document=InputFile(document_paths[format_type]),
+            await send_document(
+                callback.message.chat.id,
+                bot=callback.bot,
+                document=FSInputFile(document_paths[format_type], filename=filename),
                 caption=f"Ваш документ: {doc['name']} ({format_type.upper()})"
             )
 
-            # Обновляем путь в заказе
-            if format_type == "pdf":
-                order['pdf_path'] = document_paths['pdf']
-            else:
-                order['docx_path'] = document_paths['docx']
-
         await callback.answer()
 
     except Exception as e:
@@ -528,7 +525,7 @@ async def download_all_order_documents(callback: CallbackQuery):
     try:
         order_id = int(callback.data.split("_")[2])
         user_id = callback.from_user.id
-        order = get_order_by_id(order_id)
+        order = get_order_by_id_full(order_id)
 
         if not order or order['user_id'] != user_id:
             await callback.answer("⚠️ Заказ не найден или недоступен", show_alert=True)
@@ -544,34 +541,46 @@ async def download_all_order_documents(callback: CallbackQuery):
             docx_path = item.get('docx_path', '')
 
             if pdf_path and os.path.exists(pdf_path):
-                await callback.message.answer_document(
-                    document=InputFile(pdf_path),
+                await send_document(
+                    callback.message.chat.id,
+                    bot=callback.bot,
+                    document=FSInputFile(pdf_path, filename=f"{doc['name']}.pdf"),
                     caption=f"PDF: {doc['name']}"
                 )
 
             if docx_path and os.path.exists(docx_path):
-                await callback.message.answer_document(
-                    document=InputFile(docx_path),
+                await send_document(
+                    callback.message.chat.id,
+                    bot=callback.bot,
+                    document=FSInputFile(docx_path, filename=f"{doc['name']}.docx"),
                     caption=f"DOCX: {doc['name']}"
                 )
 
             if (not pdf_path or not os.path.exists(pdf_path)) and (not docx_path or not os.path.exists(docx_path)):
                 # Генерируем документы
-                document_paths = generate_document(
+                document_paths = await generate_document_async(
                     template_name=doc['template_name'],
-                    answers=item['filled_data']
+                    answers=item['filled_data'],
+                    user_id=user_id,
+                    doc_name=doc['name'],
+                    order_id=order_id,
+                    order_item_id=item['id']
                 )
 
                 if document_paths:
                     if document_paths.get('pdf') and os.path.exists(document_paths['pdf']):
-                        await callback.message.answer_document(
-                            document=InputFile(document_paths['pdf']),
+                        await send_document(
+                            callback.message.chat.id,
+                            bot=callback.bot,
+                            document=FSInputFile(document_paths['pdf'], filename=f"{doc['name']}.pdf"),
                             caption=f"PDF: {doc['name']}"
                         )
 
                     if document_paths.get('docx') and os.path.exists(document_paths['docx']):
-                        await callback.message.answer_document(
-                            document=InputFile(document_paths['docx']),
+                        await send_document(
+                            callback.message.chat.id,
+                            bot=callback.bot,
+                            document=FSInputFile(document_paths['docx'], filename=f"{doc['name']}.docx"),
                             caption=f"DOCX: {doc['name']}"
                         )
 
@@ -590,7 +599,7 @@ async def reorder(callback: CallbackQuery):
     logger.info(f"Пользователь {user_id} запросил повтор заказа {order_id}")
 
     try:
-        order = get_order_by_id(order_id)
+        order = get_order_by_id_full(order_id)
 
         if not order or order['user_id'] != user_id:
             await callback.answer("⚠️ Заказ не найден или недоступен", show_alert=True)
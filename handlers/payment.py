@@ -1,4 +1,6 @@
 # handlers/payment.py
+import asyncio
+import json
 import logging
 import os
 from datetime import datetime
@@ -13,19 +15,22 @@ from aiogram.fsm.state import State, StatesGroup
 
 from config import config
 from database.orders import (
-    create_order, add_order_item, update_order_status, get_order_by_id,
-    get_user_orders
+    create_order, add_order_item, update_order_status, get_order_by_id, get_order_by_id_full,
+    get_user_orders, mark_order_paid, update_order_payment, get_order_by_payment_id
 )
 from database.cart import get_user_cart, clear_cart, get_cart_total
 from database.users import get_partner_stats
-from database.payments import create_payment, update_payment_status
-from database.promocodes import apply_promocode, check_promocode
+from database.payments import create_payment, update_payment_status, attach_external_payment_id
+from database.promocodes import apply_promocode
+from services.promo_engine import evaluate_promocode, apply_discount, describe_discount
 from payment.yookassa_integration import (
-    create_payment,
+    create_payment as create_yookassa_payment,
     check_payment_status
 )
-from services.document_generator import generate_document
+from services.document_generator import generate_document_async
+from services.template_data import redact_data
 from services.notifications import notify_support_about_new_order
+from services.outbound import send_message, send_document, PRIORITY_DOCUMENT
 from texts.messages import (
     CHECKOUT_TEXT,
     PAYMENT_SUCCESS_TEXT,
@@ -40,6 +45,10 @@ logger = logging.getLogger('doc_bot.payment')
 router = Router(name="payment_router")
 
 
+# Выдача документов по заказам, идущая сейчас в этом процессе: {order_id: задача}
+_delivery_tasks = {}
+
+
 class PaymentStates(StatesGroup):
     CHECKING_PAYMENT = State()
 
@@ -72,7 +81,8 @@ async def start_checkout(callback: CallbackQuery, state: FSMContext):
         promocode_data = await state.get_data()
         applied_promocode = promocode_data.get('applied_promocode')
         discount = promocode_data.get('discount', 0)
-        discounted_price = total_price * (1 - discount / 100) if discount > 0 else total_price
+        discount_type = promocode_data.get('discount_type', 'percent')
+        discounted_price = apply_discount(total_price, discount_type, discount) if applied_promocode else total_price
 
         await state.update_data(
             cart_items=cart['items'],
@@ -84,7 +94,7 @@ async def start_checkout(callback: CallbackQuery, state: FSMContext):
 
         promocode_text = ""
         if applied_promocode:
-            promocode_text = f"\nПрименен промокод <b>{applied_promocode}</b> ({discount}% скидка)"
+            promocode_text = f"\nПрименен промокод <b>{applied_promocode}</b> ({describe_discount(discount_type, discount)})"
 
         checkout_text = CHECKOUT_TEXT.format(
             item_count=cart['item_count'],
@@ -142,14 +152,16 @@ async def process_promocode(message: Message, state: FSMContext):
 
     data = await state.get_data()
     total_price = data.get('total_price', 0)
-    result = check_promocode(promocode, user_id)
+    result = evaluate_promocode(promocode, user_id, total_price)
 
-    if result:
+    if result['valid']:
         discount = result['discount']
-        discounted_price = total_price * (1 - discount / 100)
+        discount_type = result['discount_type']
+        discounted_price = result['discounted_price']
         await state.update_data(
             applied_promocode=promocode,
             discount=discount,
+            discount_type=discount_type,
             discounted_price=discounted_price
         )
 
@@ -168,7 +180,7 @@ async def process_promocode(message: Message, state: FSMContext):
             f"{payment_note}"
         )
 
-        promocode_text = f"\nПрименен промокод <b>{promocode}</b> ({discount}% скидка)"
+        promocode_text = f"\nПрименен промокод <b>{promocode}</b> ({describe_discount(discount_type, discount)})"
         checkout_text = CHECKOUT_TEXT.format(
             item_count=data['item_count'],
             total_price=total_price,
@@ -202,15 +214,16 @@ async def pay_with_yookassa(callback: CallbackQuery, state: FSMContext):
 
     try:
         data = await state.get_data()
-        logger.debug(f"pay_with_yookassa: Полученные данные из state для user {user_id}: {data}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"pay_with_yookassa: Полученные данные из state для user {user_id}: {redact_data(data)}")
 
         if 'item_count' not in data:
-            logger.error(f"pay_with_yookassa: Ключ 'item_count' отсутствует в state для user {user_id}. Данные: {data}")
+            logger.error(f"pay_with_yookassa: Ключ 'item_count' отсутствует в state для user {user_id}. Ключи: {list(data)}")
             await callback.answer("Ошибка данных заказа. Вернитесь в корзину.", show_alert=True)
             return
 
         if 'cart_items' not in data or not data['cart_items']:
-            logger.error(f"pay_with_yookassa: cart_items отсутствуют или пусты для user {user_id}. Данные: {data}")
+            logger.error(f"pay_with_yookassa: cart_items отсутствуют или пусты для user {user_id}. Ключи: {list(data)}")
             await callback.answer("Ошибка данных заказа. Вернитесь в корзину.", show_alert=True)
             return
 
@@ -246,8 +259,16 @@ async def pay_with_yookassa(callback: CallbackQuery, state: FSMContext):
                 price_type=item.get('price_type', "template")
             )
 
-        if promocode:
-            apply_promocode(promocode, user_id, order_id)
+        # Промокод погашается атомарно: если лимит исчерпали параллельные заказы, отменяем заказ
+        if promocode and not apply_promocode(promocode, user_id, order_id):
+            logger.warning(f"Промокод {promocode} больше недоступен, заказ {order_id} отменен")
+            update_order_status(order_id, 'cancelled')
+            await state.update_data(applied_promocode=None, discount=0, discounted_price=total_price)
+            await callback.answer(
+                "⚠️ Промокод больше недоступен. Вернитесь к оформлению заказа.",
+                show_alert=True
+            )
+            return
 
         payment_id = create_payment(
             user_id=user_id,
@@ -262,10 +283,11 @@ async def pay_with_yookassa(callback: CallbackQuery, state: FSMContext):
             await callback.answer("⚠️ Не удалось создать платеж", show_alert=True)
             return
 
-        payment = create_payment(
+        payment = create_yookassa_payment(
             amount=discounted_price,
             description=f"Оплата заказа #{order_id}",
-            user_id=user_id
+            user_id=user_id,
+            order_id=order_id
         )
 
         if not payment:
@@ -273,6 +295,10 @@ async def pay_with_yookassa(callback: CallbackQuery, state: FSMContext):
             await callback.answer("⚠️ Не удалось создать платеж в ЮKassa", show_alert=True)
             return
 
+        # Связываем заказ с платежом ЮKassa, чтобы обработать его и по webhook-уведомлению
+        attach_external_payment_id(payment_id, payment.id)
+        update_order_payment(order_id, payment.id, {'cart_items': cart_items})
+
         await state.update_data(yookassa_payment_id=payment.id, order_id=order_id)
 
         payment_text = YOOKASSA_PAYMENT_TEXT.format(total_price=discounted_price)
@@ -311,16 +337,17 @@ async def check_payment(callback: CallbackQuery, state: FSMContext):
 
         if status == "succeeded":
             update_payment_status(yookassa_payment_id, "succeeded")
-            update_order_status(order_id, "paid")
-            clear_cart(user_id)
 
-            bot = callback.bot
-            success = await process_successful_payment(
-                bot=bot,
-                user_id=user_id,
-                order_id=order_id,
-                cart_items=data.get('cart_items', [])
-            )
+            if mark_order_paid(order_id):
+                clear_cart(user_id)
+                success = await asyncio.shield(
+                    _start_delivery(callback.bot, user_id, order_id, data.get('cart_items', []))
+                )
+            elif order_id in _delivery_tasks:
+                # Оплату уже подтвердило уведомление ЮKassa, документы еще готовятся
+                success = await asyncio.shield(_delivery_tasks[order_id])
+            else:
+                success = is_order_delivered(order_id)
 
             if success:
                 await callback.message.edit_text(
@@ -365,6 +392,48 @@ async def check_payment(callback: CallbackQuery, state: FSMContext):
         await callback.answer("⚠️ Ошибка при проверке платежа", show_alert=True)
 
 
+async def handle_yookassa_notification(bot: Bot, payload: dict) -> bool:
+    """
+    Обрабатывает HTTP-уведомление ЮKassa (payment.succeeded / payment.canceled).
+    Статус перепроверяется запросом к API, тело уведомления не считается доверенным.
+    """
+    payment_object = payload.get('object') or {}
+    yookassa_payment_id = payment_object.get('id')
+    if not yookassa_payment_id:
+        logger.warning(f"Уведомление ЮKassa без идентификатора платежа: {payload.get('event')}")
+        return False
+
+    status = await asyncio.to_thread(check_payment_status, yookassa_payment_id)
+    logger.info(f"Уведомление ЮKassa {payload.get('event')} для платежа {yookassa_payment_id}, статус: {status}")
+
+    order = get_order_by_payment_id(yookassa_payment_id)
+    if not order:
+        logger.warning(f"Заказ для платежа ЮKassa {yookassa_payment_id} не найден")
+        return False
+
+    if status == "succeeded":
+        update_payment_status(yookassa_payment_id, "succeeded")
+        if not mark_order_paid(order['id']):
+            return True
+
+        try:
+            payment_data = json.loads(order['payment_data'] or '{}')
+        except (json.JSONDecodeError, TypeError):
+            payment_data = {}
+
+        clear_cart(order['user_id'])
+        # Генерация может занять минуты: ЮKassa получает ответ сразу, документы выдаются в фоне
+        _start_delivery(bot, order['user_id'], order['id'], payment_data.get('cart_items', []))
+        return True
+
+    if status == "canceled":
+        update_payment_status(yookassa_payment_id, "canceled")
+        update_order_status(order['id'], "cancelled")
+        return True
+
+    return False
+
+
 @router.pre_checkout_query()
 async def pre_checkout_query(pre_checkout_q: PreCheckoutQuery):
     logger.info(f"Получен предварительный запрос на оплату от {pre_checkout_q.from_user.id}")
@@ -426,13 +495,47 @@ async def successful_payment(message: Message, state: FSMContext):
         await message.answer("⚠️ Ошибка при обработке оплаты", reply_markup=None)
 
 
+def match_order_items(order_id: int, cart_items: list) -> list:
+    """
+    id позиций заказа для элементов корзины (по doc_id, в порядке добавления),
+    чтобы сгенерированные файлы были связаны с позициями. None — позиция не найдена.
+    """
+    order = get_order_by_id_full(order_id)
+    available = {}
+    for order_item in (order or {}).get('items', []):
+        available.setdefault(order_item['doc_id'], []).append(order_item['id'])
+
+    matched = []
+    for item in cart_items:
+        doc_id = item.get('doc_id', item.get('id', 0))
+        ids = available.get(doc_id)
+        matched.append(ids.pop(0) if ids else None)
+    return matched
+
+
+def _start_delivery(bot: Bot, user_id: int, order_id: int, cart_items: list) -> asyncio.Task:
+    task = asyncio.create_task(process_successful_payment(bot, user_id, order_id, cart_items))
+    _delivery_tasks[order_id] = task
+    task.add_done_callback(lambda t: _delivery_tasks.pop(order_id, None))
+    return task
+
+
+def is_order_delivered(order_id: int) -> bool:
+    """Все позиции заказа получили сгенерированные файлы (по записям document_artifacts)."""
+    order = get_order_by_id_full(order_id)
+    if not order or not order['items']:
+        return False
+    return all(item['pdf_path'] or item['docx_path'] for item in order['items'])
+
+
 async def process_successful_payment(bot: Bot, user_id: int, order_id: int, cart_items: list):
     try:
         logger.info(f"🚀 Обработка успешной оплаты для пользователя {user_id}, заказ {order_id}")
         documents = []
         generation_errors = []
+        order_item_ids = match_order_items(order_id, cart_items)
 
-        for item in cart_items:
+        for item, order_item_id in zip(cart_items, order_item_ids):
             template_name = item.get('template_name', '')
             price_type = item.get('price_type', 'template')
             doc_name = item.get('doc_name', 'Документ')
@@ -449,11 +552,13 @@ async def process_successful_payment(bot: Bot, user_id: int, order_id: int, cart
                     generation_errors.append(f"Данные для {doc_name} не найдены.")
                     continue
 
-            document_paths = generate_document(
+            document_paths = await generate_document_async(
                 template_name=template_name,
                 answers=filled_data,
                 user_id=user_id,
-                file_type=file_type
+                file_type=file_type,
+                order_id=order_id,
+                order_item_id=order_item_id
             )
 
             if document_paths:
@@ -481,7 +586,7 @@ async def process_successful_payment(bot: Bot, user_id: int, order_id: int, cart
             if generation_errors:
                 error_text += "Причины:\n" + "\n".join(f"• {err}" for err in generation_errors)
             error_text += "\nОбратитесь в поддержку: @biz_annet"
-            await bot.send_message(chat_id=user_id, text=error_text, parse_mode="HTML")
+            await send_message(user_id, error_text, priority=PRIORITY_DOCUMENT, bot=bot, parse_mode="HTML")
             return False
 
         success = await send_generated_documents(bot, user_id, documents, order_id)
@@ -513,8 +618,10 @@ async def process_successful_payment(bot: Bot, user_id: int, order_id: int, cart
             buttons.append([InlineKeyboardButton(text="🏠 Главное меню", callback_data="back_main")])
             markup = InlineKeyboardMarkup(inline_keyboard=buttons)
 
-            await bot.send_message(
-                chat_id=user_id,
+            await send_message(
+                user_id,
+                priority=PRIORITY_DOCUMENT,
+                bot=bot,
                 text=(
                     "📋 <b>Управление документами</b>\n"
                     "Здесь вы можете скачать документы заново.\n\n"
@@ -542,8 +649,9 @@ async def send_generated_documents(bot: Bot, user_id: int, documents: list, orde
             doc_name = doc.get('name', f'Документ {i}')
             if doc.get('pdf') and os.path.exists(doc['pdf']):
                 try:
-                    await bot.send_document(
-                        chat_id=user_id,
+                    await send_document(
+                        user_id,
+                        bot=bot,
                         document=FSInputFile(path=doc['pdf'], filename=f"{doc_name}.pdf"),
                         caption=f"📄 {doc_name} (PDF)"
                     )
@@ -552,8 +660,9 @@ async def send_generated_documents(bot: Bot, user_id: int, documents: list, orde
                     logger.error(f"Ошибка отправки PDF: {e}")
             if doc.get('docx') and os.path.exists(doc['docx']):
                 try:
-                    await bot.send_document(
-                        chat_id=user_id,
+                    await send_document(
+                        user_id,
+                        bot=bot,
                         document=FSInputFile(path=doc['docx'], filename=f"{doc_name}.docx"),
                         caption=f"📄 {doc_name} (DOCX)"
                     )
@@ -562,8 +671,10 @@ async def send_generated_documents(bot: Bot, user_id: int, documents: list, orde
                     logger.error(f"Ошибка отправки DOCX: {e}")
 
         if sent_count > 0:
-            await bot.send_message(
-                chat_id=user_id,
+            await send_message(
+                user_id,
+                priority=PRIORITY_DOCUMENT,
+                bot=bot,
                 text=f"✅ <b>Документы доставлены!</b>\n"
                      f"Отправлено файлов: {sent_count}\n"
                      f"Заказ №{order_id or 'N/A'}\n"
@@ -574,7 +685,12 @@ async def send_generated_documents(bot: Bot, user_id: int, documents: list, orde
             return True
         else:
             logger.error("Не удалось отправить ни одного документа")
-            await bot.send_message(chat_id=user_id, text="⚠️ Не удалось отправить документы. Обратитесь в поддержку: @biz_annet")
+            await send_message(
+                user_id,
+                "⚠️ Не удалось отправить документы. Обратитесь в поддержку: @biz_annet",
+                priority=PRIORITY_DOCUMENT,
+                bot=bot
+            )
             return False
     except Exception as e:
         logger.error(f"Ошибка при отправке документов: {e}", exc_info=True)
@@ -7,6 +7,7 @@ from aiogram.exceptions import (
     TelegramBadRequest
 )
 from config import config
+from services.outbound import send_message
 
 logger = logging.getLogger('doc_bot.support')
 router = Router(name="support_router")
@@ -31,8 +32,9 @@ async def handle_admin_support_reply(message: Message):
         if not text:
             raise ValueError("Текст ответа пуст")
 
-        await message.bot.send_message(
-            chat_id=user_id,
+        await send_message(
+            user_id,
+            bot=message.bot,
             text=f"📬 <b>Ответ от поддержки:</b>\n\n{text}",
             parse_mode="HTML"
         )
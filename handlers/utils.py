@@ -5,6 +5,7 @@ from aiogram import Router, F
 from aiogram.types import CallbackQuery, Message, InlineKeyboardButton, InlineKeyboardMarkup
 from aiogram.fsm.context import FSMContext
 from config import config
+from services.outbound import send_message
 from texts.messages import (
     MAIN_MENU_TEXT,
     SUPPORT_TEXT,
@@ -145,7 +146,7 @@ async def format_order_summary(order):
 
 async def send_long_message(bot, chat_id, text, max_length=4096, parse_mode="HTML"):
     if len(text) <= max_length:
-        await bot.send_message(chat_id, text, parse_mode=parse_mode)
+        await send_message(chat_id, text, bot=bot, parse_mode=parse_mode)
         return
     paragraphs = re.split(r'\n\s*\n', text)
     current_message = ""
@@ -153,7 +154,7 @@ async def send_long_message(bot, chat_id, text, max_length=4096, parse_mode="HTM
     for paragraph in paragraphs:
         if len(current_message) + len(paragraph) + 2 > max_length:
             if current_message:
-                await bot.send_message(chat_id, current_message, parse_mode=parse_mode)
+                await send_message(chat_id, current_message, bot=bot, parse_mode=parse_mode)
             current_message = paragraph
         else:
             if current_message:
@@ -162,7 +163,7 @@ async def send_long_message(bot, chat_id, text, max_length=4096, parse_mode="HTM
                 current_message = paragraph
 
     if current_message:
-        await bot.send_message(chat_id, current_message, parse_mode=parse_mode)
+        await send_message(chat_id, current_message, bot=bot, parse_mode=parse_mode)
 
 
 def format_datetime(dt_str, format="%Y-%m-%d %H:%M:%S"):
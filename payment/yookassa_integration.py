@@ -22,7 +22,7 @@ def get_yookassa_config():
         return False
 
 
-def create_payment(amount, description, user_id=None):
+def create_payment(amount, description, user_id=None, order_id=None):
     """Создает платеж в ЮKassa"""
     try:
         # Устанавливаем минимальную сумму 1 рубль для случаев с 100% скидкой
@@ -48,7 +48,7 @@ def create_payment(amount, description, user_id=None):
             "description": description,
             "metadata": {
                 "user_id": str(user_id) if user_id else "",
-                "order_id": str(uuid.uuid4()),
+                "order_id": str(order_id) if order_id else str(uuid.uuid4()),
                 "original_amount": str(amount)
             }
         })
@@ -1,10 +1,22 @@
-from .document_generator import generate_document
-from .pricing import calculate_total_price, get_savings, validate_promo_code, send_monthly_promo_notification
-
-__all__ = [
-    'generate_document',
-    'calculate_total_price',
-    'get_savings',
-    'validate_promo_code',
-    'send_monthly_promo_notification'
-]
\ No newline at end of file
+import importlib
+
+# Пакет импортируется при любом «from services.x import ...», поэтому
+# реэкспорты загружаются при первом обращении: генератор документов тянет
+# за собой рендеринг, а pricing — базу данных
+_EXPORTS = {
+    'generate_document': 'document_generator',
+    'generate_document_async': 'document_generator',
+    'calculate_total_price': 'pricing',
+    'get_savings': 'pricing',
+    'validate_promo_code': 'pricing',
+    'send_monthly_promo_notification': 'pricing',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(f".{module_name}", __name__), name)
@@ -1,133 +1,111 @@
-def amount_to_words(amount):
+from functools import lru_cache
+
+# Размер кэша готовых строк: в документах повторяются одни и те же суммы
+AMOUNT_WORDS_CACHE_SIZE = 4096
+
+# Таблицы слов строятся один раз при импорте модуля
+_UNITS_MASCULINE = ("", "один", "два", "три", "четыре", "пять", "шесть", "семь", "восемь", "девять")
+_UNITS_FEMININE = ("", "одна", "две", "три", "четыре", "пять", "шесть", "семь", "восемь", "девять")
+_TEENS = ("десять", "одиннадцать", "двенадцать", "тринадцать", "четырнадцать", "пятнадцать",
+          "шестнадцать", "семнадцать", "восемнадцать", "девятнадцать")
+_TENS = ("", "", "двадцать", "тридцать", "сорок", "пятьдесят", "шестьдесят", "семьдесят", "восемьдесят", "девяносто")
+_HUNDREDS = ("", "сто", "двести", "триста", "четыреста", "пятьсот", "шестьсот", "семьсот", "восемьсот", "девятьсот")
+
+# Формы слова для 1, 2-4 и 5-20 (и 0)
+RUBLE_FORMS = ("рубль", "рубля", "рублей")
+KOPECK_FORMS = ("копейка", "копейки", "копеек")
+
+# Разряды от старшего к младшему: (делитель, формы, женский род)
+_SCALES = (
+    (1_000_000_000, ("миллиард", "миллиарда", "миллиардов"), False),
+    (1_000_000, ("миллион", "миллиона", "миллионов"), False),
+    (1_000, ("тысяча", "тысячи", "тысяч"), True),
+)
+
+
+def plural_form(n: int, forms: tuple) -> str:
+    """Выбирает форму слова по числу: forms = (1, 2-4, 5-20)."""
+    last_two_digits = n % 100
+    if 11 <= last_two_digits <= 19:
+        return forms[2]
+    last_digit = n % 10
+    if last_digit == 1:
+        return forms[0]
+    if 2 <= last_digit <= 4:
+        return forms[1]
+    return forms[2]
+
+
+@lru_cache(maxsize=2000)
+def _triad_to_words(n: int, feminine: bool) -> tuple:
+    """Слова для числа 0..999."""
+    words = []
+    if n >= 100:
+        words.append(_HUNDREDS[n // 100])
+        n %= 100
+    if n >= 20:
+        words.append(_TENS[n // 10])
+        n %= 10
+    if 10 <= n < 20:
+        words.append(_TEENS[n - 10])
+    elif n > 0:
+        words.append((_UNITS_FEMININE if feminine else _UNITS_MASCULINE)[n])
+    return tuple(words)
+
+
+def number_to_words(n: int, feminine: bool = False) -> str:
+    """
+    Число прописью: 21 -> «двадцать один», 2000 -> «две тысячи».
+    feminine — род единиц (копейки, тысячи). Для нуля возвращает «ноль».
+    """
+    if n == 0:
+        return "ноль"
+
+    words = []
+    for divisor, forms, scale_feminine in _SCALES:
+        if n >= divisor:
+            count = n // divisor
+            # Больше тысячи миллиардов — рекурсивно («одна тысяча миллиардов»)
+            if count >= 1000:
+                words.append(number_to_words(count, scale_feminine))
+            else:
+                words.extend(_triad_to_words(count, scale_feminine))
+            words.append(plural_form(count, forms))
+            n %= divisor
+    words.extend(_triad_to_words(n, feminine))
+    return " ".join(words)
+
+
+@lru_cache(maxsize=AMOUNT_WORDS_CACHE_SIZE)
+def _format_amount(rub: int, kop: int) -> str:
+    result = "{:,.0f}".format(rub).replace(",", " ") + f" руб. {kop:02d} коп."
+
+    # Пропись добавляется только если есть рубли или копейки
+    words_parts = []
+    if rub > 0:
+        words_parts.append(f"{number_to_words(rub)} {plural_form(rub, RUBLE_FORMS)}")
+    if kop > 0:
+        words_parts.append(f"{number_to_words(kop, feminine=True)} {plural_form(kop, KOPECK_FORMS)}")
+    if words_parts:
+        result += f" ({' '.join(words_parts)})"
+    return result
+
+
+def split_amount(amount) -> tuple:
+    """Разбивает сумму на рубли и копейки с округлением копеек."""
     rub = int(amount)
     kop = int(round((amount - rub) * 100))
     if kop == 100:
         rub += 1
         kop = 0
-    amount_formatted = "{:,.0f}".format(rub).replace(",", " ")
-    amount_formatted += f" руб. {kop:02d} коп."
-
-    # Словари для преобразования чисел в слова
-    units = ["", "один", "два", "три", "четыре", "пять", "шесть", "семь", "восемь", "девять"]
-    teens = ["десять", "одиннадцать", "двенадцать", "тринадцать", "четырнадцать", "пятнадцать",
-             "шестнадцать", "семнадцать", "восемнадцать", "девятнадцать"]
-    tens = ["", "", "двадцать", "тридцать", "сорок", "пятьдесят", "шестьдесят", "семьдесят", "восемьдесят", "девяносто"]
-    hundreds = ["", "сто", "двести", "триста", "четыреста", "пятьсот", "шестьсот", "семьсот", "восемьсот", "девятьсот"]
-
-    # Специальные формы для тысяч
-    units_thousands = ["", "одна", "две", "три", "четыре", "пять", "шесть", "семь", "восемь", "девять"]
-
-    # Преобразуем рубли в строку прописью
-    def convert_number(n, for_thousands=False):
-        if n == 0:
-            return ""
-
-        words = []
-
-        # Миллионы
-        if n >= 1000000:
-            millions = n // 1000000
-            words.append(convert_number(millions, False))
-            # Склонение для миллионов
-            last_digit = millions % 10
-            last_two_digits = millions % 100
-            if 5 <= last_two_digits <= 20 or last_digit == 0 or last_digit >= 5:
-                words.append("миллионов")
-            elif last_digit == 1:
-                words.append("миллион")
-            else:
-                words.append("миллиона")
-            n %= 1000000
-
-        # Тысячи
-        if n >= 1000:
-            thousands_value = n // 1000
-
-            # Преобразуем тысячи в слова
-            if thousands_value >= 100:
-                words.append(hundreds[thousands_value // 100])
-                thousands_value %= 100
-            if thousands_value >= 20:
-                words.append(tens[thousands_value // 10])
-                thousands_value %= 10
-            if 10 <= thousands_value < 20:
-                words.append(teens[thousands_value - 10])
-            elif thousands_value > 0:
-                words.append(units_thousands[thousands_value])
-
-            n %= 1000
-            last_digit = (n // 1000) % 10
-            last_two_digits = (n // 1000) % 100
-            if 5 <= last_two_digits <= 20 or last_digit == 0 or last_digit >= 5:
-                words.append("тысяч")
-            elif last_digit == 1:
-                words.append("тысяча")
-            else:
-                words.append("тысячи")
-
-        # Сотни
-        if n >= 100:
-            words.append(hundreds[n // 100])
-            n %= 100
-
-        # Десятки и единицы
-        if n >= 20:
-            words.append(tens[n // 10])
-            n %= 10
-        if 10 <= n < 20:
-            words.append(teens[n - 10])
-            n = 0
-        if 0 < n < 10:
-            words.append(units[n] if not for_thousands else units_thousands[n])
-
-        return " ".join(words).strip()
-
-    # Формы слов для рублей
-    rub_word = "рублей"
-    last_digit = rub % 10
-    last_two_digits = rub % 100
-
-    if 5 <= last_two_digits <= 20:
-        rub_word = "рублей"
-    elif last_digit == 1:
-        rub_word = "рубль"
-    elif 2 <= last_digit <= 4:
-        rub_word = "рубля"
-
-    # Формы слов для копеек
-    kop_word = "копеек"
-    last_digit_kop = kop % 10
-    last_two_digits_kop = kop % 100
-
-    if 5 <= last_two_digits_kop <= 20:
-        kop_word = "копеек"
-    elif last_digit_kop == 1:
-        kop_word = "копейка"
-    elif 2 <= last_digit_kop <= 4:
-        kop_word = "копейки"
-
-    # Обрабатываем случай, когда рубли = 0
-    if rub == 0 and kop > 0:
-        rub_words = ""
-    else:
-        rub_words = convert_number(rub, False)
-        if not rub_words:
-            rub_words = "ноль"
-
-    # Формируем итоговую строку
-    result = f"{amount_formatted}"
-
-    # Добавляем пропись только если есть рубли или копейки
-    if rub > 0 or kop > 0:
-        words_parts = []
-        if rub > 0:
-            words_parts.append(f"{rub_words} {rub_word}")
-        if kop > 0:
-            kop_words = convert_number(kop, False)
-            if not kop_words:
-                kop_words = "ноль"
-            words_parts.append(f"{kop_words} {kop_word}")
+    return rub, kop
+
+
+def amount_to_words(amount):
+    """Сумма цифрами и прописью: «1 500 руб. 00 коп. (одна тысяча пятьсот рублей)»."""
+    return _format_amount(*split_amount(amount))
 
-        result += f" ({' '.join(words_parts)})"
 
-    return result
\ No newline at end of file
+def amounts_to_words(amounts) -> list:
+    """Пакетный вариант amount_to_words: одинаковые суммы считаются один раз."""
+    return [_format_amount(*split_amount(amount)) for amount in amounts]
@@ -0,0 +1,177 @@
+import logging
+import os
+import re
+import uuid
+from datetime import datetime, timezone
+from config import config
+
+logger = logging.getLogger('doc_bot.artifacts')
+
+# Сгенерированные файлы лежат в GENERATED_DOCUMENTS_PATH/ab/cd/<id>.<формат>, где id — 32 hex-символа
+# случайного UUID, а ab и cd — его первые символы. 65536 каталогов второго уровня: даже при
+# миллионах файлов в каталоге их десятки, и поиск по имени не сканирует длинные каталоги.
+# Имя не зависит от времени и шаблона, поэтому два документа одной секунды не перезаписывают друг друга
+SHARD_RE = re.compile(r"^[0-9a-f]{2}$")
+ARTIFACT_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+_LEGACY_NAME_RE = re.compile(r"^(?P<template>.+)_\d{8}_\d{6}$")
+_UNSAFE_CHARS = str.maketrans({char: '_' for char in '/\\:*?"<>|'})
+
+# Записей об артефактах в одной транзакции при переносе старых файлов
+_MIGRATION_BATCH = 1000
+
+
+def new_artifact_id() -> str:
+    return uuid.uuid4().hex
+
+
+def artifact_relpath(artifact_id: str, file_format: str) -> str:
+    """Путь относительно GENERATED_DOCUMENTS_PATH: ab/cd/<id>.pdf."""
+    return f"{artifact_id[:2]}/{artifact_id[2:4]}/{artifact_id}.{file_format}"
+
+
+def resolve_artifact_path(relpath: str) -> str:
+    return str(config.GENERATED_DOCUMENTS_PATH / relpath)
+
+
+def get_artifact_path(artifact_id: str, file_format: str) -> str:
+    """Абсолютный путь для нового файла; каталоги шарда создаются при необходимости."""
+    path = config.GENERATED_DOCUMENTS_PATH / artifact_relpath(artifact_id, file_format)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return str(path)
+    except OSError as e:
+        logger.error(f"Ошибка при создании каталога {path.parent}: {e}", exc_info=True)
+        temp_path = config.TEMP_PATH / f"{artifact_id}.{file_format}"
+        logger.info(f"Используем резервный путь к документу: {temp_path}")
+        return str(temp_path)
+
+
+def readable_name(template_name: str, doc_name: str = "", suffix: str = "") -> str:
+    """Имя файла без расширения, которое видит пользователь в Telegram."""
+    name = f"{doc_name} {suffix}" if doc_name and suffix else doc_name or template_name
+    return name.translate(_UNSAFE_CHARS)
+
+
+def register_document(artifact_id: str, paths: dict, user_id: int = None, template_name: str = None,
+                      file_name: str = None, order_id: int = None, order_item_id: int = None) -> bool:
+    """Записывает в document_artifacts файлы одной генерации: paths — {формат: абсолютный путь}."""
+    from database.artifacts import record_artifacts
+
+    root = str(config.GENERATED_DOCUMENTS_PATH)
+    rows = []
+    for file_format, path in paths.items():
+        relpath = os.path.relpath(path, root)
+        if relpath.startswith('..'):
+            # Резервный путь в TEMP_PATH: такой файл удалится вместе с временными
+            continue
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = None
+        rows.append({
+            'id': artifact_id, 'format': file_format, 'path': relpath.replace(os.sep, '/'),
+            'user_id': user_id, 'order_id': order_id, 'order_item_id': order_item_id,
+            'template_name': template_name, 'file_name': file_name, 'size': size,
+        })
+    return record_artifacts(rows)
+
+
+def _is_legacy_dir(name: str) -> bool:
+    # Старая схема: documents/generated/<user_id>/ (или «None», если пользователь не был передан)
+    return SHARD_RE.match(name) is None
+
+
+def _utc_timestamp(value: float) -> str:
+    # CURRENT_TIMESTAMP в SQLite — UTC, поэтому и перенесенные файлы датируются в UTC
+    return datetime.fromtimestamp(value, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _flush_migrated(moved: list, rows: list, stats: dict):
+    from database.artifacts import record_artifacts
+
+    if record_artifacts(rows):
+        stats['migrated'] += len(rows)
+    else:
+        # Без записи в базе файл не найти по заказу: возвращаем файлы на старое место
+        for source, target in moved:
+            try:
+                os.rename(target, source)
+            except OSError as e:
+                logger.warning(f"Не удалось вернуть {target} в {source}: {e}")
+        stats['errors'] += len(rows)
+    moved.clear()
+    rows.clear()
+
+
+def _migrate_dir(user_dir: os.DirEntry, stats: dict):
+    user_id = int(user_dir.name) if user_dir.name.isdigit() else None
+    moved, rows = [], []
+    with os.scandir(user_dir.path) as entries:
+        for entry in entries:
+            if not entry.is_file(follow_symlinks=False):
+                continue
+            stem, extension = os.path.splitext(entry.name)
+            file_format = extension.lstrip('.').lower() or 'bin'
+            artifact_id = new_artifact_id()
+            relpath = artifact_relpath(artifact_id, file_format)
+            target = config.GENERATED_DOCUMENTS_PATH / relpath
+            try:
+                stat = entry.stat(follow_symlinks=False)
+                target.parent.mkdir(parents=True, exist_ok=True)
+                # Переименование в пределах одной файловой системы: данные не копируются, mtime сохраняется
+                os.rename(entry.path, target)
+            except OSError as e:
+                logger.warning(f"Не удалось перенести {entry.path}: {e}")
+                stats['errors'] += 1
+                continue
+
+            legacy_name = _LEGACY_NAME_RE.match(stem)
+            moved.append((entry.path, target))
+            rows.append({
+                'id': artifact_id, 'format': file_format, 'path': relpath, 'user_id': user_id,
+                'template_name': legacy_name.group('template') if legacy_name else None,
+                'file_name': stem, 'size': stat.st_size, 'created_at': _utc_timestamp(stat.st_mtime),
+            })
+            if len(rows) >= _MIGRATION_BATCH:
+                _flush_migrated(moved, rows, stats)
+    if rows:
+        _flush_migrated(moved, rows, stats)
+
+    try:
+        os.rmdir(user_dir.path)
+        stats['dirs_removed'] += 1
+    except OSError:
+        # В каталоге остались файлы, которые не удалось перенести
+        pass
+
+
+def migrate_legacy_documents() -> dict:
+    """
+    Переносит файлы из старых каталогов documents/generated/<user_id>/ в схему
+    ab/cd/<id>.<формат> и записывает их в document_artifacts (без связи с заказом:
+    старая схема пути к файлам не сохраняла). Повторный запуск переносит только
+    то, что осталось; если переносить нечего, это один os.scandir корня.
+    """
+    stats = {'migrated': 0, 'errors': 0, 'dirs_removed': 0}
+    try:
+        legacy_dirs = [
+            entry for entry in os.scandir(config.GENERATED_DOCUMENTS_PATH)
+            if entry.is_dir(follow_symlinks=False) and _is_legacy_dir(entry.name)
+        ]
+    except FileNotFoundError:
+        return stats
+
+    for user_dir in legacy_dirs:
+        try:
+            _migrate_dir(user_dir, stats)
+        except OSError as e:
+            logger.warning(f"Не удалось прочитать каталог {user_dir.path}: {e}")
+            stats['errors'] += 1
+
+    if legacy_dirs:
+        logger.info(
+            f"Перенос документов в новую схему путей: перенесено {stats['migrated']}, "
+            f"ошибок {stats['errors']}, удалено каталогов {stats['dirs_removed']}"
+        )
+    return stats
+
@@ -4,6 +4,7 @@ from datetime import datetime, timedelta
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from config import config
 from services.notifications import send_daily_stats_report, send_monthly_stats_report, send_yearly_stats_report
+from services.outbound import send_message, PRIORITY_MARKETING
 
 logger = logging.getLogger('doc_bot.background_tasks')
 
@@ -79,7 +80,7 @@ async def send_draft_reminders(bot):
                     doc_name = doc['name'] if doc else "документ"
 
                     # Отправляем сообщение
-                    await bot.send_message(
+                    await send_message(
                         user_id,
                         f"⏰ <b>Внимание!</b> У вас есть неоконченное заполнение документа\n\n"
                         f"<b>'{doc_name}'</b>\n\n"
@@ -91,7 +92,9 @@ async def send_draft_reminders(bot):
                             [InlineKeyboardButton(text="🗑️ Удалить черновик",
                                                   callback_data=f"delete_draft_{template_id}")]
                         ]),
-                        parse_mode="HTML"
+                        parse_mode="HTML",
+                        priority=PRIORITY_MARKETING,
+                        bot=bot
                     )
                     logger.info(f"✅ Отправлено напоминание о черновике пользователю {user_id}")
                 except Exception as e:
@@ -135,4 +138,20 @@ async def send_daily_stats():
 
         except Exception as e:
             logger.error(f"❌ Ошибка при отправке статистики: {e}", exc_info=True)
-            await asyncio.sleep(3600)
\ No newline at end of file
+            await asyncio.sleep(3600)
+
+
+async def sweep_storage():
+    """Периодическая очистка сгенерированных документов и временных файлов (в отдельном потоке)."""
+    from services.storage import sweep_generated_documents
+
+    interval = config.STORAGE_SWEEP_INTERVAL_HOURS * 3600
+    logger.info(f"Запущена фоновая задача очистки документов (каждые {config.STORAGE_SWEEP_INTERVAL_HOURS} ч)")
+
+    while True:
+        try:
+            await asyncio.to_thread(sweep_generated_documents)
+            await asyncio.sleep(interval)
+        except Exception as e:
+            logger.error(f"❌ Ошибка при очистке документов: {e}", exc_info=True)
+            await asyncio.sleep(3600)
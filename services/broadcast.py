@@ -0,0 +1,172 @@
+import asyncio
+import logging
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError
+from config import config
+from database.broadcasts import (
+    create_broadcast, get_broadcast, get_unfinished_broadcasts,
+    get_broadcast_recipients, update_broadcast_progress, finish_broadcast
+)
+from database.users import remove_news_subscriber
+from services.outbound import send_message, PRIORITY_MARKETING
+from services.rate_limiter import TokenBucket
+
+logger = logging.getLogger('doc_bot.broadcast')
+
+# Лимит для рассылок ниже общего лимита очереди, чтобы оставался запас
+# для документов и уведомлений с более высоким приоритетом
+_marketing_bucket = None
+
+# Активные задачи рассылок (храним ссылки, чтобы задачи не собрал GC)
+_active_tasks = {}
+
+# Паузы (сек) перед повторным чтением получателей после ошибки БД
+_RECIPIENTS_RETRY_DELAYS = (5, 30, 120)
+
+
+def _get_marketing_bucket() -> TokenBucket:
+    global _marketing_bucket
+    if _marketing_bucket is None:
+        _marketing_bucket = TokenBucket(config.BROADCAST_GLOBAL_RATE)
+    return _marketing_bucket
+
+
+async def _send_one(bot: Bot, chat_id: int, text: str) -> str:
+    """
+    Отправляет одно сообщение рассылки через общую очередь.
+    Возвращает 'sent', 'blocked' или 'failed'.
+    """
+    await _get_marketing_bucket().acquire()
+    try:
+        await send_message(chat_id, text, priority=PRIORITY_MARKETING, bot=bot, parse_mode="HTML")
+        return 'sent'
+    except TelegramForbiddenError:
+        logger.info(f"Пользователь {chat_id} заблокировал бота, отписываем от рассылки")
+        remove_news_subscriber(chat_id)
+        return 'blocked'
+    except Exception as e:
+        logger.warning(f"Не удалось отправить рассылку пользователю {chat_id}: {e}")
+        return 'failed'
+
+
+async def _fetch_recipients(audience: str, cursor: int) -> list:
+    """Следующая порция получателей; None — БД недоступна и после повторных попыток."""
+    batch = get_broadcast_recipients(audience, cursor, config.BROADCAST_BATCH_SIZE)
+    for delay in _RECIPIENTS_RETRY_DELAYS:
+        if batch is not None:
+            break
+        await asyncio.sleep(delay)
+        batch = get_broadcast_recipients(audience, cursor, config.BROADCAST_BATCH_SIZE)
+    return batch
+
+
+async def run_broadcast(bot: Bot, broadcast_id: int) -> dict:
+    """
+    Выполняет рассылку порциями, начиная с сохраненного курсора.
+    После каждой порции курсор сохраняется в БД, поэтому после перезапуска
+    рассылка продолжается с места остановки.
+    Возвращает итоговую запись рассылки или None, если рассылка не завершена.
+    """
+    broadcast = get_broadcast(broadcast_id)
+    if not broadcast:
+        logger.error(f"Рассылка #{broadcast_id} не найдена")
+        return None
+
+    semaphore = asyncio.Semaphore(config.BROADCAST_CONCURRENCY)
+    cursor = broadcast['last_user_id']
+    text = broadcast['text']
+
+    async def guarded_send(chat_id: int) -> str:
+        async with semaphore:
+            return await _send_one(bot, chat_id, text)
+
+    logger.info(f"Запуск рассылки #{broadcast_id} с курсора {cursor}")
+
+    try:
+        while True:
+            batch = await _fetch_recipients(broadcast['audience'], cursor)
+            if batch is None:
+                # Рассылка остается в статусе running и продолжится после перезапуска
+                logger.error(f"Рассылка #{broadcast_id} приостановлена на курсоре {cursor}: нет доступа к БД")
+                return None
+            if not batch:
+                break
+
+            results = await asyncio.gather(*(guarded_send(chat_id) for chat_id in batch))
+            cursor = batch[-1]
+            update_broadcast_progress(
+                broadcast_id,
+                cursor,
+                sent=results.count('sent'),
+                failed=results.count('failed'),
+                blocked=results.count('blocked')
+            )
+
+        finish_broadcast(broadcast_id)
+    except asyncio.CancelledError:
+        logger.info(f"Рассылка #{broadcast_id} прервана на курсоре {cursor}")
+        raise
+
+    result = get_broadcast(broadcast_id)
+    if not result:
+        return None
+    logger.info(
+        f"Рассылка #{broadcast_id} завершена: {result['sent']} успешно, "
+        f"{result['failed']} ошибок, {result['blocked']} заблокировали бота из {result['total']}"
+    )
+
+    if result['admin_id']:
+        try:
+            await send_message(
+                result['admin_id'],
+                bot=bot,
+                text=(
+                    f"📤 Рассылка #{broadcast_id} завершена!\n"
+                    f"✅ Успешно: {result['sent']}\n"
+                    f"❌ Ошибок: {result['failed']}\n"
+                    f"🚫 Заблокировали бота: {result['blocked']}"
+                )
+            )
+        except Exception as e:
+            logger.warning(f"Не удалось отправить отчет о рассылке администратору: {e}")
+
+    return result
+
+
+def _start_task(bot: Bot, broadcast_id: int):
+    task = asyncio.create_task(run_broadcast(bot, broadcast_id))
+    _active_tasks[broadcast_id] = task
+    task.add_done_callback(lambda t: _active_tasks.pop(broadcast_id, None))
+    return task
+
+
+def start_broadcast(bot: Bot, text: str, admin_id: int = None, audience: str = 'subscribers') -> int:
+    """Создает рассылку и запускает ее в фоне. Возвращает id рассылки."""
+    broadcast_id = create_broadcast(text, admin_id, audience)
+    if not broadcast_id:
+        return None
+    _start_task(bot, broadcast_id)
+    return broadcast_id
+
+
+def resume_unfinished_broadcasts(bot: Bot) -> int:
+    """Возобновляет рассылки, прерванные перезапуском бота."""
+    resumed = 0
+    for broadcast in get_unfinished_broadcasts():
+        if broadcast['id'] in _active_tasks:
+            continue
+        logger.info(f"Возобновляем рассылку #{broadcast['id']} с курсора {broadcast['last_user_id']}")
+        _start_task(bot, broadcast['id'])
+        resumed += 1
+    return resumed
+
+
+def cancel_running_broadcast(broadcast_id: int) -> bool:
+    """Останавливает рассылку; завершенные и уже отмененные рассылки не трогает."""
+    broadcast = get_broadcast(broadcast_id)
+    if not broadcast or broadcast['status'] != 'running':
+        return False
+    task = _active_tasks.get(broadcast_id)
+    if task:
+        task.cancel()
+    return finish_broadcast(broadcast_id, status='cancelled')
@@ -0,0 +1,205 @@
+import csv
+import io
+import json
+import logging
+import re
+from services.validators import compile_validator, validate_many
+
+logger = logging.getLogger('doc_bot.bulk_fill')
+
+# Максимальный размер файла с ответами
+MAX_BULK_FILE_SIZE = 256 * 1024
+
+_KEY_VALUE_RE = re.compile(r'^\s*([^:=]+?)\s*[:=]\s*(.*?)\s*$')
+_NON_WORD_RE = re.compile(r'[^\w]+')
+
+
+def _normalize_key(key: str) -> str:
+    """Ключ для сравнения: без эмодзи, знаков препинания и регистра."""
+    return _NON_WORD_RE.sub(' ', str(key)).strip().lower()
+
+
+def parse_key_value_text(text: str) -> dict:
+    """Разбирает блок строк вида «ключ: значение» (или «ключ = значение»)."""
+    raw = {}
+    for line in (text or "").splitlines():
+        match = _KEY_VALUE_RE.match(line)
+        if match and match.group(2):
+            raw[match.group(1)] = match.group(2)
+    return raw
+
+
+def parse_json_file(content: bytes) -> dict:
+    data = json.loads(content.decode('utf-8-sig'))
+    if isinstance(data, dict) and isinstance(data.get('answers'), dict):
+        data = data['answers']
+    if not isinstance(data, dict):
+        raise ValueError("JSON должен содержать объект вида {\"шаг\": \"значение\"}")
+    return data
+
+
+def parse_csv_file(content: bytes) -> dict:
+    """
+    CSV из двух колонок (ключ, значение) или с заголовком из ключей
+    и одной строкой значений.
+    """
+    text = content.decode('utf-8-sig')
+    try:
+        dialect = csv.Sniffer().sniff(text[:2048], delimiters=",;\t") if text.strip() else csv.excel
+    except csv.Error:
+        # Одна колонка или неоднозначный разделитель — читаем как обычный CSV
+        dialect = csv.excel
+    try:
+        rows = [row for row in csv.reader(io.StringIO(text), dialect) if any(cell.strip() for cell in row)]
+    except csv.Error as e:
+        raise ValueError(f"Некорректный CSV: {e}") from e
+    if not rows:
+        return {}
+    if len(rows) == 2 and len(rows[0]) > 2:
+        return dict(zip(rows[0], rows[1]))
+    return {row[0]: row[1] for row in rows if len(row) >= 2}
+
+
+def parse_bulk_file(file_name: str, content: bytes) -> dict:
+    if len(content) > MAX_BULK_FILE_SIZE:
+        raise ValueError("Файл слишком большой")
+    if (file_name or "").lower().endswith(".json"):
+        return parse_json_file(content)
+    if (file_name or "").lower().endswith(".csv"):
+        return parse_csv_file(content)
+    raise ValueError("Поддерживаются файлы .json и .csv")
+
+
+def build_key_lookup(questions: list) -> dict:
+    """Ключ -> индекс вопроса: по имени шага, тексту вопроса и номеру (с 1)."""
+    lookup = {}
+    for index, question in enumerate(questions):
+        lookup[str(index + 1)] = index
+        if question.get('text'):
+            lookup.setdefault(_normalize_key(question['text']), index)
+        if question.get('step'):
+            lookup[_normalize_key(question['step'])] = index
+    return lookup
+
+
+def _coerce_repeat_items(fields: list, value: list):
+    """Поля элементов группы проверяются теми же валидаторами, что и ответы в диалоге."""
+    validators = [compile_validator(field) for field in fields]
+    items = []
+    for number, raw_item in enumerate(value, 1):
+        item = {}
+        for field, validator in zip(fields, validators):
+            field_value = str(raw_item.get(field['step']) or "").strip()
+            if not field_value and not field.get('required'):
+                # Пустое необязательное поле — как пропущенное кнопкой в диалоге
+                item[field['step']] = "______"
+                continue
+            is_valid, error = validator(field_value)
+            if not is_valid:
+                return None, f"Элемент {number}, «{field['text']}»: {error}"
+            item[field['step']] = field_value
+        items.append(item)
+    return items, None
+
+
+def _coerce_value(question: dict, value):
+    """Приводит значение к формату ответа: выбор из вариантов, список для multi_select."""
+    if question.get('type') == 'repeat':
+        # Группа передается только списком объектов (JSON-файл или прошлый заказ)
+        if not isinstance(value, list) or not all(isinstance(item, dict) for item in value):
+            return None, "Передайте список элементов в JSON-файле"
+        if not value and question.get('required'):
+            return None, "Добавьте хотя бы один элемент"
+        return _coerce_repeat_items(question.get('fields', []), value)
+
+    options = question.get('options') or []
+    by_lower = {str(option).lower(): option for option in options}
+
+    if question.get('type') == 'multi_select':
+        # Варианты могут содержать запятые («0,1%»), поэтому разделитель — точка с запятой
+        items = value if isinstance(value, list) else str(value).split(';')
+        selected = []
+        for item in items:
+            option = by_lower.get(str(item).strip().lower())
+            if option is None:
+                return None, f"Недопустимый вариант: {str(item).strip()}"
+            selected.append(option)
+        return selected, None
+
+    value = str(value).strip()
+    if question.get('type') == 'choice':
+        option = by_lower.get(value.lower())
+        if option is None:
+            return None, "Выберите один из вариантов: " + ", ".join(map(str, options))
+        return option, None
+    return value, None
+
+
+def apply_bulk_answers(questions: list, raw: dict, answers: dict = None, by_index: bool = False,
+                       validators: list = None) -> dict:
+    """
+    Сопоставляет данные с вопросами шаблона и проверяет все значения за один проход.
+    validators — заранее скомпилированные валидаторы шаблона (из реестра).
+
+    by_index=True — ключи уже являются индексами ответов (данные прошлого заказа).
+    Возвращает answers (прежние ответы + принятые значения), errors
+    ({индекс: текст ошибки}) и unknown (нераспознанные ключи).
+    """
+    answers = dict(answers or {})
+    lookup = None if by_index else build_key_lookup(questions)
+    errors = {}
+    unknown = []
+    values = {}
+
+    for key, value in raw.items():
+        if value is None or value == "" or value == "______":
+            continue
+        if by_index:
+            index = int(key) if str(key).isdigit() and int(key) < len(questions) else None
+        else:
+            index = lookup.get(_normalize_key(key))
+        if index is None:
+            unknown.append(str(key))
+            continue
+
+        coerced, error = _coerce_value(questions[index], value)
+        if error:
+            errors[index] = error
+            values.pop(index, None)
+        else:
+            errors.pop(index, None)
+            values[index] = coerced
+
+    # Варианты выбора уже проверены при сопоставлении, остальное — одним вызовом
+    to_validate = {
+        index: value for index, value in values.items()
+        if questions[index].get('type') not in ('choice', 'multi_select', 'repeat')
+    }
+    errors.update(validate_many(questions, to_validate, validators))
+
+    accepted = 0
+    for index, value in values.items():
+        if index not in errors:
+            answers[str(index)] = value
+            accepted += 1
+    for index in errors:
+        answers.pop(str(index), None)
+
+    logger.debug(f"Пакетное заполнение: принято {accepted}, ошибок {len(errors)}, неизвестных ключей {len(unknown)}")
+    return {'answers': answers, 'errors': errors, 'unknown': unknown, 'accepted': accepted}
+
+
+def build_bulk_example(questions: list, limit: int = None) -> str:
+    """Образец блока «шаг: значение» для шаблона."""
+    lines = []
+    for question in questions[:limit]:
+        if not question.get('step') or question.get('type') == 'repeat':
+            continue
+        if question.get('type') == 'multi_select' and question.get('options'):
+            example = "; ".join(map(str, question['options'][:2]))
+        elif question.get('options'):
+            example = str(question['options'][0])
+        else:
+            example = question.get('example', '')
+        lines.append(f"{question['step']}: {example}")
+    return "\n".join(lines)
@@ -1,23 +1,40 @@
+import asyncio
+import importlib
 import logging
-import json
 import os
-import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from weasyprint import HTML, CSS
-from jinja2 import Environment, FileSystemLoader, select_autoescape
 from config import config
 from services.amount_to_words import amount_to_words
+from services.artifacts import get_artifact_path, new_artifact_id, readable_name, register_document
 from services.file_utils import ensure_dir_exists
 from services.document_service import get_template_path as get_service_template_path
+from services.template_data import prepare_step_data, redact_data
+from services.template_registry import get_data_schema
 
 logger = logging.getLogger('doc_bot.document_generator')
-logger.info("services/document_generator.py ЗАГРУЖЕН УСПЕШНО")
+
+
+def preload_rendering_stack() -> bool:
+    """
+    Загружает Jinja2 и WeasyPrint заранее. Модуль импортирует их лениво,
+    чтобы не замедлять запуск бота, а первый документ не ждал их загрузки.
+    """
+    try:
+        for module_name in ("jinja2", "weasyprint"):
+            importlib.import_module(module_name)
+        logger.info("Библиотеки рендеринга документов загружены")
+        return True
+    except Exception as e:
+        logger.error(f"Ошибка при загрузке библиотек рендеринга: {e}", exc_info=True)
+        return False
 
 
 def get_template_path(template_name: str, file_type: str = "autogen") -> Path:
     try:
-        logger.info(f"Ищем шаблон: {template_name} (тип файла: {file_type})")
+        logger.debug(f"Ищем шаблон: {template_name} (тип файла: {file_type})")
         template_path = get_service_template_path(template_name, file_type)
 
         if not template_path:
@@ -28,92 +45,16 @@ def get_template_path(template_name: str, file_type: str = "autogen") -> Path:
             logger.error(f"Файл шаблона не существует: {template_path}")
             return None
 
-        logger.info(f"Найден шаблон: {template_path}")
+        logger.debug(f"Найден шаблон: {template_path}")
         return template_path
     except Exception as e:
         logger.error(f"Ошибка при поиске шаблона: {e}", exc_info=True)
         return None
 
 
-def get_document_path_with_extension(user_id: int, template_name: str, extension: str, doc_name: str = "", suffix: str = "") -> str:
-    try:
-        user_dir = config.GENERATED_DOCUMENTS_PATH / str(user_id)
-        ensure_dir_exists(user_dir)
-
-        if doc_name and suffix:
-            safe_doc_name = doc_name.replace('/', '_').replace('\\', '_').replace(':', '_').replace('*', '_').replace('?', '_').replace('"', '_').replace('<', '_').replace('>', '_').replace('|', '_')
-            filename = f"{safe_doc_name} {suffix}.{extension}"
-        else:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"{template_name}_{timestamp}.{extension}"
-
-        full_path = user_dir / filename
-        logger.info(f"Сгенерирован путь к документу: {full_path}")
-        return str(full_path)
-    except Exception as e:
-        logger.error(f"Ошибка при генерации пути к документу: {e}", exc_info=True)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        safe_template_name_backup = template_name.replace('/', '_').replace('\\', '_').replace(':', '_').replace('*', '_').replace('?', '_').replace('"', '_').replace('<', '_').replace('>', '_').replace('|', '_')
-        temp_path = config.TEMP_PATH / f"{safe_template_name_backup}_{timestamp}.{extension}"
-        logger.info(f"Используем резервный путь к документу: {temp_path}")
-        return str(temp_path)
-
-
 def process_template_data(answers: dict) -> dict:
-    logger.info(f"Обработка данных для шаблона. Исходные данные: {answers}")
-
-    template_data = answers.copy()
-    template_data['current_date'] = datetime.now()
-    template_data['current_date_formatted'] = datetime.now().strftime("%d.%m.%Y")
-    template_data['now'] = datetime.now()
-
-    def get_initial(name: str) -> str:
-        return (name or "")[:1].upper() if (name and name != "______") else "_"
-
-    template_data["executor_first_name_initial"] = get_initial(template_data.get("executor_first_name"))
-    template_data["executor_patronymic_initial"] = get_initial(template_data.get("executor_patronymic"))
-    template_data["customer_first_name_initial"] = get_initial(template_data.get("customer_first_name"))
-    template_data["customer_patronymic_initial"] = get_initial(template_data.get("customer_patronymic"))
-
-    if 'service_cost_numeric' in template_data:
-        try:
-            raw = template_data['service_cost_numeric']
-            clean = re.sub(r'[^\d.,]', '', str(raw))
-            clean = clean.replace(',', '.')
-            amount = float(clean)
-            template_data['service_cost_full'] = amount_to_words(amount)
-        except (ValueError, TypeError, Exception) as e:
-            logger.warning(f"Ошибка при обработке суммы '{raw}': {e}")
-            template_data['service_cost_full'] = "______ руб. __ коп. (______)"
-
-    for key, value in list(template_data.items()):
-        if isinstance(value, list):
-            if value and isinstance(value[0], dict):
-                template_data[key] = value
-            else:
-                template_data[key] = ", ".join(str(v) for v in value if v)
-
-    date_fields = [k for k in template_data.keys() if 'date' in k.lower()]
-    for field in date_fields:
-        if template_data[field] and template_data[field] != "______":
-            try:
-                for fmt in ["%d.%m.%Y", "%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%d/%m/%Y"]:
-                    try:
-                        date_obj = datetime.strptime(template_data[field], fmt)
-                        template_data[f"{field}_formatted"] = date_obj.strftime("%d.%m.%Y")
-                        break
-                    except (ValueError, TypeError):
-                        continue
-                else:
-                    template_data[f"{field}_formatted"] = template_data[field]
-            except Exception as e:
-                logger.warning(f"Ошибка при форматировании даты {field}: {e}")
-                template_data[f"{field}_formatted"] = "______"
-        else:
-            template_data[f"{field}_formatted"] = "______"
-
-    logger.info(f"Обработанные данные для шаблона: {template_data}")
-    return template_data
+    """Подготовка данных, разложенных по именам шагов (без схемы шаблона)."""
+    return prepare_step_data(answers)
 
 
 def date_filter(value, fmt='d.m.Y'):
@@ -141,69 +82,17 @@ def date_filter(value, fmt='d.m.Y'):
 
 
 def render_template(template_path: Path, answers: dict) -> str:
+    from jinja2 import Environment, FileSystemLoader, select_autoescape
+
     try:
-        logger.info(f"Начало обработки шаблона: {template_path}")
+        logger.debug(f"Начало обработки шаблона: {template_path}")
 
         template_name = template_path.parent.name
-        questions_path = template_path.parent / "questions.json"
-        if not questions_path.exists():
-            questions_path = Path("documents/templates/contracts") / template_name / "questions.json"
-        if not questions_path.exists():
-            raise FileNotFoundError(f"Не найден файл вопросов для шаблона: {questions_path}")
-
-        with open(questions_path, 'r', encoding='utf-8') as f:
-            questions = json.load(f)
-
-        filled_data = {}
-        for idx, question in enumerate(questions):
-            key = str(idx)
-            step_name = question["step"]
-            if key in answers:
-                filled_data[step_name] = answers[key]
-            else:
-                filled_data[step_name] = "______"
-
-        if template_name == "inventory_2025":
-            inventory_items = []
-            i = 1
-            while True:
-                name_key = f"item_{i}_name"
-                if name_key in answers:
-                    name = answers[name_key].strip()
-                    if name and name != "______":
-                        quantity = answers.get(f"item_{i}_quantity", "______").strip() or "______"
-                        condition = answers.get(f"item_{i}_condition", "______").strip() or "______"
-                        inventory_items.append({
-                            "name": name,
-                            "quantity": quantity,
-                            "condition": condition
-                        })
-                        i += 1
-                    else:
-                        break
-                else:
-                    break
-            filled_data["inventory_items"] = inventory_items
-
-            if "inventory_date" in filled_data and filled_data["inventory_date"] != "______":
-                try:
-                    d = datetime.strptime(filled_data["inventory_date"], "%d.%m.%Y")
-                    months = ["января", "февраля", "марта", "апреля", "мая", "июня",
-                              "июля", "августа", "сентября", "октября", "ноября", "декабря"]
-                    filled_data["inventory_day"] = str(d.day)
-                    filled_data["inventory_month"] = months[d.month - 1]
-                    filled_data["inventory_year"] = str(d.year)
-                except Exception as e:
-                    logger.warning(f"Не удалось распарсить inventory_date: {e}")
-                    filled_data["inventory_day"] = "______"
-                    filled_data["inventory_month"] = "______"
-                    filled_data["inventory_year"] = "______"
-            else:
-                filled_data["inventory_day"] = "______"
-                filled_data["inventory_month"] = "______"
-                filled_data["inventory_year"] = "______"
+        schema = get_data_schema(template_name)
+        if schema is None:
+            raise FileNotFoundError(f"Не найден файл вопросов для шаблона: {template_name}")
 
-        filled_data = process_template_data(filled_data)
+        filled_data = schema.prepare(answers)
         env = Environment(
             loader=FileSystemLoader(template_path.parent),
             autoescape=select_autoescape(['html', 'xml'])
@@ -213,15 +102,17 @@ def render_template(template_path: Path, answers: dict) -> str:
         env.filters['date'] = date_filter
 
         template = env.get_template(template_path.name)
-        logger.info(f"Шаблон {template_path.name} успешно загружен")
+        logger.debug(f"Шаблон {template_path.name} успешно загружен")
 
         html_content = template.render(filled_data)
-        logger.info("Шаблон успешно обработан")
+        logger.debug("Шаблон успешно обработан")
 
-        debug_path = config.TEMP_PATH / f"debug_{template_path.stem}.html"
-        with open(debug_path, 'w', encoding='utf-8') as f:
-            f.write(html_content)
-        logger.info(f"Отладочный HTML сохранен: {debug_path}")
+        # Отладочный HTML содержит персональные данные, поэтому пишется только при уровне DEBUG
+        if logger.isEnabledFor(logging.DEBUG):
+            debug_path = config.TEMP_PATH / f"debug_{template_path.stem}.html"
+            with open(debug_path, 'w', encoding='utf-8') as f:
+                f.write(html_content)
+            logger.debug(f"Отладочный HTML сохранен: {debug_path}")
 
         return html_content
 
@@ -231,14 +122,16 @@ def render_template(template_path: Path, answers: dict) -> str:
 
 def convert_html_to_pdf(html_content: str, output_path: str) -> bool:
     try:
-        logger.info(f"Начало конвертации HTML в PDF. Выходной путь: {output_path}")
+        from weasyprint import HTML, CSS
+
+        logger.debug(f"Начало конвертации HTML в PDF. Выходной путь: {output_path}")
         ensure_dir_exists(os.path.dirname(output_path))
 
         css_path = Path(config.DOCUMENTS_PATH) / "static" / "css" / "document.css"
-        logger.info(f"Проверка CSS: {css_path}")
+        logger.debug(f"Проверка CSS: {css_path}")
 
         if css_path.exists():
-            logger.info(f"CSS найден: {css_path}")
+            logger.debug(f"CSS найден: {css_path}")
             css = CSS(filename=str(css_path))
         else:
             logger.warning(f"CSS не найден: {css_path}")
@@ -273,7 +166,7 @@ def convert_html_to_pdf(html_content: str, output_path: str) -> bool:
         )
 
         if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
-            logger.info(f"PDF успешно создан: {output_path}")
+            logger.debug(f"PDF успешно создан: {output_path}")
             return True
         else:
             logger.error(f"PDF файл создан, но пустой или не существует: {output_path}")
@@ -286,7 +179,7 @@ def convert_html_to_pdf(html_content: str, output_path: str) -> bool:
 
 def convert_html_to_docx(html_content: str, output_path: str) -> bool:
     try:
-        logger.info(f"Начало конвертации HTML в DOCX. Выходной путь: {output_path}")
+        logger.debug(f"Начало конвертации HTML в DOCX. Выходной путь: {output_path}")
         ensure_dir_exists(os.path.dirname(output_path))
 
         try:
@@ -295,7 +188,7 @@ def convert_html_to_docx(html_content: str, output_path: str) -> bool:
             result.save(output_path)
 
             if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
-                logger.info(f"DOCX успешно создан через mammoth: {output_path}")
+                logger.debug(f"DOCX успешно создан через mammoth: {output_path}")
                 return True
         except ImportError:
             logger.debug("Библиотека mammoth не установлена. Установите её с помощью 'pip install mammoth' для лучшей конвертации")
@@ -376,7 +269,7 @@ def convert_html_to_docx(html_content: str, output_path: str) -> bool:
             doc.save(output_path)
 
             if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
-                logger.info(f"DOCX успешно создан: {output_path}")
+                logger.debug(f"DOCX успешно создан: {output_path}")
                 return True
             else:
                 logger.error(f"DOCX файл создан, но пустой или не существует: {output_path}")
@@ -397,11 +290,71 @@ def convert_html_to_docx(html_content: str, output_path: str) -> bool:
         return False
 
 
-def generate_document(template_name: str, answers: dict, user_id: int = None, file_type: str = "autogen", doc_name: str = "", suffix: str = "") -> dict:
-    logger.info(f"Начата генерация документа: {template_name}. Пользователь: {user_id}")
-    logger.info(f"Тип файла для генерации: {file_type}")
-    logger.info(f"Данные для генерации: {answers}")
-    logger.info(f"Читаемое имя: {doc_name}, суффикс: {suffix}")
+# Профилировщик следующих вызовов generate_document (services.profiling, команда /profile docs)
+document_profiler = None
+
+
+def generate_document(template_name: str, answers: dict, user_id: int = None, file_type: str = "autogen", doc_name: str = "",
+                      suffix: str = "", order_id: int = None, order_item_id: int = None) -> dict:
+    args = (answers, user_id, file_type, doc_name, suffix, order_id, order_item_id)
+    if document_profiler is not None:
+        return document_profiler.run(_generate_document, template_name, *args)
+    return _generate_document(template_name, *args)
+
+
+# Пул потоков рендеринга: generate_document из обработчиков выполняется здесь, а не в event loop
+_render_executor = None
+_render_lock = threading.Lock()
+_render_running = 0
+_render_waiting = 0
+
+
+def _get_render_executor() -> ThreadPoolExecutor:
+    global _render_executor
+    with _render_lock:
+        if _render_executor is None:
+            _render_executor = ThreadPoolExecutor(max_workers=config.RENDER_WORKERS, thread_name_prefix="render")
+        return _render_executor
+
+
+def _run_in_render_worker(*args, **kwargs) -> dict:
+    global _render_running, _render_waiting
+    with _render_lock:
+        _render_waiting -= 1
+        _render_running += 1
+    try:
+        return generate_document(*args, **kwargs)
+    finally:
+        with _render_lock:
+            _render_running -= 1
+
+
+async def generate_document_async(*args, **kwargs) -> dict:
+    """generate_document в пуле из RENDER_WORKERS потоков; аргументы те же."""
+    global _render_waiting
+    executor = _get_render_executor()
+    with _render_lock:
+        _render_waiting += 1
+    try:
+        future = executor.submit(_run_in_render_worker, *args, **kwargs)
+    except Exception:
+        with _render_lock:
+            _render_waiting -= 1
+        raise
+    return await asyncio.wrap_future(future)
+
+
+def get_render_stats() -> dict:
+    """Занятые потоки рендеринга и документы, ожидающие свободного потока."""
+    with _render_lock:
+        return {'workers': config.RENDER_WORKERS, 'running': _render_running, 'waiting': _render_waiting}
+
+
+def _generate_document(template_name: str, answers: dict, user_id: int, file_type: str, doc_name: str, suffix: str,
+                       order_id: int, order_item_id: int) -> dict:
+    logger.info(f"Начата генерация документа: {template_name} ({file_type}). Пользователь: {user_id}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Данные для генерации: {redact_data(answers)}, читаемое имя: {doc_name}, суффикс: {suffix}")
 
     try:
         template_path = get_template_path(template_name, file_type)
@@ -411,10 +364,12 @@ def generate_document(template_name: str, answers: dict, user_id: int = None, fi
 
         html_content = render_template(template_path, answers)
 
-        pdf_path = get_document_path_with_extension(user_id, template_name, 'pdf', doc_name=doc_name, suffix=suffix)
-        docx_path = get_document_path_with_extension(user_id, template_name, 'docx', doc_name=doc_name, suffix=suffix)
+        # PDF и DOCX одной генерации — один артефакт: ab/cd/<id>.pdf и ab/cd/<id>.docx
+        artifact_id = new_artifact_id()
+        pdf_path = get_artifact_path(artifact_id, 'pdf')
+        docx_path = get_artifact_path(artifact_id, 'docx')
 
-        logger.info(f"Пути для сохранения: PDF - {pdf_path}, DOCX - {docx_path}")
+        logger.debug(f"Пути для сохранения: PDF - {pdf_path}, DOCX - {docx_path}")
 
         pdf_success = convert_html_to_pdf(html_content, pdf_path)
         docx_success = convert_html_to_docx(html_content, docx_path)
@@ -429,6 +384,10 @@ def generate_document(template_name: str, answers: dict, user_id: int = None, fi
             logger.error("Не удалось сгенерировать документы ни в одном формате")
             return None
 
+        register_document(
+            artifact_id, result, user_id=user_id, template_name=template_name,
+            file_name=readable_name(template_name, doc_name, suffix), order_id=order_id, order_item_id=order_item_id
+        )
         logger.info(f"Документы успешно сгенерированы: {result}")
         return result
 
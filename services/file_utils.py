@@ -5,7 +5,6 @@ from pathlib import Path
 from config import config
 
 logger = logging.getLogger('doc_bot.file_utils')
-logger.info("services/file_utils.py ЗАГРУЖЕН УСПЕШНО")
 
 
 def ensure_dir_exists(path: str) -> bool:
@@ -19,15 +18,10 @@ def ensure_dir_exists(path: str) -> bool:
 
 def get_document_path(user_id: int, template_name: str) -> str:
     try:
-        # Создаем путь для сохранения
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{template_name}_{timestamp}.pdf"
-        full_path = os.path.join(config.GENERATED_DOCUMENTS_PATH, str(user_id), filename)
+        # Новый PDF в схеме documents/generated/ab/cd/<id>.pdf (services.artifacts)
+        from services.artifacts import get_artifact_path, new_artifact_id
 
-        # Создаем директорию пользователя
-        ensure_dir_exists(os.path.dirname(full_path))
-
-        return full_path
+        return get_artifact_path(new_artifact_id(), 'pdf')
     except Exception as e:
         logger.error(f"Ошибка при получении пути к документу: {e}", exc_info=True)
         return None
@@ -0,0 +1,102 @@
+import logging
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.types import TelegramObject, Update
+from database.tracing import start_update_trace, finish_update_trace
+from services.metrics import get_metrics_sink
+
+logger = logging.getLogger('doc_bot.handler_metrics')
+
+# Обработчик, выбранный для текущего обновления (заполняет HandlerNameMiddleware)
+_current_update = ContextVar('handler_metrics_update', default=None)
+
+
+def callback_prefix(data: str) -> str:
+    """
+    Префикс callback_data для меток: «fill_», «doc_», «check_», «checkout».
+    Берется первое слово, чтобы идентификаторы в данных не раздували число серий.
+    """
+    if not data:
+        return ""
+    for index, char in enumerate(data):
+        if char in "_:":
+            return data[:index + 1]
+    return data
+
+
+def _handler_name(handler) -> str:
+    callback = getattr(handler, 'callback', None)
+    if callback is None:
+        return "unknown"
+    module = getattr(callback, '__module__', '') or ''
+    return f"{module.rsplit('.', 1)[-1]}.{getattr(callback, '__qualname__', repr(callback))}"
+
+
+class HandlerNameMiddleware(BaseMiddleware):
+    """Внутренний middleware: запоминает, какой обработчик выбран для обновления."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        context = _current_update.get()
+        if context is not None:
+            context['handler'] = _handler_name(data.get('handler'))
+        return await handler(event, data)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Внешний middleware на Update: время обработки, ошибки и число обновлений
+    в обработке с метками типа события, обработчика и префикса callback.
+    Заодно считает запросы к БД, выполненные за время обработки обновления.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        sink = get_metrics_sink()
+        event_type = event.event_type
+        prefix = callback_prefix(event.callback_query.data) if event.callback_query else ""
+        context = {'handler': 'unhandled'}
+        token = _current_update.set(context)
+        trace_token = start_update_trace(context)
+        sink.add_gauge('bot_updates_in_flight', 1, {'event_type': event_type})
+        started = time.perf_counter()
+        failed = False
+        try:
+            return await handler(event, data)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            finish_update_trace(trace_token, context)
+            _current_update.reset(token)
+            labels = {'event_type': event_type, 'handler': context['handler'], 'prefix': prefix}
+            sink.observe('bot_handler_latency_seconds', elapsed, labels)
+            sink.inc('bot_db_queries_total', context['queries'], {'handler': context['handler']})
+            sink.inc('bot_db_query_seconds_total', context['query_time'], {'handler': context['handler']})
+            if failed:
+                sink.inc('bot_handler_errors_total', 1, labels)
+            sink.add_gauge('bot_updates_in_flight', -1, {'event_type': event_type})
+
+
+def setup_handler_metrics(dp: Dispatcher):
+    """Подключает метрики ко всем роутерам. Вызывать после include_router."""
+    dp.update.outer_middleware(HandlerMetricsMiddleware())
+    name_middleware = HandlerNameMiddleware()
+    routers = 0
+    for router in dp.chain_tail:
+        for event_name, observer in router.observers.items():
+            if event_name not in ('update', 'error'):
+                observer.middleware(name_middleware)
+        routers += 1
+    logger.info(f"Метрики обработчиков подключены к {routers} роутерам")
@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import shutil
+import time
+from datetime import datetime
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.methods import GetUpdates
+from config import config
+
+logger = logging.getLogger('doc_bot.health')
+
+# Показатели для /health и /ready. Все, кроме запроса к БД, берутся из памяти процесса;
+# запрос к БД кэшируется на HEALTH_CACHE_SECONDS, чтобы частые проверки не нагружали SQLite
+
+_started_at = time.time()
+# Время последнего успешного getUpdates (polling) или последнего обновления из webhook
+_last_telegram_poll = None
+_last_update_received = None
+# (время проверки, результат) последнего запроса к БД
+_database_cache = None
+_database_lock = asyncio.Lock()
+
+
+class TelegramPollMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: запоминает время последнего успешного getUpdates."""
+
+    async def __call__(self, make_request, bot, method):
+        global _last_telegram_poll
+        response = await make_request(bot, method)
+        if isinstance(method, GetUpdates):
+            _last_telegram_poll = time.time()
+        return response
+
+
+def mark_update_received():
+    """Вызывается webhook-обработчиком на каждое принятое обновление."""
+    global _last_update_received
+    _last_update_received = time.time()
+
+
+def _isoformat(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).isoformat(timespec='seconds') if timestamp else None
+
+
+def _age(timestamp: float, now: float) -> float:
+    return round(now - timestamp, 3) if timestamp else None
+
+
+async def _check_database() -> dict:
+    """Запрос к БД (он же — очередь неоплаченных заказов) с коротким timeout и кэшем."""
+    global _database_cache
+    async with _database_lock:
+        if _database_cache and time.monotonic() - _database_cache[0] < config.HEALTH_CACHE_SECONDS:
+            return _database_cache[1]
+
+        from database.orders import get_pending_orders_backlog
+
+        started = time.perf_counter()
+        backlog = await asyncio.to_thread(get_pending_orders_backlog, config.HEALTH_DB_TIMEOUT)
+        result = {
+            'ok': backlog is not None,
+            'latency_ms': round((time.perf_counter() - started) * 1000, 1),
+            'pending_payments': backlog['count'] if backlog else None,
+            'oldest_pending_payment': backlog['oldest_created_at'] if backlog else None,
+        }
+        _database_cache = (time.monotonic(), result)
+        return result
+
+
+def _disk_status() -> dict:
+    """Свободное место (statvfs) и занятое документами по итогам последней очистки — без обхода каталогов."""
+    from services.storage import get_last_sweep
+
+    status = {}
+    try:
+        usage = shutil.disk_usage(config.GENERATED_DOCUMENTS_PATH)
+        status.update({'free_bytes': usage.free, 'total_bytes': usage.total})
+    except OSError as e:
+        logger.warning(f"Не удалось получить свободное место на диске: {e}")
+        status.update({'free_bytes': None, 'total_bytes': None})
+
+    sweep = get_last_sweep()
+    status.update({
+        'generated_bytes': sweep['after']['bytes'] if sweep else None,
+        'generated_files': sweep['after']['files'] if sweep else None,
+        'measured_at': _isoformat(sweep['finished_at']) if sweep else None,
+    })
+    return status
+
+
+def _telegram_status(now: float) -> dict:
+    if config.BOT_MODE == "webhook":
+        return {'last_update_at': _isoformat(_last_update_received), 'last_update_age': _age(_last_update_received, now)}
+    return {'last_poll_at': _isoformat(_last_telegram_poll), 'last_poll_age': _age(_last_telegram_poll, now)}
+
+
+def readiness_problems(health: dict, now: float) -> list:
+    """Причины, по которым процесс не готов принимать нагрузку; пустой список — готов."""
+    problems = []
+    render = health['render']
+    if render['running'] >= render['workers'] and render['waiting'] >= config.RENDER_READY_MAX_QUEUE:
+        problems.append('render_saturated')
+
+    lag = health['event_loop_lag']
+    if lag is not None and lag > config.HEALTH_MAX_LOOP_LAG:
+        problems.append('event_loop_lag')
+
+    if not health['database']['ok']:
+        problems.append('database')
+
+    free_bytes = health['disk']['free_bytes']
+    if free_bytes is not None and free_bytes < config.HEALTH_MIN_FREE_DISK_MB * 1024 * 1024:
+        problems.append('disk_space')
+
+    # Без успешного getUpdates бот не получает обновления; в режиме webhook тишина — норма
+    if config.BOT_MODE == "polling":
+        last_poll = _last_telegram_poll or _started_at
+        if now - last_poll > config.HEALTH_POLL_STALE_SECONDS:
+            problems.append('telegram_poll')
+    return problems
+
+
+async def collect_health(telegram_handler=None) -> dict:
+    from services.document_generator import get_render_stats
+    from services.metrics import get_last_event_loop_lag
+    from services.outbound import get_outbound_metrics
+
+    now = time.time()
+    lag = get_last_event_loop_lag()
+    health = {
+        'status': 'ok',
+        'mode': config.BOT_MODE,
+        'uptime': round(now - _started_at, 1),
+        'event_loop_lag': round(lag[0], 4) if lag else None,
+        'render': get_render_stats(),
+        'updates_in_flight': telegram_handler.in_flight if telegram_handler else 0,
+        'outbound_queue': get_outbound_metrics()['queue_size'],
+        'database': await _check_database(),
+        'disk': _disk_status(),
+        'telegram': _telegram_status(now),
+    }
+    health['problems'] = readiness_problems(health, now)
+    health['ready'] = not health['problems']
+    return health
+
+
+def get_health_metrics() -> dict:
+    """Сборщик для /metrics: только значения из памяти, без запросов к БД."""
+    from services.document_generator import get_render_stats
+
+    render = get_render_stats()
+    metrics = {
+        'bot_render_workers_busy': render['running'],
+        'bot_render_queue_depth': render['waiting'],
+    }
+    last_activity = _last_update_received if config.BOT_MODE == "webhook" else _last_telegram_poll
+    if last_activity:
+        metrics['bot_telegram_last_activity_age_seconds'] = time.time() - last_activity
+    if _database_cache and _database_cache[1]['pending_payments'] is not None:
+        metrics['bot_pending_payments'] = _database_cache[1]['pending_payments']
+    return metrics
@@ -0,0 +1,211 @@
+import atexit
+import copy
+import json
+import logging
+import queue
+import re
+import sys
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from config import config
+
+logger = logging.getLogger('doc_bot.logging')
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+REDACTED = "***"
+_exception_formatter = logging.Formatter()
+
+# Атрибуты LogRecord, которые не попадают в JSON как дополнительные поля (extra=...)
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+# Значения, похожие на телефон (+7 ...) и паспорт (серия и номер «45 06 123456»).
+# ИНН — это просто 10 или 12 цифр, как и Telegram ID, поэтому он скрывается только по имени поля
+_PHONE_RE = re.compile(r"(?<![\w+])(?:\+7|8)[\s\-]?\(?\d{3}\)?[\s\-]?\d{3}[\s\-]?\d{2}[\s\-]?\d{2}(?!\d)")
+_PASSPORT_RE = re.compile(r"(?<!\d)\d{2}\s?\d{2}\s(?:№\s?)?\d{6}(?!\d)")
+
+
+def _build_field_re(fields: tuple):
+    """
+    Пары «поле: значение» в репрезентации dict ('key': 'value') и JSON ("key": "value"),
+    где в имени поля есть одна из частей fields (customer_passport_series, inn_ip, phone).
+    """
+    parts = "|".join(re.escape(field) for field in fields)
+    key = rf"(?:\w+_)?(?:{parts})(?:_\w+)?"
+    return re.compile(
+        rf"""(?P<key>(?P<kq>['"]){key}(?P=kq)\s*:\s*)(?P<quote>['"])(?:\\.|(?!(?P=quote)).)*(?P=quote)"""
+        rf"""|(?P<bare>(?P<bq>['"]){key}(?P=bq)\s*:\s*)\d+"""
+    )
+
+
+def _parse_levels(value: str) -> dict:
+    """«doc_bot.admin=DEBUG,aiogram.event=WARNING» -> {имя логгера: уровень}."""
+    levels = {}
+    for item in value.split(","):
+        if "=" not in item:
+            continue
+        name, level = (part.strip() for part in item.split("=", 1))
+        if name and level:
+            levels[name] = level.upper()
+    return levels
+
+
+class RedactingFilter(logging.Filter):
+    """
+    Убирает из сообщений паспортные данные, ИНН и телефоны. Стоит на обработчиках
+    слушателя очереди, поэтому регулярные выражения выполняются в фоновом потоке.
+    """
+
+    def __init__(self, fields: tuple = None):
+        super().__init__()
+        fields = fields or tuple(
+            field.strip().lower() for field in config.LOG_REDACT_FIELDS.split(",") if field.strip()
+        )
+        self._field_re = _build_field_re(fields) if fields else None
+
+    def redact(self, text: str) -> str:
+        if self._field_re is not None:
+            text = self._field_re.sub(self._replace_field, text)
+        text = _PHONE_RE.sub(REDACTED, text)
+        return _PASSPORT_RE.sub(REDACTED, text)
+
+    @staticmethod
+    def _replace_field(match) -> str:
+        if match.group('key') is not None:
+            return f"{match.group('key')}{match.group('quote')}{REDACTED}{match.group('quote')}"
+        return f"{match.group('bare')}{REDACTED}"
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # DroppingQueueHandler уже подставил аргументы в msg и отформатировал traceback в exc_text
+        record.msg = self.redact(record.getMessage())
+        record.args = None
+        if record.exc_text:
+            record.exc_text = self.redact(record.exc_text)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись — одна строка JSON: время, уровень, логгер, сообщение и поля из extra."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'line': record.lineno,
+            'thread': record.threadName,
+        }
+        for name, value in vars(record).items():
+            if name not in _RECORD_ATTRS and not name.startswith('_'):
+                entry[name] = value if isinstance(value, (str, int, float, bool, type(None))) else str(value)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler, который при переполненной очереди отбрасывает запись, а не блокирует поток."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # В отличие от QueueHandler.prepare, traceback остается в exc_text, а не в тексте сообщения
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener = None
+_queue_handler = None
+
+
+def _build_handlers() -> list:
+    handlers = []
+    redacting_filter = RedactingFilter()
+
+    if config.LOG_FILE_ENABLED:
+        from services.file_utils import get_logs_path
+
+        file_handler = RotatingFileHandler(
+            get_logs_path(), maxBytes=config.LOG_MAX_BYTES,
+            backupCount=config.LOG_BACKUP_COUNT, encoding='utf-8'
+        )
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+
+    if config.LOG_CONSOLE_ENABLED:
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(
+            JsonFormatter() if config.LOG_CONSOLE_FORMAT == "json" else logging.Formatter(TEXT_FORMAT)
+        )
+        handlers.append(console_handler)
+
+    for handler in handlers:
+        handler.addFilter(redacting_filter)
+    return handlers
+
+
+def setup_logging():
+    """
+    Настраивает логирование: корневой логгер пишет только в очередь, а запись
+    в файл (JSON, с ротацией) и в stdout делает фоновый QueueListener.
+    Повторный вызов ничего не делает.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    root = logging.getLogger()
+    root.setLevel(config.LOG_LEVEL.upper())
+    for name, level in _parse_levels(config.LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    _queue_handler = DroppingQueueHandler(queue.Queue(maxsize=config.LOG_QUEUE_SIZE))
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+
+    _listener = QueueListener(_queue_handler.queue, *_build_handlers(), respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    logger.info(
+        f"Логирование настроено: уровень {config.LOG_LEVEL.upper()}, "
+        f"файл {'включен' if config.LOG_FILE_ENABLED else 'выключен'}, "
+        f"отдельные уровни: {config.LOG_LEVELS or 'нет'}"
+    )
+
+
+def stop_logging():
+    """Дописывает оставшиеся в очереди записи и останавливает фоновый поток."""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+
+
+def get_logging_metrics() -> dict:
+    if _queue_handler is None:
+        return {}
+    return {
+        'bot_log_queue_size': _queue_handler.queue.qsize(),
+        'bot_log_records_dropped': _queue_handler.dropped,
+    }
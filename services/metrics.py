@@ -0,0 +1,207 @@
+import asyncio
+import logging
+import threading
+import time
+from config import config
+
+logger = logging.getLogger('doc_bot.metrics')
+
+# Границы корзин гистограмм задержки, секунды
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Описания метрик для /metrics (# HELP)
+METRIC_HELP = {
+    'bot_handler_latency_seconds': "Время обработки обновления по обработчику и префиксу callback",
+    'bot_handler_errors_total': "Необработанные исключения в обработчиках",
+    'bot_updates_in_flight': "Обновления, которые обрабатываются прямо сейчас",
+    'bot_db_queries_total': "Запросы к БД, выполненные при обработке обновлений",
+    'bot_db_query_seconds_total': "Время запросов к БД при обработке обновлений",
+    'bot_event_loop_lag_seconds': "Задержка event loop относительно ожидаемого времени пробуждения",
+    'bot_event_loop_lag_last_seconds': "Последнее измерение задержки event loop",
+    'bot_log_queue_size': "Записи лога, ожидающие записи фоновым потоком",
+    'bot_log_records_dropped': "Записи лога, отброшенные из-за переполненной очереди",
+    'bot_generated_documents_bytes': "Место на диске, занятое сгенерированными документами",
+    'bot_generated_documents_files': "Число сгенерированных документов на диске",
+    'bot_storage_reclaimed_bytes_total': "Байты, освобожденные очисткой сгенерированных документов",
+    'bot_render_workers_busy': "Потоки рендеринга, занятые генерацией документа",
+    'bot_render_queue_depth': "Документы, ожидающие свободного потока рендеринга",
+    'bot_telegram_last_activity_age_seconds': "Секунд с последнего успешного getUpdates (polling) или обновления из webhook",
+    'bot_pending_payments': "Заказы, ожидающие оплаты",
+}
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(key: tuple, extra: tuple = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value))
+
+
+class MetricsSink:
+    """
+    Приемник метрик. Базовый класс ничего не делает — его можно подменить
+    через set_metrics_sink(), например, на отправку в StatsD.
+    """
+
+    def observe(self, name: str, value: float, labels: dict = None):
+        pass
+
+    def inc(self, name: str, value: float = 1.0, labels: dict = None):
+        pass
+
+    def add_gauge(self, name: str, delta: float, labels: dict = None):
+        pass
+
+    def set_gauge(self, name: str, value: float, labels: dict = None):
+        pass
+
+    def render(self) -> str:
+        return ""
+
+
+class PrometheusSink(MetricsSink):
+    """Метрики в памяти процесса, отдаются в текстовом формате Prometheus."""
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._collectors = []
+
+    def observe(self, name: str, value: float, labels: dict = None):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            state = series.get(key)
+            if state is None:
+                # [счетчики по корзинам..., сумма, количество]
+                state = series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def inc(self, name: str, value: float = 1.0, labels: dict = None):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def add_gauge(self, name: str, delta: float, labels: dict = None):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._gauges.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + delta
+
+    def set_gauge(self, name: str, value: float, labels: dict = None):
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def add_collector(self, collector):
+        """collector() -> {имя метрики: значение}; вызывается при каждом запросе /metrics."""
+        self._collectors.append(collector)
+
+    def _collect_gauges(self) -> dict:
+        with self._lock:
+            gauges = {name: dict(series) for name, series in self._gauges.items()}
+        for collector in self._collectors:
+            try:
+                for name, value in collector().items():
+                    gauges.setdefault(name, {})[()] = value
+            except Exception as e:
+                logger.warning(f"Ошибка сборщика метрик {collector}: {e}")
+        return gauges
+
+    def render(self) -> str:
+        with self._lock:
+            histograms = {name: {key: list(state) for key, state in series.items()}
+                          for name, series in self._histograms.items()}
+            counters = {name: dict(series) for name, series in self._counters.items()}
+        gauges = self._collect_gauges()
+
+        lines = []
+
+        def header(name: str, metric_type: str):
+            if name in METRIC_HELP:
+                lines.append(f"# HELP {name} {METRIC_HELP[name]}")
+            lines.append(f"# TYPE {name} {metric_type}")
+
+        for name, series in sorted(histograms.items()):
+            header(name, "histogram")
+            for key, state in series.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, state):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(key, (('le', _format_value(bound)),))} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(key, (('le', '+Inf'),))} {state[-1]}")
+                lines.append(f"{name}_sum{_format_labels(key)} {_format_value(state[-2])}")
+                lines.append(f"{name}_count{_format_labels(key)} {state[-1]}")
+        for name, series in sorted(counters.items()):
+            header(name, "counter")
+            for key, value in series.items():
+                lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+        for name, series in sorted(gauges.items()):
+            header(name, "gauge")
+            for key, value in series.items():
+                lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+_sink = PrometheusSink() if config.METRICS_ENABLED else MetricsSink()
+
+
+def get_metrics_sink() -> MetricsSink:
+    return _sink
+
+
+def set_metrics_sink(sink: MetricsSink):
+    """Подключает другой приемник метрик (вызывать до регистрации middleware)."""
+    global _sink
+    _sink = sink
+
+
+# (последняя задержка event loop, время замера) для /health
+_last_loop_lag = None
+
+
+def get_last_event_loop_lag() -> tuple:
+    """(задержка, время замера) или None, если измерение не запущено."""
+    return _last_loop_lag
+
+
+async def monitor_event_loop_lag(interval: float = None):
+    """
+    Фоновая задача: раз в interval секунд засыпает и измеряет, насколько
+    позже ожидаемого проснулась. Большая задержка означает, что event loop
+    блокируется синхронным кодом (рендеринг PDF, запросы к SQLite).
+    """
+    global _last_loop_lag
+    interval = interval or config.LOOP_LAG_INTERVAL
+    loop = asyncio.get_running_loop()
+    logger.info(f"Запущено измерение задержки event loop (каждые {interval} сек)")
+
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - started - interval)
+        _sink.observe('bot_event_loop_lag_seconds', lag)
+        _sink.set_gauge('bot_event_loop_lag_last_seconds', lag)
+        _last_loop_lag = (lag, time.time())
+        if lag > config.LOOP_LAG_WARNING:
+            logger.warning(f"Event loop был заблокирован на {lag:.3f} сек")
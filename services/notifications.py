@@ -1,19 +1,21 @@
+import html
 import logging
 from datetime import datetime
 from config import config
 from aiogram import Bot
+from services.outbound import notify_support, PRIORITY_USER
 
 logger = logging.getLogger('doc_bot.notifications')
 
 
 async def notify_support_about_new_order(
-    bot: Bot,
     order_id: int,
     user_id: int,
     cart_items: list,
     total_price: float,
     discounted_price: float,
-    promocode: str = None
+    promocode: str = None,
+    bot: Bot = None
 ):
     if not config.SUPPORT_CHAT_ID:
         logger.error("SUPPORT_CHAT_ID не установлен в конфигурации")
@@ -42,17 +44,13 @@ async def notify_support_about_new_order(
     message = "🛒 <b>Новый заказ</b>\n\n" + order_details
 
     try:
-        await bot.send_message(
-            chat_id=config.SUPPORT_CHAT_ID,
-            text=message,
-            parse_mode="HTML"
-        )
-        logger.info(f"Уведомление о заказе {order_id} отправлено в группу {config.SUPPORT_CHAT_ID}")
+        notify_support(message, bot=bot)
+        logger.info(f"Уведомление о заказе {order_id} поставлено в очередь для группы {config.SUPPORT_CHAT_ID}")
     except Exception as e:
         logger.error(f"Ошибка отправки уведомления о заказе: {e}")
 
 
-async def notify_support_about_support_request(bot: Bot, user_id: int, message_text: str):
+async def notify_support_about_support_request(user_id: int, message_text: str, bot: Bot = None):
     if not config.SUPPORT_CHAT_ID:
         logger.error("SUPPORT_CHAT_ID не установлен")
         return
@@ -61,21 +59,17 @@ async def notify_support_about_support_request(bot: Bot, user_id: int, message_t
     text = (
         f"🆘 <b>Новый запрос в поддержку!</b>\n\n"
         f"👤 Пользователь: <code>{user_id}</code>\n\n"
-        f"📝 Сообщение:\n<i>{message_text}</i>"
+        f"📝 Сообщение:\n<i>{html.escape(message_text or '')}</i>"
     )
 
     try:
-        await bot.send_message(
-            chat_id=config.SUPPORT_CHAT_ID,
-            text=text,
-            parse_mode="HTML"
-        )
-        logger.info("Уведомление о запросе поддержки отправлено")
+        notify_support(text, priority=PRIORITY_USER, bot=bot)
+        logger.info("Уведомление о запросе поддержки поставлено в очередь")
     except Exception as e:
         logger.error(f"Ошибка отправки запроса поддержки: {e}")
 
 
-async def send_daily_stats_report(bot: Bot):
+async def send_daily_stats_report(bot: Bot = None):
     from database.orders import get_daily_stats
 
     if not config.SUPPORT_CHAT_ID:
@@ -92,13 +86,13 @@ async def send_daily_stats_report(bot: Bot):
     )
 
     try:
-        await bot.send_message(chat_id=config.SUPPORT_CHAT_ID, text=message, parse_mode="HTML")
+        notify_support(message, bot=bot)
         logger.info("Ежедневная статистика отправлена")
     except Exception as e:
         logger.error(f"Ошибка отправки ежедневной статистики: {e}")
 
 
-async def send_monthly_stats_report(bot: Bot):
+async def send_monthly_stats_report(bot: Bot = None):
     from database.orders import get_monthly_stats
 
     if not config.SUPPORT_CHAT_ID:
@@ -116,13 +110,13 @@ async def send_monthly_stats_report(bot: Bot):
     )
 
     try:
-        await bot.send_message(chat_id=config.SUPPORT_CHAT_ID, text=message, parse_mode="HTML")
+        notify_support(message, bot=bot)
         logger.info("Ежемесячная статистика отправлена")
     except Exception as e:
         logger.error(f"Ошибка отправки ежемесячной статистики: {e}")
 
 
-async def send_yearly_stats_report(bot: Bot):
+async def send_yearly_stats_report(bot: Bot = None):
     from database.orders import get_yearly_stats
 
     if not config.SUPPORT_CHAT_ID:
@@ -143,13 +137,13 @@ async def send_yearly_stats_report(bot: Bot):
     )
 
     try:
-        await bot.send_message(chat_id=config.SUPPORT_CHAT_ID, text=message, parse_mode="HTML")
+        notify_support(message, bot=bot)
         logger.info("Годовая статистика отправлена")
     except Exception as e:
         logger.error(f"Ошибка отправки годовой статистики: {e}")
 
 
-async def notify_support_about_new_promocode(bot: Bot, promocode_code: str, discount: int):
+async def notify_support_about_new_promocode(promocode_code: str, discount: int, bot: Bot = None):
     month_abbr = promocode_code[:3].upper()
     months = {
         "JAN": "января", "FEB": "февраля", "MAR": "марта", "APR": "апреля",
@@ -167,35 +161,27 @@ async def notify_support_about_new_promocode(bot: Bot, promocode_code: str, disc
     )
 
     try:
-        await bot.send_message(chat_id=config.SUPPORT_CHAT_ID, text=message, parse_mode="HTML")
+        notify_support(message, bot=bot)
         logger.info(f"Уведомление о промокоде {promocode_code} отправлено")
     except Exception as e:
         logger.error(f"Ошибка отправки уведомления о промокоде: {e}")
 
 
 async def send_newsletter_to_all(bot: Bot, message_text: str) -> dict:
-    from database.users import get_all_users
-
-    users = get_all_users()
-    sent_count = 0
-    failed_count = 0
-
-    for user in users:
-        try:
-            await bot.send_message(
-                chat_id=user['id'],
-                text=message_text,
-                parse_mode="HTML"
-            )
-            sent_count += 1
-        except Exception as e:
-            failed_count += 1
-            logger.warning(f"Не удалось отправить сообщение пользователю {user['id']}: {e}")
-
-    result = {
-        'sent': sent_count,
-        'failed': failed_count,
-        'total': len(users)
+    from services.broadcast import run_broadcast
+    from database.broadcasts import create_broadcast
+
+    broadcast_id = create_broadcast(message_text, audience='all')
+    if not broadcast_id:
+        return {'sent': 0, 'failed': 0, 'blocked': 0, 'total': 0}
+
+    result = await run_broadcast(bot, broadcast_id)
+    if not result:
+        # Рассылка не завершена (нет доступа к БД) и продолжится после перезапуска
+        return {'sent': 0, 'failed': 0, 'blocked': 0, 'total': 0}
+    return {
+        'sent': result['sent'],
+        'failed': result['failed'],
+        'blocked': result['blocked'],
+        'total': result['total']
     }
-    logger.info(f"Рассылка завершена: {sent_count} успешно, {failed_count} ошибок из {len(users)} пользователей")
-    return result
\ No newline at end of file
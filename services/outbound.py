@@ -0,0 +1,371 @@
+import asyncio
+import html
+import itertools
+import logging
+import time
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramForbiddenError,
+    TelegramRetryAfter,
+    TelegramBadRequest
+)
+from config import config
+from services.rate_limiter import TokenBucket, ChatRateLimiter
+
+logger = logging.getLogger('doc_bot.outbound')
+
+# Приоритеты исходящих сообщений (меньше — важнее)
+PRIORITY_DOCUMENT = 0    # доставка оплаченных документов
+PRIORITY_USER = 1        # личные сообщения пользователям: ответы поддержки, уведомления
+PRIORITY_STATS = 2       # уведомления и отчеты в чат поддержки
+PRIORITY_MARKETING = 3   # рассылки, напоминания, промо
+
+PRIORITY_NAMES = {
+    PRIORITY_DOCUMENT: 'document',
+    PRIORITY_USER: 'user',
+    PRIORITY_STATS: 'stats',
+    PRIORITY_MARKETING: 'marketing'
+}
+
+MAX_MESSAGE_LENGTH = 4096
+DIGEST_SEPARATOR = "\n\n➖➖➖➖➖\n\n"
+
+
+class OutboundQueue:
+    """
+    Единая очередь исходящих сообщений бота.
+
+    Все отправки идут через приоритетную очередь и пул воркеров, которые
+    соблюдают глобальный лимит Telegram и лимит на отдельный чат.
+    RetryAfter приостанавливает всю очередь, уведомления в чат поддержки
+    во время всплесков склеиваются в сводки.
+    """
+
+    def __init__(self):
+        self.bot = None
+        self._queue = None
+        self._workers = []
+        self._seq = itertools.count()
+        self._delayed = 0
+        self._bucket = None
+        self._chat_limiter = None
+        self._support_buffer = []
+        self._support_flush_handle = None
+        self._support_last_sent = 0.0
+        self.metrics = self._empty_metrics()
+
+    @staticmethod
+    def _empty_metrics() -> dict:
+        return {
+            'enqueued': 0,
+            'dispatched': 0,
+            'sent': 0,
+            'failed': 0,
+            'retried': 0,
+            'rate_limited': 0,
+            'deferred': 0,
+            'coalesced': 0,
+            'digests': 0,
+            'sent_by_priority': {name: 0 for name in PRIORITY_NAMES.values()},
+            'wait_total': 0.0,
+            'wait_max': 0.0
+        }
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    def start(self, bot: Bot):
+        if self.running:
+            return
+        self.bot = bot
+        self._queue = asyncio.PriorityQueue()
+        self._bucket = TokenBucket(config.OUTBOUND_GLOBAL_RATE)
+        self._chat_limiter = ChatRateLimiter(
+            config.OUTBOUND_PER_CHAT_INTERVAL,
+            group_interval=config.OUTBOUND_GROUP_CHAT_INTERVAL
+        )
+        self._workers = [
+            asyncio.create_task(self._worker(i)) for i in range(config.OUTBOUND_WORKERS)
+        ]
+        logger.info(f"Очередь исходящих сообщений запущена ({config.OUTBOUND_WORKERS} воркеров)")
+
+    async def stop(self, timeout: float = 10.0):
+        """Отправляет накопленные сводки, дожидается опустошения очереди и останавливает воркеров."""
+        if not self.running:
+            return
+        self._flush_support_buffer()
+        try:
+            await asyncio.wait_for(self._drain(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"Очередь не опустела за {timeout} сек, "
+                f"осталось {self._queue.qsize() + self._delayed} сообщений"
+            )
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        logger.info(f"Очередь исходящих сообщений остановлена: {self.get_metrics()}")
+
+    def _ensure_started(self, bot: Bot = None):
+        if not self.running:
+            if bot is None:
+                raise RuntimeError("Очередь исходящих сообщений не запущена")
+            self.start(bot)
+
+    def enqueue(self, method: str, chat_id: int, priority: int, bot: Bot = None, **kwargs) -> asyncio.Future:
+        self._ensure_started(bot)
+        future = asyncio.get_running_loop().create_future()
+        job = {
+            'method': method,
+            'chat_id': chat_id,
+            'kwargs': kwargs,
+            'future': future,
+            'priority': priority,
+            'attempts': 0,
+            'enqueued_at': time.monotonic()
+        }
+        self._put(job)
+        self.metrics['enqueued'] += 1
+        return future
+
+    def _put(self, job: dict):
+        self._queue.put_nowait((job['priority'], next(self._seq), job))
+
+    def _put_later(self, job: dict, delay: float):
+        # Пока задача ждет вне очереди, учитываем ее отдельно, чтобы stop() ее дождался
+        self._delayed += 1
+        asyncio.get_running_loop().call_later(delay, self._put_delayed, job)
+
+    def _put_delayed(self, job: dict):
+        self._delayed -= 1
+        self._put(job)
+
+    async def _drain(self):
+        while True:
+            await self._queue.join()
+            if not self._delayed:
+                return
+            await asyncio.sleep(0.1)
+
+    async def _worker(self, index: int):
+        while True:
+            _, _, job = await self._queue.get()
+            try:
+                await self._process(job)
+            except Exception as e:
+                logger.error(f"Воркер очереди {index}: необработанная ошибка: {e}", exc_info=True)
+                if not job['future'].done():
+                    job['future'].set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, job: dict):
+        chat_id = job['chat_id']
+
+        # Чат еще «остывает» — откладываем задачу, не занимая воркер
+        delay = self._chat_limiter.try_acquire(chat_id)
+        if delay > 0:
+            self.metrics['deferred'] += 1
+            self._put_later(job, delay)
+            return
+
+        await self._bucket.acquire()
+
+        if job['attempts'] == 0:
+            waited = time.monotonic() - job['enqueued_at']
+            self.metrics['dispatched'] += 1
+            self.metrics['wait_total'] += waited
+            self.metrics['wait_max'] = max(self.metrics['wait_max'], waited)
+
+        method = getattr(self.bot, job['method'])
+        try:
+            result = await method(chat_id=chat_id, **job['kwargs'])
+        except TelegramRetryAfter as e:
+            self.metrics['rate_limited'] += 1
+            logger.warning(f"Ограничение Telegram для чата {chat_id}: пауза {e.retry_after} сек")
+            self._bucket.pause(e.retry_after)
+            self._chat_limiter.pause(chat_id, e.retry_after)
+            self._retry_or_fail(job, e, e.retry_after)
+            return
+        except (TelegramForbiddenError, TelegramBadRequest) as e:
+            # Повтор не поможет: пользователь заблокировал бота или запрос некорректен
+            self._fail(job, e)
+            return
+        except Exception as e:
+            logger.warning(f"Ошибка отправки в чат {chat_id} (попытка {job['attempts'] + 1}): {e}")
+            self._retry_or_fail(job, e, 2 ** job['attempts'])
+            return
+
+        self.metrics['sent'] += 1
+        self.metrics['sent_by_priority'][PRIORITY_NAMES.get(job['priority'], 'user')] += 1
+        if not job['future'].done():
+            job['future'].set_result(result)
+
+    def _retry_or_fail(self, job: dict, error: Exception, delay: float):
+        job['attempts'] += 1
+        if job['attempts'] > config.OUTBOUND_MAX_RETRIES:
+            self._fail(job, error)
+            return
+        self.metrics['retried'] += 1
+        self._put_later(job, delay)
+
+    def _fail(self, job: dict, error: Exception):
+        self.metrics['failed'] += 1
+        if not job['future'].done():
+            job['future'].set_exception(error)
+
+    def notify_support(self, text: str, priority: int = PRIORITY_STATS, bot: Bot = None, **kwargs):
+        """
+        Отправляет уведомление в чат поддержки. Если с прошлой отправки прошло
+        меньше SUPPORT_DIGEST_WINDOW секунд, уведомление попадает в сводку,
+        которая уходит одним сообщением по истечении окна.
+        """
+        self._ensure_started(bot)
+        if not config.SUPPORT_CHAT_ID:
+            logger.error("SUPPORT_CHAT_ID не установлен в конфигурации")
+            return
+
+        now = time.monotonic()
+        window = config.SUPPORT_DIGEST_WINDOW
+        if not self._support_buffer and now - self._support_last_sent >= window:
+            self._support_last_sent = now
+            _log_failure(self.enqueue('send_message', config.SUPPORT_CHAT_ID, priority, text=text, **kwargs))
+            return
+
+        self._support_buffer.append((priority, text, kwargs))
+        self.metrics['coalesced'] += 1
+        if self._support_flush_handle is None:
+            delay = max(self._support_last_sent + window - now, 0)
+            self._support_flush_handle = asyncio.get_running_loop().call_later(delay, self._flush_support_buffer)
+
+    def _flush_support_buffer(self):
+        if self._support_flush_handle is not None:
+            self._support_flush_handle.cancel()
+            self._support_flush_handle = None
+        if not self._support_buffer:
+            return
+
+        buffer, self._support_buffer = self._support_buffer, []
+        self._support_last_sent = time.monotonic()
+        priority = min(item[0] for item in buffer)
+
+        if len(buffer) == 1:
+            _, text, kwargs = buffer[0]
+            _log_failure(self.enqueue('send_message', config.SUPPORT_CHAT_ID, priority, text=text, **kwargs))
+            return
+
+        for digest, items in _pack_digest(buffer):
+            self.metrics['digests'] += 1
+            future = self.enqueue('send_message', config.SUPPORT_CHAT_ID, priority, text=digest, parse_mode="HTML")
+            future.add_done_callback(self._digest_fallback(items))
+
+    def _digest_fallback(self, items: list):
+        """
+        Если Telegram отклонил сводку (например, из-за разметки в одном из уведомлений),
+        отправляет ее уведомления по одному, чтобы остальные не потерялись.
+        """
+        def callback(future: asyncio.Future):
+            if future.cancelled() or not future.exception():
+                return
+            error = future.exception()
+            if not isinstance(error, TelegramBadRequest):
+                logger.error(f"Не удалось отправить сводку уведомлений: {error}")
+                return
+            logger.warning(f"Сводка уведомлений отклонена ({error}), отправляем {len(items)} уведомлений по одному")
+            for priority, text, kwargs in items:
+                _log_failure(self.enqueue('send_message', config.SUPPORT_CHAT_ID, priority, text=text, **kwargs))
+        return callback
+
+    def get_metrics(self) -> dict:
+        metrics = dict(self.metrics)
+        metrics['sent_by_priority'] = dict(self.metrics['sent_by_priority'])
+        metrics['queue_size'] = self._queue.qsize() if self._queue else 0
+        metrics['delayed'] = self._delayed
+        metrics['support_buffer'] = len(self._support_buffer)
+        dispatched = metrics['dispatched']
+        metrics['wait_avg'] = metrics['wait_total'] / dispatched if dispatched else 0.0
+        return metrics
+
+
+def _digest_text(item: tuple) -> str:
+    # Сводка отправляется в HTML: уведомления без разметки экранируются
+    _, text, kwargs = item
+    return text if kwargs.get('parse_mode') == "HTML" else html.escape(text)
+
+
+def _pack_digest(buffer: list) -> list:
+    """
+    Склеивает уведомления (priority, text, kwargs) в сообщения-сводки, не превышая
+    лимит длины Telegram. Возвращает пары (текст сводки, вошедшие в нее уведомления).
+    """
+    chunks = []
+    current = []
+    current_length = 0
+    for item in buffer:
+        text = _digest_text(item)
+        added = len(text) + (len(DIGEST_SEPARATOR) if current else 0)
+        if current and current_length + added > MAX_MESSAGE_LENGTH - 100:
+            chunks.append(current)
+            current, current_length = [], 0
+            added = len(text)
+        current.append((text, item))
+        current_length += added
+    if current:
+        chunks.append(current)
+
+    return [
+        (
+            f"📦 <b>Сводка уведомлений ({len(chunk)})</b>\n\n" + DIGEST_SEPARATOR.join(text for text, _ in chunk),
+            [item for _, item in chunk]
+        )
+        for chunk in chunks
+    ]
+
+
+def _log_failure(future: asyncio.Future):
+    def callback(f):
+        if not f.cancelled() and f.exception():
+            logger.error(f"Не удалось отправить сообщение из очереди: {f.exception()}")
+    future.add_done_callback(callback)
+    return future
+
+
+outbound_queue = OutboundQueue()
+
+
+def start_outbound_queue(bot: Bot):
+    outbound_queue.start(bot)
+
+
+async def stop_outbound_queue():
+    await outbound_queue.stop()
+
+
+async def send_message(chat_id: int, text: str, priority: int = PRIORITY_USER,
+                       bot: Bot = None, wait: bool = True, **kwargs):
+    """
+    Ставит сообщение в очередь. При wait=True дожидается отправки и возвращает
+    результат (или пробрасывает ошибку Telegram), иначе возвращает future.
+    """
+    future = outbound_queue.enqueue('send_message', chat_id, priority, bot=bot, text=text, **kwargs)
+    if wait:
+        return await future
+    return _log_failure(future)
+
+
+async def send_document(chat_id: int, document, priority: int = PRIORITY_DOCUMENT,
+                        bot: Bot = None, wait: bool = True, **kwargs):
+    future = outbound_queue.enqueue('send_document', chat_id, priority, bot=bot, document=document, **kwargs)
+    if wait:
+        return await future
+    return _log_failure(future)
+
+
+def notify_support(text: str, priority: int = PRIORITY_STATS, bot: Bot = None, parse_mode: str = "HTML"):
+    outbound_queue.notify_support(text, priority=priority, bot=bot, parse_mode=parse_mode)
+
+
+def get_outbound_metrics() -> dict:
+    return outbound_queue.get_metrics()
@@ -2,39 +2,99 @@ import logging
 import random
 import string
 import re
+import time
 from datetime import datetime, timedelta
+from config import config
 from database import get_connection
 
 logger = logging.getLogger('doc_bot.pricing')
 
-def get_template_price():
-    return get_price_from_db('template')
+SERVICE_TYPES = ('template', 'autogen')
 
-def get_autogeneration_price():
-    return get_price_from_db('autogen')
+# Кэш цен в памяти: базовые цены и переопределения для отдельных шаблонов.
+# Сбрасывается при изменении цен через бота; PRICE_CACHE_TTL страхует от
+# изменений, сделанных в обход бота (другим процессом или напрямую в БД).
+_price_cache = None
+_price_cache_loaded_at = 0.0
 
-def get_price_from_db(service_type: str) -> float:
+
+def _load_prices() -> dict:
     conn = get_connection()
     if not conn:
-        logger.error("Не удалось получить соединение с БД для получения цены.")
-        return 0.0
+        logger.error("Не удалось получить соединение с БД для получения цен.")
+        return None
     cursor = conn.cursor()
     try:
-        cursor.execute("SELECT price FROM prices WHERE service_type = ?", (service_type,))
-        result = cursor.fetchone()
-        if result:
-            return float(result[0])
-        else:
-            logger.warning(f"Цена для типа услуги '{service_type}' не найдена в БД. Возвращено 0.")
-            return 0.0
+        cursor.execute("SELECT service_type, price FROM prices")
+        base = {service_type: float(price) for service_type, price in cursor.fetchall()}
+        cursor.execute("SELECT template_name, service_type, price FROM template_prices")
+        overrides = {}
+        for template_name, service_type, price in cursor.fetchall():
+            overrides.setdefault(template_name, {})[service_type] = float(price)
+        logger.debug(f"Цены загружены из БД: {base}, переопределений: {len(overrides)}")
+        return {'base': base, 'overrides': overrides}
     except Exception as e:
-        logger.error(f"Ошибка при получении цены для '{service_type}' из БД: {e}", exc_info=True)
-        return 0
+        logger.error(f"Ошибка при загрузке цен из БД: {e}", exc_info=True)
+        return None
     finally:
         conn.close()
 
+
+def _get_price_cache() -> dict:
+    global _price_cache, _price_cache_loaded_at
+    now = time.monotonic()
+    if _price_cache is None or now - _price_cache_loaded_at > config.PRICE_CACHE_TTL:
+        prices = _load_prices()
+        if prices is None:
+            # БД недоступна: отдаем прежние цены, если они есть
+            return _price_cache or {'base': {}, 'overrides': {}}
+        _price_cache = prices
+        _price_cache_loaded_at = now
+    return _price_cache
+
+
+def invalidate_price_cache():
+    """Сбрасывает кэш цен, следующее обращение перечитает их из БД."""
+    global _price_cache
+    _price_cache = None
+    logger.info("Кэш цен сброшен")
+
+
+def get_price(service_type: str, template_name: str = None) -> float:
+    """Цена услуги с учетом переопределения для шаблона. Без обращения к БД, если кэш актуален."""
+    prices = _get_price_cache()
+    if template_name:
+        override = prices['overrides'].get(template_name, {}).get(service_type)
+        if override is not None:
+            return override
+    price = prices['base'].get(service_type)
+    if price is None:
+        logger.warning(f"Цена для типа услуги '{service_type}' не найдена в БД. Возвращено 0.")
+        return 0.0
+    return price
+
+
+def get_template_prices(template_name: str = None) -> dict:
+    """Цены шаблона в формате metadata['price']: {'template': ..., 'autogen': ...}."""
+    return {service_type: get_price(service_type, template_name) for service_type in SERVICE_TYPES}
+
+
+def get_price_overrides(template_name: str) -> dict:
+    """Переопределенные цены шаблона (только заданные администратором услуги)."""
+    return dict(_get_price_cache()['overrides'].get(template_name, {}))
+
+
+def get_template_price():
+    return get_price('template')
+
+def get_autogeneration_price():
+    return get_price('autogen')
+
+def get_price_from_db(service_type: str) -> float:
+    return get_price(service_type)
+
 def update_price_in_db(service_type: str, new_price: float):
-    if service_type not in ['template', 'autogen']:
+    if service_type not in SERVICE_TYPES:
         logger.error(f"Неподдерживаемый тип услуги для обновления цены: {service_type}")
         return False
 
@@ -49,6 +109,7 @@ def update_price_in_db(service_type: str, new_price: float):
             VALUES (?, ?)
         """, (service_type, new_price))
         conn.commit()
+        invalidate_price_cache()
         logger.info(f"Цена для '{service_type}' обновлена в БД на {new_price}.")
         return True
     except Exception as e:
@@ -57,16 +118,49 @@ def update_price_in_db(service_type: str, new_price: float):
     finally:
         conn.close()
 
+def set_template_price_override(template_name: str, service_type: str, new_price: float = None):
+    """
+    Устанавливает цену услуги для отдельного шаблона.
+    new_price=None удаляет переопределение, и шаблон снова продается по базовой цене.
+    """
+    if service_type not in SERVICE_TYPES:
+        logger.error(f"Неподдерживаемый тип услуги для переопределения цены: {service_type}")
+        return False
+
+    conn = get_connection()
+    if not conn:
+        logger.error("Не удалось получить соединение с БД для обновления цены шаблона.")
+        return False
+    cursor = conn.cursor()
+    try:
+        if new_price is None:
+            cursor.execute(
+                "DELETE FROM template_prices WHERE template_name = ? AND service_type = ?",
+                (template_name, service_type)
+            )
+        else:
+            cursor.execute("""
+                INSERT INTO template_prices (template_name, service_type, price)
+                VALUES (?, ?, ?)
+                ON CONFLICT(template_name, service_type) DO UPDATE SET price = excluded.price
+            """, (template_name, service_type, new_price))
+        conn.commit()
+        invalidate_price_cache()
+        logger.info(f"Цена '{service_type}' для шаблона {template_name} установлена: {new_price}")
+        return True
+    except Exception as e:
+        logger.error(f"Ошибка при обновлении цены шаблона {template_name}: {e}", exc_info=True)
+        return False
+    finally:
+        conn.close()
+
 MONTHLY_PROMO_PREFIX = "FEEDBACK"
 
-def get_price_for_type(price_type: str) -> float:
-    if price_type == 'template':
-        return float(get_template_price())
-    elif price_type == 'autogen':
-        return float(get_autogeneration_price())
-    else:
+def get_price_for_type(price_type: str, template_name: str = None) -> float:
+    if price_type not in SERVICE_TYPES:
         logger.warning(f"Неизвестный тип цены: {price_type}. Используем цену автогенерации.")
-        return float(get_autogeneration_price())
+        price_type = 'autogen'
+    return float(get_price(price_type, template_name))
 
 def generate_promo_code(length=8):
     """Генерирует случайный промокод"""
@@ -115,36 +209,24 @@ def calculate_total_price(items: list, promo_code: str = None, user_id: int = No
     # Рассчитываем оригинальную стоимость
     original_price = sum(item.get('price', 0) for item in items)
 
-    # Применяем промокоды
+    # Применяем промокод: проверка и расчет за один запрос к БД
     discounted_price = original_price
     applied_promo = None
     discount_percent = 0.0
 
     if promo_code:
-        promo_code = promo_code.strip().upper()
-        # Проверяем валидность промокода
-        is_valid, message = validate_promo_code(promo_code, user_id, items)
-        if is_valid:
-            # Ленивый импорт для избежания циклических импортов
-            from database.promocodes import get_promocode_by_code
-
-            # Получаем информацию о промокоде
-            promo = get_promocode_by_code(promo_code)
-            if promo:
-                if promo['discount_type'] == 'percent':
-                    discount = original_price * (promo['discount'] / 100)
-                    discounted_price = max(0, original_price - discount)
-                    discount_percent = promo['discount']
-                elif promo['discount_type'] == 'fixed':
-                    discount = min(promo['discount'], original_price)
-                    discounted_price = max(0, original_price - discount)
-                    discount_percent = (discount / original_price * 100) if original_price > 0 else 0
-
-                applied_promo = {
-                    'code': promo_code,
-                    'type': promo['discount_type'],
-                    'value': promo['discount']
-                }
+        # Ленивый импорт для избежания циклических импортов
+        from services.promo_engine import evaluate_promocode
+
+        result = evaluate_promocode(promo_code, user_id, original_price)
+        if result['valid']:
+            discounted_price = result['discounted_price']
+            discount_percent = result['discount_percent']
+            applied_promo = {
+                'code': result['code'],
+                'type': result['discount_type'],
+                'value': result['discount']
+            }
 
     savings = original_price - discounted_price
     discounted_price = int(discounted_price)
@@ -175,44 +257,10 @@ def get_savings(items: list, promo_code: str = None, user_id: int = None) -> flo
 
 def is_promocode_valid(promocode_code: str, user_id: int = None) -> tuple:
     try:
-        from database.promocodes import get_promocode_by_code
-        promo = get_promocode_by_code(promocode_code)
-        if not promo:
-            logger.warning(f"Промокод {promocode_code} не найден")
-            return False, "Промокод не существует"
-
-        promo_id = promo['id']
-        discount = promo['discount']
-        max_uses = promo['max_uses']
-        used_count = promo['used_count']
-        expires_at = promo['expires_at']
-        if expires_at:
-            try:
-                current_time = datetime.now()
-                expires_at_dt = datetime.strptime(expires_at, "%Y-%m-%d %H:%M:%S")
-
-                if current_time > expires_at_dt:
-                    logger.warning(f"Промокод {promocode_code} истек")
-                    return False, "Промокод истек"
-            except (ValueError, TypeError) as e:
-                logger.error(f"Ошибка при сравнении даты промокода: {e}")
-                return False, "Ошибка проверки срока действия промокода"
-        if used_count >= max_uses:
-            logger.warning(f"Достигнуто максимальное количество использований промокода {promocode_code}")
-            return False, "Достигнуто максимальное количество использований промокода"
-        if user_id:
-            from database.promocodes import has_user_used_promocode
-            if has_user_used_promocode(promo_id, user_id):
-                logger.warning(f"Пользователь {user_id} уже использовал промокод {promocode_code}")
-                return False, "Вы уже использовали этот промокод"
-
-        if promocode_code == "WELCOME20":
-            from database.orders import get_user_orders
-            orders = get_user_orders(user_id)
-            if orders:
-                logger.warning(f"Пользователь {user_id} уже совершал заказы, промокод WELCOME20 недоступен")
-                return False, "Промокод WELCOME20 доступен только для новых пользователей"
-
+        from services.promo_engine import evaluate_promocode
+        result = evaluate_promocode(promocode_code, user_id)
+        if not result['valid']:
+            return False, result['message']
         return True, "Промокод валиден"
 
     except Exception as e:
@@ -221,21 +269,9 @@ def is_promocode_valid(promocode_code: str, user_id: int = None) -> tuple:
 
 
 def validate_promo_code(promo_code: str, user_id: int, items: list) -> tuple:
-    if not promo_code:
-        return False, "Промокод не указан"
-
-    promo_code = promo_code.strip().upper()
-    if not re.match(r'^[A-Z0-9]{4,15}$', promo_code):
-        return False, "Неверный формат промокода"
-    from database.promocodes import get_promocode_by_code
-    promo = get_promocode_by_code(promo_code)
-    if not promo:
-        return False, "Промокод не существует"
-    is_valid, message = is_promocode_valid(promo_code, user_id)
-    if not is_valid:
-        return False, message
-
-    return True, "Промокод успешно применен"
+    from services.promo_engine import evaluate_promocode
+    result = evaluate_promocode(promo_code, user_id)
+    return result['valid'], result['message']
 
 
 def generate_monthly_promo_code() -> str:
@@ -286,11 +322,13 @@ async def send_monthly_promo_notification(bot, admin_ids_list):
     try:
         new_promo_code = generate_monthly_promo_code()
         from database.promocodes import create_promocode
-        create_promocode(new_promo_code, "percent", 15.0, 30, 100)  # 15% скидка, 30 дней, 100 использований
+        expires_at = (datetime.now() + timedelta(days=30)).strftime("%Y-%m-%d %H:%M:%S")
+        create_promocode(new_promo_code, 15, max_uses=100, expires_at=expires_at)  # 15% скидка, 30 дней, 100 использований
 
         logger.info(f"Сгенерирован ежемесячный промокод: {new_promo_code}")
 
         from config import config
+        from services.outbound import send_message, PRIORITY_STATS
 
         message_text = (
             "🎉 <b>Новый ежемесячный промокод!</b>\n\n"
@@ -310,9 +348,11 @@ async def send_monthly_promo_notification(bot, admin_ids_list):
             for admin_id_str in admin_ids_list:
                 try:
                     admin_id = int(admin_id_str.strip())
-                    await bot.send_message(
-                        chat_id=admin_id,
-                        text=message_text,
+                    await send_message(
+                        admin_id,
+                        message_text,
+                        priority=PRIORITY_STATS,
+                        bot=bot,
                         parse_mode='HTML'
                     )
                     logger.info(f"Ежемесячный промокод {new_promo_code} отправлен админу {admin_id}")
@@ -349,8 +389,10 @@ async def send_monthly_promo_notification(bot, admin_ids_list):
             for admin_id_str in admin_ids_list:
                 try:
                     admin_id = int(admin_id_str.strip())
-                    await bot.send_message(
-                        chat_id=admin_id,
+                    await send_message(
+                        admin_id,
+                        priority=PRIORITY_STATS,
+                        bot=bot,
                         text="❌ <b>Критическая ошибка при генерации ежемесячного промокода.</b>\nПожалуйста, проверьте логи.",
                         parse_mode='HTML'
                     )
@@ -363,13 +405,8 @@ async def send_monthly_promo_notification(bot, admin_ids_list):
 def is_current_month_promo_active() -> bool:
     try:
         current_promo = get_current_month_promo()
-        from database.promocodes import get_promocode_by_code
-
-        promo = get_promocode_by_code(current_promo)
-        if promo:
-            is_valid, _ = is_promocode_valid(current_promo)
-            return is_valid
-        return False
+        is_valid, _ = is_promocode_valid(current_promo)
+        return is_valid
     except Exception as e:
         logger.error(f"Ошибка при проверке активности промокода текущего месяца: {e}", exc_info=True)
         return False
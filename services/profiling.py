@@ -0,0 +1,191 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from config import config
+
+logger = logging.getLogger('doc_bot.profiling')
+
+# Одновременно идет не больше одного семплирования
+_sampling_lock = threading.Lock()
+# cProfile нельзя запустить, пока работает другой профилировщик
+_cprofile_lock = threading.Lock()
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse(frame, thread_name: str) -> str:
+    """Стек в формате collapsed: корень;...;лист (первая строка функции, а не текущая)."""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.append(thread_name)
+    return ";".join(reversed(labels))
+
+
+def sample_stacks(duration: float, interval: float = None) -> tuple:
+    """
+    Снимает стеки всех потоков через sys._current_frames() каждые interval
+    секунд в течение duration секунд. Вызывать в отдельном потоке: поток,
+    который семплирует, в результат не попадает.
+
+    Возвращает (Counter {свернутый стек: число снимков}, число снимков)
+    или None, если семплирование уже идет.
+    """
+    interval = interval if interval is not None else config.PROFILE_SAMPLE_INTERVAL_MS / 1000
+    if not _sampling_lock.acquire(blocking=False):
+        return None
+    try:
+        own_id = threading.get_ident()
+        stacks = Counter()
+        samples = 0
+        deadline = time.perf_counter() + duration
+        logger.info(f"Начато семплирование стеков на {duration} сек (интервал {interval * 1000:.0f} мс)")
+        while time.perf_counter() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own_id:
+                    stacks[_collapse(frame, names.get(thread_id, f"thread-{thread_id}"))] += 1
+            samples += 1
+            time.sleep(interval)
+        logger.info(f"Семплирование завершено: {samples} снимков, {len(stacks)} уникальных стеков")
+        return stacks, samples
+    finally:
+        _sampling_lock.release()
+
+
+def format_collapsed(stacks: Counter) -> str:
+    """Текст для flamegraph.pl, speedscope или inferno: «стек число» на строку."""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def top_leaf_frames(stacks: Counter, limit: int = 5) -> list:
+    """Функции, которые чаще всего оказывались на вершине стека: [(функция, снимков)]."""
+    leaves = Counter()
+    for stack, count in stacks.items():
+        leaves[stack.rsplit(";", 1)[-1]] += count
+    return leaves.most_common(limit)
+
+
+def is_sampling() -> bool:
+    return _sampling_lock.locked()
+
+
+class DocumentProfiler:
+    """
+    Профилирует следующие calls вызовов generate_document через cProfile.
+    Когда все вызовы собраны, on_done(отчет, число вызовов) получает
+    отсортированную статистику; вызывается в потоке, где шла генерация.
+    """
+
+    def __init__(self, calls: int, on_done):
+        self.calls = calls
+        self.on_done = on_done
+        self._lock = threading.Lock()
+        self._remaining = calls
+        self._stats = None
+        # (шаблон, секунд) по каждому профилированному вызову
+        self._timings = []
+
+    def run(self, function, template_name, *args):
+        with self._lock:
+            claimed = self._remaining > 0
+            if claimed:
+                self._remaining -= 1
+        # Вызов не профилируется, если бюджет исчерпан или cProfile уже занят другим потоком
+        if not claimed or not _cprofile_lock.acquire(blocking=False):
+            if claimed:
+                with self._lock:
+                    self._remaining += 1
+            return function(template_name, *args)
+
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            return profile.runcall(function, template_name, *args)
+        finally:
+            elapsed = time.perf_counter() - started
+            _cprofile_lock.release()
+            self._add(profile, template_name, elapsed)
+
+    def _add(self, profile, template_name: str, elapsed: float):
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+            self._timings.append((template_name, elapsed))
+            done = len(self._timings) >= self.calls
+        if done:
+            disarm_document_profiling(self)
+            self._deliver()
+
+    def _deliver(self):
+        try:
+            self.on_done(self.report(), len(self._timings))
+        except Exception as e:
+            logger.error(f"Ошибка при отправке отчета профилирования: {e}", exc_info=True)
+
+    def finish(self) -> bool:
+        """Досрочно отправляет отчет по уже собранным вызовам. False, если их не было."""
+        if not self._timings:
+            return False
+        self._deliver()
+        return True
+
+    def report(self, limit: int = None) -> str:
+        limit = limit or config.PROFILE_STATS_LIMIT
+        with self._lock:
+            timings = list(self._timings)
+            output = io.StringIO()
+            if self._stats is not None:
+                self._stats.stream = output
+                output.write(f"=== Сортировка по cumulative (топ-{limit}) ===\n")
+                self._stats.sort_stats('cumulative').print_stats(limit)
+                output.write(f"\n=== Сортировка по tottime (топ-{limit}) ===\n")
+                self._stats.sort_stats('tottime').print_stats(limit)
+
+        header = [f"Профиль generate_document: {len(timings)} вызовов"]
+        header += [f"  {template_name}: {elapsed * 1000:.1f} мс" for template_name, elapsed in timings]
+        return "\n".join(header) + "\n\n" + output.getvalue()
+
+
+def arm_document_profiling(calls: int, on_done) -> DocumentProfiler:
+    """
+    Включает профилирование следующих calls вызовов generate_document.
+    Пока профилирование не включено, generate_document только проверяет,
+    что профилировщика нет.
+    """
+    from services import document_generator
+
+    profiler = DocumentProfiler(calls, on_done)
+    document_generator.document_profiler = profiler
+    logger.info(f"Включено профилирование следующих {calls} вызовов generate_document")
+    return profiler
+
+
+def disarm_document_profiling(profiler: DocumentProfiler = None):
+    """Выключает профилирование; с profiler — только если активен именно он. Возвращает снятый профилировщик."""
+    from services import document_generator
+
+    current = document_generator.document_profiler
+    if current is None or (profiler is not None and current is not profiler):
+        return None
+    document_generator.document_profiler = None
+    logger.info("Профилирование generate_document выключено")
+    return current
+
+
+def get_document_profiler():
+    from services import document_generator
+
+    return document_generator.document_profiler
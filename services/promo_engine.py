@@ -0,0 +1,147 @@
+import logging
+import re
+from datetime import datetime
+from database.promocodes import get_promocode_context
+
+logger = logging.getLogger('doc_bot.promo_engine')
+
+PROMO_CODE_PATTERN = re.compile(r'^[A-Z0-9]{4,15}$')
+EXPIRES_AT_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+# --- Проверки. Каждая возвращает текст ошибки или None, если проверка пройдена ---
+
+def _check_expiry(promo: dict, now: datetime):
+    if not promo['expires_at']:
+        return None
+    try:
+        if now > datetime.strptime(promo['expires_at'], EXPIRES_AT_FORMAT):
+            return "Промокод истек"
+    except (ValueError, TypeError) as e:
+        logger.error(f"Ошибка при сравнении даты промокода: {e}")
+        return "Ошибка проверки срока действия промокода"
+    return None
+
+
+def _check_uses_left(promo: dict, now: datetime):
+    if promo['used_count'] >= promo['max_uses']:
+        return "Достигнуто максимальное количество использований промокода"
+    return None
+
+
+def _check_not_used_by_user(promo: dict, now: datetime):
+    if promo['user_used']:
+        return "Вы уже использовали этот промокод"
+    return None
+
+
+def _check_first_order(promo: dict, now: datetime):
+    if promo['has_paid_order']:
+        return f"Промокод {promo['code']} доступен только для новых пользователей"
+    return None
+
+
+# --- Применение скидки ---
+
+def _apply_percent(price: float, discount: float) -> float:
+    return max(0.0, price - price * discount / 100)
+
+
+def _apply_fixed(price: float, discount: float) -> float:
+    return max(0.0, price - discount)
+
+
+DISCOUNT_APPLIERS = {
+    'percent': _apply_percent,
+    'fixed': _apply_fixed
+}
+
+# Таблица правил: вид промокода -> проверки, которые к нему применяются.
+# FRIENDS100 и рублевые промокоды можно использовать повторно.
+PROMO_RULES = {
+    'friends': (_check_expiry, _check_uses_left),
+    'ruble': (_check_expiry, _check_uses_left),
+    'first_order': (_check_expiry, _check_uses_left, _check_not_used_by_user, _check_first_order),
+    'standard': (_check_expiry, _check_uses_left, _check_not_used_by_user)
+}
+
+# Определение вида промокода: сначала точное совпадение, затем префикс
+PROMO_KINDS_BY_CODE = {
+    'FRIENDS100': 'friends',
+    'WELCOME20': 'first_order'
+}
+PROMO_KINDS_BY_PREFIX = (
+    ('1RUB', 'ruble'),
+)
+
+
+def get_promo_kind(code: str) -> str:
+    kind = PROMO_KINDS_BY_CODE.get(code)
+    if kind:
+        return kind
+    for prefix, prefix_kind in PROMO_KINDS_BY_PREFIX:
+        if code.startswith(prefix):
+            return prefix_kind
+    return 'standard'
+
+
+def is_reusable_by_user(code: str) -> bool:
+    """Можно ли одному пользователю применить промокод несколько раз."""
+    return _check_not_used_by_user not in PROMO_RULES[get_promo_kind(code)]
+
+
+def apply_discount(price: float, discount_type: str, discount: float) -> float:
+    """Цена после скидки. Не обращается к БД — используется для пересчета корзины."""
+    applier = DISCOUNT_APPLIERS.get(discount_type or 'percent', _apply_percent)
+    return applier(price, discount)
+
+
+def describe_discount(discount_type: str, discount: float) -> str:
+    if discount_type == 'fixed':
+        return f"скидка {discount} ₽"
+    return f"{discount}% скидка"
+
+
+def evaluate_promocode(code: str, user_id: int = None, price: float = 0.0) -> dict:
+    """
+    Проверяет промокод и считает цену за один запрос к БД.
+
+    Возвращает словарь с ключами valid и message, а для действующего
+    промокода — параметры скидки и разбивку цены.
+    """
+    code = (code or "").strip().upper()
+    if not code:
+        return {'valid': False, 'message': "Промокод не указан", 'code': code}
+    if not PROMO_CODE_PATTERN.match(code):
+        return {'valid': False, 'message': "Неверный формат промокода", 'code': code}
+
+    promo = get_promocode_context(code, user_id)
+    if not promo:
+        logger.warning(f"Промокод {code} не найден")
+        return {'valid': False, 'message': "Промокод не существует", 'code': code}
+
+    kind = get_promo_kind(code)
+    now = datetime.now()
+    for check in PROMO_RULES[kind]:
+        error = check(promo, now)
+        if error:
+            logger.warning(f"Промокод {code} отклонен для пользователя {user_id}: {error}")
+            return {'valid': False, 'message': error, 'code': code}
+
+    discount_type = promo['discount_type']
+    discounted_price = apply_discount(price, discount_type, promo['discount'])
+    savings = price - discounted_price
+
+    return {
+        'valid': True,
+        'message': "Промокод успешно применен",
+        'code': code,
+        'promo_id': promo['id'],
+        'kind': kind,
+        'discount_type': discount_type,
+        'discount': promo['discount'],
+        'original_price': round(price, 2),
+        'discounted_price': round(discounted_price, 2),
+        'savings': round(savings, 2),
+        'discount_percent': round(savings / price * 100, 2) if price > 0 else 0.0
+    }
@@ -0,0 +1,207 @@
+import logging
+import re
+
+logger = logging.getLogger('doc_bot.question_flow')
+
+_TOKEN_RE = re.compile(r"""
+    \s*(?:
+        (?P<string>'[^']*'|"[^"]*")
+      | (?P<op>==|!=|[()\[\],])
+      | (?P<word>[^\s=!()\[\],'"]+)
+    )""", re.VERBOSE)
+
+
+def _tokenize(expression: str) -> list:
+    tokens = []
+    position = 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = _TOKEN_RE.match(expression, position)
+        if not match or match.end() == position:
+            raise ValueError(f"неожиданный символ в позиции {position}")
+        position = match.end()
+        if match.group('string') is not None:
+            tokens.append(('value', match.group('string')[1:-1]))
+        elif match.group('op') is not None:
+            tokens.append(('op', match.group('op')))
+        elif match.group('word') is not None:
+            word = match.group('word')
+            if word in ('and', 'or', 'not', 'in'):
+                tokens.append(('op', word))
+            else:
+                tokens.append(('word', word))
+    return tokens
+
+
+class _ConditionParser:
+    """
+    Разбирает условие вопроса в функцию answers -> bool.
+
+    Поддерживается: step == 'x', step != 'x', step in ('x', 'y'),
+    step not in [...], and, or (and связывает сильнее) и скобки.
+    """
+
+    def __init__(self, expression: str, step_index: dict):
+        self.tokens = _tokenize(expression)
+        self.position = 0
+        self.step_index = step_index
+        self.dependencies = set()
+
+    def parse(self):
+        predicate = self._parse_or()
+        if self.position != len(self.tokens):
+            raise ValueError(f"лишний фрагмент: {self.tokens[self.position][1]}")
+        return predicate
+
+    def _peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def _next(self):
+        token = self._peek()
+        if token[0] is None:
+            raise ValueError("неожиданный конец условия")
+        self.position += 1
+        return token
+
+    def _accept(self, op: str) -> bool:
+        if self._peek() == ('op', op):
+            self.position += 1
+            return True
+        return False
+
+    def _parse_or(self):
+        parts = [self._parse_and()]
+        while self._accept('or'):
+            parts.append(self._parse_and())
+        if len(parts) == 1:
+            return parts[0]
+        return lambda answers: any(part(answers) for part in parts)
+
+    def _parse_and(self):
+        parts = [self._parse_atom()]
+        while self._accept('and'):
+            parts.append(self._parse_atom())
+        if len(parts) == 1:
+            return parts[0]
+        return lambda answers: all(part(answers) for part in parts)
+
+    def _parse_atom(self):
+        if self._accept('('):
+            predicate = self._parse_or()
+            if not self._accept(')'):
+                raise ValueError("не закрыта скобка")
+            return predicate
+
+        kind, step = self._next()
+        if kind != 'word':
+            raise ValueError(f"ожидалось имя шага, получено {step}")
+        key = self.step_index.get(step)
+        if key is None:
+            raise ValueError(f"зависимый вопрос '{step}' не найден")
+        self.dependencies.add(step)
+
+        if self._accept('=='):
+            value = self._parse_value()
+            return lambda answers: answers.get(key) == value
+        if self._accept('!='):
+            value = self._parse_value()
+            return lambda answers: answers.get(key) != value
+        negate = self._accept('not')
+        if self._accept('in'):
+            values = frozenset(self._parse_list())
+            if negate:
+                return lambda answers: answers.get(key) not in values
+            return lambda answers: answers.get(key) in values
+        raise ValueError(f"неподдерживаемый оператор после '{step}'")
+
+    def _parse_value(self) -> str:
+        kind, value = self._next()
+        if kind not in ('value', 'word'):
+            raise ValueError(f"ожидалось значение, получено {value}")
+        return value
+
+    def _parse_list(self) -> list:
+        if not (self._accept('(') or self._accept('[')):
+            return [self._parse_value()]
+        values = []
+        while not (self._accept(')') or self._accept(']')):
+            values.append(self._parse_value())
+            self._accept(',')
+        return values
+
+
+def compile_condition(expression: str, step_index: dict):
+    """Компилирует условие в функцию answers -> bool. Ошибки разбора — ValueError."""
+    return _ConditionParser(expression, step_index).parse()
+
+
+def _never(answers: dict) -> bool:
+    return False
+
+
+class QuestionFlow:
+    """
+    Граф шагов анкеты, компилируется один раз на шаблон.
+
+    Хранит соответствие шаг -> индекс, разобранные условия и точки перехода:
+    подряд идущие вопросы с одинаковым условием образуют блок, и если условие
+    не выполнено, весь блок пропускается одним переходом.
+    """
+
+    def __init__(self, questions: list, template_name: str = None):
+        self.template_name = template_name
+        self.length = len(questions)
+        self.step_index = {
+            question['step']: str(index)
+            for index, question in enumerate(questions)
+            if question.get('step')
+        }
+        self.predicates = [None] * self.length
+        self.skip_targets = list(range(1, self.length + 1))
+
+        compiled = {}
+        for index, question in enumerate(questions):
+            condition = question.get("condition")
+            if not condition:
+                continue
+            if condition not in compiled:
+                try:
+                    compiled[condition] = compile_condition(condition, self.step_index)
+                except ValueError as e:
+                    # Как и раньше, вопрос с некорректным условием никогда не задается
+                    logger.warning(
+                        f"Некорректное условие '{condition}' в вопросе {index} шаблона {template_name}: {e}"
+                    )
+                    compiled[condition] = _never
+            self.predicates[index] = compiled[condition]
+
+        # Конец блока вопросов с одинаковым условием — цель перехода при пропуске
+        for index in range(self.length - 1, -1, -1):
+            condition = questions[index].get("condition")
+            if (
+                condition
+                and index + 1 < self.length
+                and questions[index + 1].get("condition") == condition
+            ):
+                self.skip_targets[index] = self.skip_targets[index + 1]
+
+    def is_active(self, index: int, answers: dict) -> bool:
+        predicate = self.predicates[index]
+        return predicate is None or predicate(answers)
+
+    def next_index(self, answers: dict, current_index: int) -> int:
+        """Индекс следующего вопроса, который нужно задать, начиная с current_index."""
+        index = current_index
+        while index < self.length:
+            predicate = self.predicates[index]
+            if predicate is None or predicate(answers):
+                return index
+            index = self.skip_targets[index]
+        return index
+
+    def next_unanswered(self, answers: dict, current_index: int) -> int:
+        """Как next_index, но пропускает вопросы, на которые уже есть ответ (пакетное заполнение)."""
+        index = self.next_index(answers, current_index)
+        while index < self.length and str(index) in answers:
+            index = self.next_index(answers, index + 1)
+        return index
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger('doc_bot.rate_limiter')
+
+
+class TokenBucket:
+    """
+    Асинхронный token bucket: не более `rate` операций в секунду
+    с допустимым всплеском до `capacity` операций.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1))
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self, tokens: float = 1.0):
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Обнуляет запас токенов на `seconds` секунд (после RetryAfter от Telegram)."""
+        self._tokens = -seconds * self.rate
+        self._updated_at = time.monotonic()
+
+
+class ChatRateLimiter:
+    """
+    Ограничение частоты для отдельных чатов: не чаще одного сообщения
+    в `interval` секунд в один и тот же чат (для групп — `group_interval`).
+    """
+
+    def __init__(self, interval: float, group_interval: float = None, max_chats: int = 10000):
+        self.interval = float(interval)
+        self.group_interval = float(group_interval if group_interval is not None else interval)
+        self.max_chats = max_chats
+        self._next_allowed = {}
+
+    def _interval_for(self, chat_id: int) -> float:
+        # Отрицательные id в Telegram — группы и каналы, для них лимит строже
+        return self.group_interval if chat_id < 0 else self.interval
+
+    async def acquire(self, chat_id: int):
+        now = time.monotonic()
+        allowed_at = self._next_allowed.get(chat_id, 0.0)
+        if allowed_at > now:
+            self._next_allowed[chat_id] = allowed_at + self._interval_for(chat_id)
+            await asyncio.sleep(allowed_at - now)
+        else:
+            self._next_allowed[chat_id] = now + self._interval_for(chat_id)
+
+        if len(self._next_allowed) > self.max_chats:
+            self._cleanup()
+
+    def try_acquire(self, chat_id: int) -> float:
+        """
+        Неблокирующий вариант: занимает слот и возвращает 0, если отправка
+        в чат разрешена сейчас, иначе возвращает время ожидания в секундах.
+        """
+        now = time.monotonic()
+        allowed_at = self._next_allowed.get(chat_id, 0.0)
+        if allowed_at > now:
+            return allowed_at - now
+
+        self._next_allowed[chat_id] = now + self._interval_for(chat_id)
+        if len(self._next_allowed) > self.max_chats:
+            self._cleanup()
+        return 0.0
+
+    def pause(self, chat_id: int, seconds: float):
+        self._next_allowed[chat_id] = time.monotonic() + seconds
+
+    def _cleanup(self):
+        now = time.monotonic()
+        self._next_allowed = {
+            chat_id: allowed_at
+            for chat_id, allowed_at in self._next_allowed.items()
+            if allowed_at > now
+        }
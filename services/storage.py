@@ -0,0 +1,341 @@
+import hashlib
+import heapq
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from config import config
+from services.artifacts import ARTIFACT_ID_RE, SHARD_RE, migrate_legacy_documents
+
+logger = logging.getLogger('doc_bot.storage')
+
+# Сгенерированные документы можно удалять: при повторном скачивании из истории
+# заказов они создаются заново из filled_data
+
+_sweep_lock = threading.Lock()
+_last_sweep = None
+
+
+class _File:
+    __slots__ = ('path', 'user', 'size', 'mtime', 'inode', 'artifact')
+
+    def __init__(self, path: str, user: str, stat: os.stat_result, artifact: tuple = None):
+        self.path = path
+        self.user = user
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        self.inode = (stat.st_dev, stat.st_ino)
+        # (id, формат) записи в document_artifacts для файлов из шардов
+        self.artifact = artifact
+
+
+def _scan_user_dir(user_dir: os.DirEntry, files: list):
+    """Старый каталог <user_id>/, который еще не перенесен в шарды."""
+    with os.scandir(user_dir.path) as entries:
+        for entry in entries:
+            if entry.is_file(follow_symlinks=False):
+                files.append(_File(entry.path, user_dir.name, entry.stat(follow_symlinks=False)))
+
+
+def _scan_shard(shard: os.DirEntry, files: list):
+    """Шард ab/: каталоги cd/ с файлами <id>.<формат>; владельцы — одним запросом на весь шард."""
+    from database.artifacts import get_artifact_owners
+
+    owners = get_artifact_owners(shard.name)
+    for subdir in list(os.scandir(shard.path)):
+        if not subdir.is_dir(follow_symlinks=False):
+            continue
+        try:
+            with os.scandir(subdir.path) as entries:
+                for entry in entries:
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    artifact_id, _, file_format = entry.name.partition('.')
+                    owner = owners.get(artifact_id)
+                    # Файлы без записи в базе (или без пользователя) попадают только под срок и общую квоту
+                    files.append(_File(
+                        entry.path, str(owner) if owner is not None else None, entry.stat(follow_symlinks=False),
+                        (artifact_id, file_format) if ARTIFACT_ID_RE.match(artifact_id) else None
+                    ))
+        except OSError as e:
+            logger.warning(f"Не удалось прочитать каталог {subdir.path}: {e}")
+
+
+def _scan(root: str) -> list:
+    """
+    Файлы documents/generated/ab/cd/<id>.<формат> и старых каталогов <user_id>/:
+    один os.scandir на каталог вместо listdir и stat по путям.
+    """
+    files = []
+    try:
+        top_dirs = list(os.scandir(root))
+    except FileNotFoundError:
+        return files
+    for top_dir in top_dirs:
+        if not top_dir.is_dir(follow_symlinks=False):
+            continue
+        try:
+            if SHARD_RE.match(top_dir.name):
+                _scan_shard(top_dir, files)
+            else:
+                _scan_user_dir(top_dir, files)
+        except OSError as e:
+            logger.warning(f"Не удалось прочитать каталог {top_dir.path}: {e}")
+    return files
+
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _disk_bytes(files: list) -> int:
+    """Место на диске: файлы, связанные жесткими ссылками, считаются один раз."""
+    return sum(file.size for file in {file.inode: file for file in files}.values())
+
+
+class _Sweep:
+    def __init__(self, files: list, now: float):
+        self.now = now
+        self.stats = defaultdict(int)
+        # Сколько путей ссылается на каждый inode: место освобождается с удалением последнего
+        self.links = defaultdict(int)
+        for file in files:
+            self.links[file.inode] += 1
+        # Записи document_artifacts удаленных файлов: удаляются из базы после очистки
+        self.removed_artifacts = []
+
+    def remove(self, file: _File, reason: str) -> int:
+        """Удаляет файл; возвращает освобожденные байты или None, если удалить не удалось."""
+        try:
+            os.remove(file.path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Не удалось удалить {file.path}: {e}")
+            self.stats['errors'] += 1
+            return None
+        self.links[file.inode] -= 1
+        freed = file.size if self.links[file.inode] <= 0 else 0
+        if file.artifact is not None:
+            self.removed_artifacts.append(file.artifact)
+        self.stats[f'deleted_{reason}'] += 1
+        self.stats['reclaimed_bytes'] += freed
+        return freed
+
+    def deletable(self, file: _File) -> bool:
+        # Свежие файлы могут как раз отправляться пользователю
+        return self.now - file.mtime >= config.DOCUMENT_MIN_AGE_MINUTES * 60
+
+    def expire(self, files: list) -> list:
+        if config.DOCUMENT_RETENTION_DAYS <= 0:
+            return files
+        cutoff = self.now - config.DOCUMENT_RETENTION_DAYS * 86400
+        return [file for file in files if file.mtime >= cutoff or self.remove(file, 'expired') is None]
+
+    def enforce_user_quotas(self, files: list) -> list:
+        quota_bytes = config.DOCUMENT_USER_QUOTA_MB * 1024 * 1024
+        max_files = config.DOCUMENT_USER_MAX_FILES
+        by_user = defaultdict(list)
+        for file in files:
+            by_user[file.user].append(file)
+
+        kept = []
+        for user, user_files in by_user.items():
+            if user is None:
+                kept.extend(user_files)
+                continue
+            user_files.sort(key=lambda file: file.mtime)
+            total = sum(file.size for file in user_files)
+            count = len(user_files)
+            for file in user_files:
+                over = (quota_bytes > 0 and total > quota_bytes) or (max_files > 0 and count > max_files)
+                if over and self.deletable(file) and self.remove(file, 'user_quota') is not None:
+                    total -= file.size
+                    count -= 1
+                else:
+                    kept.append(file)
+        return kept
+
+    def enforce_global_quota(self, files: list) -> list:
+        quota_bytes = config.DOCUMENT_STORAGE_QUOTA_MB * 1024 * 1024
+        total = _disk_bytes(files)
+        if quota_bytes <= 0 or total <= quota_bytes:
+            return files
+
+        removed = set()
+        oldest = [(file.mtime, index) for index, file in enumerate(files)]
+        heapq.heapify(oldest)
+        while oldest and total > quota_bytes:
+            _, index = heapq.heappop(oldest)
+            file = files[index]
+            if not self.deletable(file):
+                continue
+            freed = self.remove(file, 'global_quota')
+            if freed is not None:
+                total -= freed
+                removed.add(index)
+        return [file for index, file in enumerate(files) if index not in removed]
+
+    def deduplicate(self, files: list):
+        """Одинаковые по содержимому файлы заменяются жесткими ссылками на один экземпляр."""
+        by_size = defaultdict(list)
+        for file in files:
+            if file.size >= config.DOCUMENT_DEDUP_MIN_BYTES:
+                by_size[file.size].append(file)
+
+        for same_size in by_size.values():
+            # Уже связанные жесткими ссылками файлы не хешируются повторно
+            unique = list({file.inode: file for file in same_size}.values())
+            if len(unique) < 2:
+                continue
+            by_digest = defaultdict(list)
+            for file in unique:
+                try:
+                    by_digest[_file_digest(file.path)].append(file)
+                except OSError:
+                    continue
+            for duplicates in by_digest.values():
+                if len(duplicates) < 2:
+                    continue
+                # Ссылки ведут на самую новую копию: общий inode получает ее mtime, и свежий
+                # документ не удаляется очисткой по возрасту вместе со старым дубликатом
+                original = max(duplicates, key=lambda file: file.mtime)
+                for file in duplicates:
+                    if file is not original:
+                        self._link(original, file)
+
+    def _link(self, original: _File, duplicate: _File):
+        temp_path = f"{duplicate.path}.dedup"
+        try:
+            os.link(original.path, temp_path)
+            os.replace(temp_path, duplicate.path)
+        except OSError as e:
+            logger.warning(f"Не удалось заменить {duplicate.path} ссылкой: {e}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return
+
+        old_inode = duplicate.inode
+        duplicate.inode = original.inode
+        duplicate.mtime = original.mtime
+        self.links[old_inode] -= 1
+        self.links[original.inode] += 1
+        freed = duplicate.size if self.links[old_inode] <= 0 else 0
+        self.stats['deduplicated'] += 1
+        self.stats['reclaimed_bytes'] += freed
+
+
+def _remove_empty_dirs(root: str) -> int:
+    """
+    Удаляет опустевшие старые каталоги <user_id>/. Каталоги шардов остаются: их
+    не больше 65536, а генерация создает каталог и сразу пишет в него файл.
+    """
+    removed = 0
+    try:
+        top_dirs = list(os.scandir(root))
+    except FileNotFoundError:
+        return 0
+    for top_dir in top_dirs:
+        if top_dir.is_dir(follow_symlinks=False) and not SHARD_RE.match(top_dir.name):
+            try:
+                os.rmdir(top_dir.path)
+                removed += 1
+            except OSError:
+                # Каталог не пуст
+                pass
+    return removed
+
+
+def get_storage_usage(files: list = None) -> dict:
+    """Занятое место: файлов, байт на диске (жесткие ссылки считаются один раз), пользователей."""
+    files = _scan(str(config.GENERATED_DOCUMENTS_PATH)) if files is None else files
+    return {
+        'files': len(files),
+        'bytes': _disk_bytes(files),
+        'users': len({file.user for file in files if file.user is not None}),
+    }
+
+
+def _export_metrics(stats: dict):
+    from services.metrics import get_metrics_sink
+
+    sink = get_metrics_sink()
+    sink.set_gauge('bot_generated_documents_bytes', stats['after']['bytes'])
+    sink.set_gauge('bot_generated_documents_files', stats['after']['files'])
+    sink.inc('bot_storage_reclaimed_bytes_total', stats.get('reclaimed_bytes', 0))
+
+
+def sweep_generated_documents() -> dict:
+    """
+    Очистка documents/generated: перенос старых каталогов <user_id>/ в шарды,
+    удаление по возрасту, замена одинаковых файлов жесткими ссылками, квоты
+    на пользователя (байты и число файлов) и общая квота (сначала самые
+    старые), очистка TEMP_PATH. Записи удаленных файлов убираются из document_artifacts.
+    Возвращает статистику или None, если очистка уже идет.
+    """
+    global _last_sweep
+    if not _sweep_lock.acquire(blocking=False):
+        return None
+    try:
+        from database.artifacts import delete_artifacts
+        from services.file_utils import clean_temp_files
+
+        started = time.perf_counter()
+        root = str(config.GENERATED_DOCUMENTS_PATH)
+        # Старые каталоги <user_id>/ переносятся в шарды до сканирования
+        migration = migrate_legacy_documents()
+        files = _scan(root)
+        before = get_storage_usage(files)
+
+        sweep = _Sweep(files, time.time())
+        files = sweep.expire(files)
+        # Дубликаты связываются до общей квоты: она считает место на диске
+        if config.DOCUMENT_DEDUP_ENABLED:
+            sweep.deduplicate(files)
+        files = sweep.enforce_user_quotas(files)
+        files = sweep.enforce_global_quota(files)
+
+        stats = dict(sweep.stats)
+        stats['migrated'] = migration['migrated']
+        stats['artifacts_deleted'] = delete_artifacts(sweep.removed_artifacts)
+        stats['temp_deleted'] = clean_temp_files(config.TEMP_RETENTION_DAYS)
+        stats['empty_dirs_removed'] = _remove_empty_dirs(root)
+        stats['before'] = before
+        stats['after'] = get_storage_usage(files)
+        stats['duration'] = time.perf_counter() - started
+        stats['finished_at'] = time.time()
+        _last_sweep = stats
+        _export_metrics(stats)
+
+        logger.info(
+            f"Очистка документов: освобождено {format_bytes(stats.get('reclaimed_bytes', 0))}, "
+            f"удалено по возрасту {stats.get('deleted_expired', 0)}, по квоте пользователя "
+            f"{stats.get('deleted_user_quota', 0)}, по общей квоте {stats.get('deleted_global_quota', 0)}, "
+            f"дубликатов {stats.get('deduplicated', 0)}, занято {format_bytes(stats['after']['bytes'])} "
+            f"({stats['duration']:.2f} сек)"
+        )
+        return stats
+    except Exception as e:
+        logger.error(f"Ошибка при очистке сгенерированных документов: {e}", exc_info=True)
+        return None
+    finally:
+        _sweep_lock.release()
+
+
+def get_last_sweep() -> dict:
+    return _last_sweep
+
+
+def format_bytes(size: int) -> str:
+    for unit in ("Б", "КБ", "МБ"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "Б" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.2f} ГБ"
@@ -0,0 +1,172 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from config import config
+
+logger = logging.getLogger('doc_bot.template_catalog')
+
+# Разделы шаблонов в порядке приоритета: при совпадении имен побеждает contracts
+TEMPLATE_SECTIONS = ("contracts", "website")
+
+# Файлы шаблона, изменение которых должно приводить к перечитыванию каталога
+WATCHED_FILES = ("metadata.json", "description.md", "questions.json", "autogen.html", "sample.html")
+
+
+class TemplateCatalog:
+    """
+    Индекс шаблонов документов в памяти.
+
+    Каталог строится одним проходом по templates/contracts и templates/website:
+    имя шаблона -> папка, метаданные и описание, категория -> список имен.
+    Поиск шаблона — обращение к словарю, без обращений к файловой системе.
+    Для обновления без перезапуска бота каталог хранит «отпечаток» (mtime
+    папок и файлов шаблонов) и перестраивается, только если он изменился.
+    """
+
+    def __init__(self, base_path: Path = None):
+        self.base_path = Path(base_path or config.TEMPLATES_PATH)
+        self._lock = threading.Lock()
+        self._by_name = {}
+        self._by_category = {}
+        self._signature = None
+
+    def _scan_signature(self) -> dict:
+        """Собирает mtime файлов каждого шаблона: {template_name: (раздел, mtime...)}."""
+        signature = {}
+        for section in TEMPLATE_SECTIONS:
+            section_dir = self.base_path / section
+            try:
+                entries = list(os.scandir(section_dir))
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                if not entry.is_dir() or entry.name in signature:
+                    continue
+                mtimes = [entry.stat().st_mtime_ns]
+                for file_name in WATCHED_FILES:
+                    try:
+                        mtimes.append(os.stat(os.path.join(entry.path, file_name)).st_mtime_ns)
+                    except FileNotFoundError:
+                        mtimes.append(0)
+                # Папка без metadata.json шаблоном не считается
+                if mtimes[1]:
+                    signature[entry.name] = (section, *mtimes)
+        return signature
+
+    def _load_template(self, template_name: str, section: str) -> dict:
+        template_dir = self.base_path / section / template_name
+        try:
+            with open(template_dir / "metadata.json", 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+        except Exception as e:
+            logger.error(f"Ошибка при загрузке metadata.json для {template_name}: {e}")
+            return None
+
+        description = None
+        description_path = template_dir / "description.md"
+        if description_path.exists():
+            with open(description_path, 'r', encoding='utf-8') as f:
+                description = f.read().strip() or None
+
+        return {
+            'template_name': template_name,
+            'section': section,
+            'dir': template_dir,
+            'category': str(metadata.get("category", "")).lower(),
+            'metadata': metadata,
+            'description': description
+        }
+
+    def _rebuild(self, signature: dict) -> set:
+        old_signature = self._signature or {}
+        by_name = {}
+        by_category = {}
+        for template_name, template_signature in signature.items():
+            if template_signature == old_signature.get(template_name) and template_name in self._by_name:
+                entry = self._by_name[template_name]
+            else:
+                entry = self._load_template(template_name, template_signature[0])
+                if entry is None:
+                    continue
+            by_name[template_name] = entry
+            by_category.setdefault(entry['category'], []).append(template_name)
+
+        changed = {
+            name for name in set(signature) | set(old_signature)
+            if signature.get(name) != old_signature.get(name)
+        }
+        self._by_name = by_name
+        self._by_category = by_category
+        self._signature = signature
+        return changed
+
+    def load(self) -> set:
+        """Полностью перестраивает каталог. Возвращает имена изменившихся шаблонов."""
+        with self._lock:
+            self._by_name = {}
+            changed = self._rebuild(self._scan_signature())
+        logger.info(f"Каталог шаблонов загружен: {len(self._by_name)} шаблонов, категории: {sorted(self._by_category)}")
+        return changed
+
+    def refresh_if_changed(self) -> set:
+        """Перечитывает только изменившиеся шаблоны, если файлы на диске изменились."""
+        signature = self._scan_signature()
+        with self._lock:
+            if signature == self._signature:
+                return set()
+            changed = self._rebuild(signature)
+        logger.info(f"Каталог шаблонов обновлен, изменились: {sorted(changed)}")
+        return changed
+
+    def _ensure_loaded(self):
+        if self._signature is None:
+            self.load()
+
+    def get(self, template_name: str) -> dict:
+        self._ensure_loaded()
+        return self._by_name.get(template_name)
+
+    def get_category(self, category: str) -> list:
+        self._ensure_loaded()
+        names = self._by_category.get(str(category).lower(), [])
+        return [self._by_name[name] for name in names]
+
+    def __len__(self) -> int:
+        self._ensure_loaded()
+        return len(self._by_name)
+
+
+catalog = TemplateCatalog()
+
+
+def _on_templates_changed(changed: set):
+    from services.template_registry import invalidate_template
+
+    for template_name in changed:
+        invalidate_template(template_name)
+
+
+def reload_catalog():
+    """Перестраивает каталог с нуля и сбрасывает реестр вопросов."""
+    from services.template_registry import invalidate_template
+
+    catalog.load()
+    invalidate_template()
+
+
+async def watch_templates(interval: float = None):
+    """Фоновая задача: следит за изменениями в папке шаблонов и обновляет каталог."""
+    interval = interval or config.TEMPLATES_WATCH_INTERVAL
+    logger.info(f"Запущено отслеживание изменений шаблонов (каждые {interval} сек)")
+
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            changed = await asyncio.to_thread(catalog.refresh_if_changed)
+            if changed:
+                _on_templates_changed(changed)
+        except Exception as e:
+            logger.error(f"Ошибка при обновлении каталога шаблонов: {e}", exc_info=True)
@@ -0,0 +1,186 @@
+import logging
+import re
+from datetime import datetime
+from functools import lru_cache
+from services.amount_to_words import amount_to_words
+from services.validators import parse_date
+
+logger = logging.getLogger('doc_bot.template_data')
+
+EMPTY_VALUE = "______"
+DATE_OUTPUT_FORMAT = "%d.%m.%Y"
+EMPTY_AMOUNT_WORDS = "______ руб. __ коп. (______)"
+
+# Поля с суммой: исходное поле -> поле с суммой прописью
+AMOUNT_FIELDS = {
+    'service_cost_numeric': 'service_cost_full'
+}
+
+# Для этих полей всегда добавляется <поле>_initial, даже если вопроса нет в шаблоне
+DEFAULT_INITIAL_FIELDS = (
+    "executor_first_name", "executor_patronymic",
+    "customer_first_name", "customer_patronymic"
+)
+INITIAL_SUFFIXES = ("_first_name", "_patronymic")
+
+# Месяцы в родительном падеже для полей <дата>_month
+MONTHS_GENITIVE = ("января", "февраля", "марта", "апреля", "мая", "июня",
+                   "июля", "августа", "сентября", "октября", "ноября", "декабря")
+
+_AMOUNT_CLEAN_RE = re.compile(r'[^\d.,]')
+
+
+@lru_cache(maxsize=1024)
+def is_date_field(step: str, field_type: str = None) -> bool:
+    return field_type == "date" or "date" in step.lower()
+
+
+def _get_initial(name) -> str:
+    return str(name)[:1].upper() if (name and name != EMPTY_VALUE) else "_"
+
+
+def _put_date(data: dict, step: str, value):
+    """Добавляет <поле>_formatted и части даты <поле>_day, _month (прописью), _year."""
+    date_obj = parse_date(value) if value and value != EMPTY_VALUE else None
+    if date_obj is None:
+        data[f"{step}_formatted"] = value if value and value != EMPTY_VALUE else EMPTY_VALUE
+        data[f"{step}_day"] = data[f"{step}_month"] = data[f"{step}_year"] = EMPTY_VALUE
+        return
+    data[f"{step}_formatted"] = date_obj.strftime(DATE_OUTPUT_FORMAT)
+    data[f"{step}_day"] = str(date_obj.day)
+    data[f"{step}_month"] = MONTHS_GENITIVE[date_obj.month - 1]
+    data[f"{step}_year"] = str(date_obj.year)
+
+
+def _legacy_repeat_items(answers: dict, field_steps: tuple) -> list:
+    """
+    Элементы из старого формата ответов: ключи item_1_name, item_1_quantity, ...
+    (так описи сохранялись до появления повторяющихся групп и так остались
+    в корзинах и неоплаченных заказах). Перебор — до первого номера без ключей.
+    """
+    items = []
+    number = 1
+    while any(f"item_{number}_{field}" in answers for field in field_steps):
+        item = {field: answers.get(f"item_{number}_{field}") for field in field_steps}
+        if any(value and value != EMPTY_VALUE for value in item.values()):
+            items.append(item)
+        number += 1
+    return items
+
+
+def prepare_repeat_items(items, field_steps: tuple, answers: dict = None) -> list:
+    """
+    Элементы повторяющейся группы: у каждого есть все поля, пустые — «______».
+    Если списка нет, элементы собираются из старых ключей item_N_* в answers.
+    """
+    if not isinstance(items, list):
+        items = _legacy_repeat_items(answers, field_steps) if answers else []
+    prepared = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        prepared.append({
+            field: (str(item.get(field) or "").strip() or EMPTY_VALUE)
+            for field in field_steps
+        })
+    return prepared
+
+
+def _parse_amount(raw) -> str:
+    try:
+        amount = float(_AMOUNT_CLEAN_RE.sub('', str(raw)).replace(',', '.'))
+        return amount_to_words(amount)
+    except (ValueError, TypeError) as e:
+        logger.warning(f"Ошибка при обработке суммы: {e}")
+        return EMPTY_AMOUNT_WORDS
+
+
+def _put(data: dict, step: str, value, is_date: bool):
+    """Записывает одно поле: списки склеиваются, для дат добавляются производные поля."""
+    if isinstance(value, list) and not (value and isinstance(value[0], dict)):
+        value = ", ".join(str(v) for v in value if v)
+    data[step] = value
+    if is_date:
+        _put_date(data, step, value)
+
+
+def _add_computed(data: dict, initial_fields: tuple, now: datetime):
+    for field in initial_fields:
+        data[f"{field}_initial"] = _get_initial(data.get(field))
+
+    for source, target in AMOUNT_FIELDS.items():
+        if source in data:
+            data[target] = _parse_amount(data[source])
+
+    # current_date всегда текущий момент; current_date_formatted — ответ на
+    # вопрос current_date, если он есть в шаблоне, иначе сегодняшняя дата
+    data['current_date'] = now
+    data['now'] = now
+    if data.get('current_date_formatted', EMPTY_VALUE) == EMPTY_VALUE:
+        data['current_date_formatted'] = now.strftime(DATE_OUTPUT_FORMAT)
+
+
+def redact_data(data: dict) -> dict:
+    """Данные для лога без персональных данных: только тип и длина значений."""
+    return {
+        key: f"<{type(value).__name__}:{len(value)}>" if isinstance(value, (str, list, dict)) else f"<{type(value).__name__}>"
+        for key, value in data.items()
+    }
+
+
+def _log_prepared(template_name: str, data: dict):
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Данные для шаблона {template_name} подготовлены: {redact_data(data)}")
+
+
+class TemplateDataSchema:
+    """
+    Схема подготовки данных шаблона, компилируется из questions.json один раз.
+
+    Заранее известно, какие поля являются датами и повторяющимися группами,
+    для каких нужны инициалы и суммы прописью, поэтому подготовка — один
+    проход по ответам и одно обращение к часам.
+    """
+
+    def __init__(self, questions: list, template_name: str = None):
+        self.template_name = template_name
+        # (ключ ответа, имя шага, это дата)
+        self.fields = tuple(
+            (str(index), question['step'], is_date_field(question['step'], question.get('type')))
+            for index, question in enumerate(questions)
+            if question.get('step') and question.get('type') != 'repeat'
+        )
+        # Повторяющиеся группы: (ключ ответа, имя шага, поля элемента)
+        self.repeat_fields = tuple(
+            (str(index), question['step'], tuple(field['step'] for field in question.get('fields', [])))
+            for index, question in enumerate(questions)
+            if question.get('step') and question.get('type') == 'repeat'
+        )
+        steps = [step for _, step, _ in self.fields]
+        self.initial_fields = DEFAULT_INITIAL_FIELDS + tuple(
+            step for step in dict.fromkeys(steps)
+            if step.endswith(INITIAL_SUFFIXES) and step not in DEFAULT_INITIAL_FIELDS
+        )
+
+    def prepare(self, answers: dict) -> dict:
+        """Данные для рендеринга из ответов {индекс: значение}."""
+        now = datetime.now()
+        data = {}
+        for key, step, is_date in self.fields:
+            _put(data, step, answers.get(key, EMPTY_VALUE), is_date)
+        for key, step, field_steps in self.repeat_fields:
+            data[step] = prepare_repeat_items(answers.get(key), field_steps, answers)
+        _add_computed(data, self.initial_fields, now)
+        _log_prepared(self.template_name, data)
+        return data
+
+
+def prepare_step_data(values: dict) -> dict:
+    """Подготовка данных, уже разложенных по именам шагов, когда схемы шаблона нет."""
+    now = datetime.now()
+    data = {}
+    for step, value in values.items():
+        _put(data, step, value, is_date_field(step))
+    _add_computed(data, DEFAULT_INITIAL_FIELDS, now)
+    _log_prepared(None, data)
+    return data
@@ -0,0 +1,87 @@
+import logging
+from services.document_service import get_template_info, load_questions
+from services.question_flow import QuestionFlow
+from services.validators import compile_validators
+from services.template_data import TemplateDataSchema
+
+logger = logging.getLogger('doc_bot.template_registry')
+
+# Реестр шаблонов процесса: template_name -> {'info', 'questions', 'flow', 'validators', 'data_schema'}.
+# В FSM хранится только имя шаблона, вопросы и описание берутся отсюда.
+_registry = {}
+
+
+def _load_entry(template_name: str, category: str = None) -> dict:
+    questions = load_questions(template_name)
+    if not questions:
+        return None
+
+    info = get_template_info(template_name, category)
+    entry = {
+        'info': {
+            'id': info.get('id', template_name),
+            'name': info.get('name', template_name),
+            'category': info.get('category', category),
+            'template_name': info.get('template_name', template_name)
+        },
+        'questions': questions,
+        'flow': QuestionFlow(questions, template_name),
+        'validators': compile_validators(questions),
+        'data_schema': TemplateDataSchema(questions, template_name)
+    }
+    logger.debug(f"Шаблон {template_name} загружен в реестр ({len(questions)} вопросов)")
+    return entry
+
+
+def get_template_entry(template_name: str, category: str = None) -> dict:
+    """Возвращает запись реестра для шаблона, загружая ее при первом обращении."""
+    entry = _registry.get(template_name)
+    if entry is None:
+        entry = _load_entry(template_name, category)
+        if entry is None:
+            return None
+        _registry[template_name] = entry
+    return entry
+
+
+def get_questions(template_name: str) -> list:
+    """Список вопросов шаблона. Список общий для всех пользователей — не изменять."""
+    entry = get_template_entry(template_name)
+    return entry['questions'] if entry else []
+
+
+def get_doc_info(template_name: str, category: str = None) -> dict:
+    entry = get_template_entry(template_name, category)
+    return entry['info'] if entry else None
+
+
+def get_step_index(template_name: str) -> dict:
+    entry = get_template_entry(template_name)
+    return entry['flow'].step_index if entry else {}
+
+
+def get_flow(template_name: str) -> QuestionFlow:
+    """Скомпилированный граф шагов анкеты шаблона."""
+    entry = get_template_entry(template_name)
+    return entry['flow'] if entry else QuestionFlow([], template_name)
+
+
+def get_validators(template_name: str) -> list:
+    """Скомпилированные валидаторы ответов шаблона, по индексу вопроса."""
+    entry = get_template_entry(template_name)
+    return entry['validators'] if entry else []
+
+
+def get_data_schema(template_name: str) -> TemplateDataSchema:
+    """Схема подготовки данных для рендеринга шаблона."""
+    entry = get_template_entry(template_name)
+    return entry['data_schema'] if entry else None
+
+
+def invalidate_template(template_name: str = None):
+    """Сбрасывает запись реестра (или весь реестр), например после изменения файлов шаблона."""
+    if template_name is None:
+        _registry.clear()
+        logger.info("Реестр шаблонов очищен")
+    else:
+        _registry.pop(template_name, None)
@@ -1,52 +1,84 @@
 import re
 from datetime import datetime, timedelta
+from functools import lru_cache
 import logging
 
 logger = logging.getLogger('doc_bot.validators')
 
+# Регулярные выражения компилируются один раз при импорте модуля
+_EMAIL_RE = re.compile(r'^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$')
+_NUMBER_RE = re.compile(r'^-?\d+(\.\d+)?$')
+_OKVED_RE = re.compile(r'^\d{1,2}(\.\d{1,2}){0,4}$')
+_NON_DIGIT_RE = re.compile(r'\D')
+_STEP_PATH_RE = re.compile(r'([a-zA-Z0-9_]+)\[(\d+)\]')
+
+# Коды стран для телефонов в международном формате
+_PHONE_COUNTRY_PREFIXES = ('49', '33', '39', '44', '1')
+
+# Весовые коэффициенты контрольных сумм ИНН
+_INN10_WEIGHTS = (2, 4, 10, 3, 5, 9, 4, 6, 8)
+_INN12_WEIGHTS_1 = (7, 2, 4, 10, 3, 5, 9, 4, 6, 8)
+_INN12_WEIGHTS_2 = (3, 7, 2, 4, 10, 3, 5, 9, 4, 6, 8)
+
+# Форматы дат: формат strptime -> (регулярное выражение, порядок групп год/месяц/день)
+_DATE_PARSERS = {
+    "%d.%m.%Y": (re.compile(r'(\d{1,2})\.(\d{1,2})\.(\d{4})'), (2, 1, 0)),
+    "%Y-%m-%d": (re.compile(r'(\d{4})-(\d{1,2})-(\d{1,2})'), (0, 1, 2)),
+    "%Y-%m-%d %H:%M:%S": (re.compile(r'(\d{4})-(\d{1,2})-(\d{1,2}) (\d{1,2}):(\d{1,2}):(\d{1,2})'), (0, 1, 2)),
+    "%d/%m/%Y": (re.compile(r'(\d{1,2})/(\d{1,2})/(\d{4})'), (2, 1, 0)),
+}
+DATE_FORMATS = tuple(_DATE_PARSERS)
+
+
+def parse_date(value, formats: tuple = DATE_FORMATS):
+    """
+    Разбирает дату в одном из форматов formats без перебора strptime.
+    Возвращает datetime или None, если строка не подходит ни под один формат.
+    """
+    value = str(value)
+    for date_format in formats:
+        pattern, order = _DATE_PARSERS[date_format]
+        match = pattern.fullmatch(value)
+        if not match:
+            continue
+        parts = match.groups()
+        try:
+            return datetime(
+                int(parts[order[0]]), int(parts[order[1]]), int(parts[order[2]]),
+                *map(int, parts[3:])
+            )
+        except ValueError:
+            return None
+    return None
+
+
+def _checksum(digits: list, weights: tuple, modulo: int = 11) -> int:
+    return sum(digit * weight for digit, weight in zip(digits, weights)) % modulo % 10
+
 
 def validate_email(email_str):
     """Проверяет email на корректность формата"""
     if not email_str or not isinstance(email_str, str):
         return False
-
-    # Улучшенное регулярное выражение для email
-    pattern = r'^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$'
-    return re.match(pattern, email_str) is not None
+    return _EMAIL_RE.match(email_str) is not None
 
 
 def validate_phone(phone_str):
     if not phone_str or not isinstance(phone_str, str):
         return False
 
-    # Удаляем все нецифровые символы
-    digits = re.sub(r'\D', '', phone_str)
-
-    # Проверяем длину
+    digits = _NON_DIGIT_RE.sub('', phone_str)
     if len(digits) < 10:
         return False
 
-    # Проверяем на соответствие российскому формату
+    # Российский формат: 9XXXXXXXXX или с кодом страны 7/8
     if len(digits) == 10 and digits.startswith('9'):
         return True
-
-    # Проверяем на наличие кода страны
-    if len(digits) == 11 and (digits.startswith('7') or digits.startswith('8')):
-        return True
-
-    # Проверяем международный формат
-    if len(digits) >= 10 and digits.startswith('49'):  # Германия
-        return True
-    if len(digits) >= 10 and digits.startswith('33'):  # Франция
-        return True
-    if len(digits) >= 10 and digits.startswith('39'):  # Италия
-        return True
-    if len(digits) >= 10 and digits.startswith('44'):  # Великобритания
-        return True
-    if len(digits) >= 10 and digits.startswith('1'):   # США/Канада
+    if len(digits) == 11 and digits[0] in '78':
         return True
 
-    return False
+    # Международный формат: Германия, Франция, Италия, Великобритания, США/Канада
+    return digits.startswith(_PHONE_COUNTRY_PREFIXES)
 
 
 def validate_inn(inn_str):
@@ -54,25 +86,18 @@ def validate_inn(inn_str):
     if not inn_str or not isinstance(inn_str, str) or not inn_str.isdigit():
         return False
 
-    # Проверяем длину
-    if len(inn_str) not in [10, 12]:
-        return False
-
-    # Проверка контрольной суммы для ИНН 10 цифр (юрлицо)
-    if len(inn_str) == 10:
-        coefficients = [2, 4, 10, 3, 5, 9, 4, 6, 8]
-        checksum = sum(int(inn_str[i]) * coefficients[i] for i in range(9)) % 11 % 10
-        return checksum == int(inn_str[9])
+    digits = [int(char) for char in inn_str]
 
-    # Проверка контрольных сумм для ИНН 12 цифр (физлицо)
-    if len(inn_str) == 12:
-        coefficients1 = [7, 2, 4, 10, 3, 5, 9, 4, 6, 8]
-        coefficients2 = [3, 7, 2, 4, 10, 3, 5, 9, 4, 6, 8]
+    # ИНН 10 цифр (юрлицо)
+    if len(digits) == 10:
+        return _checksum(digits, _INN10_WEIGHTS) == digits[9]
 
-        checksum1 = sum(int(inn_str[i]) * coefficients1[i] for i in range(10)) % 11 % 10
-        checksum2 = sum(int(inn_str[i]) * coefficients2[i] for i in range(11)) % 11 % 10
-
-        return checksum1 == int(inn_str[10]) and checksum2 == int(inn_str[11])
+    # ИНН 12 цифр (физлицо)
+    if len(digits) == 12:
+        return (
+            _checksum(digits, _INN12_WEIGHTS_1) == digits[10]
+            and _checksum(digits, _INN12_WEIGHTS_2) == digits[11]
+        )
 
     return False
 
@@ -82,19 +107,11 @@ def validate_ogrn(ogrn_str):
     if not ogrn_str or not isinstance(ogrn_str, str) or not ogrn_str.isdigit():
         return False
 
-    # Проверяем длину
-    if len(ogrn_str) not in [13, 15]:
-        return False
-
-    # Проверка контрольной суммы для ОГРН 13 цифр (юрлицо)
+    # 13 цифр — юрлицо (модуль 11), 15 цифр — ИП (модуль 13)
     if len(ogrn_str) == 13:
-        checksum = int(ogrn_str[:-1]) % 11 % 10
-        return checksum == int(ogrn_str[-1])
-
-    # Проверка контрольной суммы для ОГРН 15 цифр (ИП)
+        return int(ogrn_str[:-1]) % 11 % 10 == int(ogrn_str[-1])
     if len(ogrn_str) == 15:
-        checksum = int(ogrn_str[:-1]) % 13 % 10
-        return checksum == int(ogrn_str[-1])
+        return int(ogrn_str[:-1]) % 13 % 10 == int(ogrn_str[-1])
 
     return False
 
@@ -104,9 +121,8 @@ def validate_okved(okved_str):
     if not okved_str or not isinstance(okved_str, str):
         return False
 
-    # Проверяем формат ОКВЭД 2.4 (максимальная длина 7 символов, может содержать точки)
-    pattern = r'^\d{1,2}(\.\d{1,2}){0,4}$'
-    return re.match(pattern, okved_str) is not None
+    # Формат ОКВЭД 2.4 (максимальная длина 7 символов, может содержать точки)
+    return _OKVED_RE.match(okved_str) is not None
 
 
 def validate_date_range(start_date, end_date):
@@ -116,21 +132,8 @@ def validate_date_range(start_date, end_date):
         if not start_date or not end_date:
             return False, "Обе даты должны быть указаны"
 
-        # Пробуем разные форматы дат
-        formats = ["%d.%m.%Y", "%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%d/%m/%Y"]
-        start_dt = None
-        end_dt = None
-
-        for fmt in formats:
-            try:
-                if not start_dt:
-                    start_dt = datetime.strptime(str(start_date), fmt)
-                if not end_dt:
-                    end_dt = datetime.strptime(str(end_date), fmt)
-                if start_dt and end_dt:
-                    break
-            except (ValueError, TypeError):
-                continue
+        start_dt = parse_date(start_date)
+        end_dt = parse_date(end_date)
 
         if not start_dt or not end_dt:
             return False, "Неверный формат даты"
@@ -153,16 +156,7 @@ def validate_future_date(date_str):
         if not date_str:
             return False, "Дата не указана"
 
-        # Пробуем разные форматы дат
-        formats = ["%d.%m.%Y", "%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%d/%m/%Y"]
-        date_dt = None
-
-        for fmt in formats:
-            try:
-                date_dt = datetime.strptime(str(date_str), fmt)
-                break
-            except (ValueError, TypeError):
-                continue
+        date_dt = parse_date(date_str)
 
         if not date_dt:
             return False, "Неверный формат даты"
@@ -185,7 +179,7 @@ def get_date_from_step(all_questions, answers, step_path):
 
         if '[' in step_path and ']' in step_path:
             # Используем регулярное выражение для безопасного извлечения шага и индекса
-            match = re.match(r'([a-zA-Z0-9_]+)\[(\d+)\]', step_path)
+            match = _STEP_PATH_RE.match(step_path)
             if match:
                 step = match.group(1)
                 index = int(match.group(2))
@@ -203,56 +197,104 @@ def get_date_from_step(all_questions, answers, step_path):
         return None
 
 
+def _is_number(value: str) -> bool:
+    # Разрешаем отрицательные числа и десятичные дроби
+    return _NUMBER_RE.match(value) is not None
+
+
+def _is_date(value: str) -> bool:
+    return parse_date(value, ("%d.%m.%Y",)) is not None
+
+
+# Проверки по виду поля: вид -> (функция проверки, шаблон сообщения об ошибке)
+FIELD_CHECKS = {
+    'number': (_is_number, "{label} должен быть числом"),
+    'email': (validate_email, "Неверный формат {label_lower}"),
+    'phone': (validate_phone, "Неверный формат {label_lower}"),
+    'date': (_is_date, "Неверный формат даты для {label_lower}. Используйте ДД.ММ.ГГГГ"),
+    'inn': (validate_inn, "Неверный ИНН. {label} должен содержать 10 или 12 цифр"),
+    'ogrn': (validate_ogrn, "Неверный ОГРН. {label} должен содержать 13 или 15 цифр"),
+    'okved': (validate_okved, "Неверный формат ОКВЭД для {label_lower}"),
+}
+
+# Виды, которые определяются и по типу, и по имени шага (customer_inn, ogrn, ...)
+_STEP_KINDS = ('inn', 'ogrn', 'okved')
+
+
+def _detect_kind(field_type: str, step: str):
+    if field_type in ('number', 'email', 'phone', 'date'):
+        return field_type
+    step = step.lower()
+    for kind in _STEP_KINDS:
+        if field_type == kind or kind in step:
+            return kind
+    return None
+
+
+@lru_cache(maxsize=2048)
+def _compile_validator(field_type: str, step: str, label: str, required: bool):
+    checks = []
+    if required:
+        checks.append((str.strip, f"{label} обязательно для заполнения"))
+    kind = _detect_kind(field_type, step)
+    if kind:
+        check, message = FIELD_CHECKS[kind]
+        checks.append((check, message.format(label=label, label_lower=label.lower())))
+    checks = tuple(checks)
+
+    def validator(value) -> (bool, str):
+        try:
+            if value is None:
+                value = ""
+            elif not isinstance(value, str):
+                value = str(value)
+            for check, message in checks:
+                if not check(value):
+                    return False, message
+            return True, ""
+        except Exception as e:
+            logger.error(f"Ошибка при валидации поля {step}: {e}", exc_info=True)
+            return False, "Произошла ошибка при проверке этого поля"
+
+    return validator
+
+
+def compile_validator(question: dict):
+    """
+    Собирает функцию value -> (bool, str) для вопроса.
+
+    Вид проверки определяется один раз, сообщения об ошибках форматируются
+    заранее. Вопросы с одинаковыми параметрами разделяют один валидатор.
+    """
+    return _compile_validator(
+        question.get("type", "text"),
+        question.get("step", ""),
+        question.get("label", "Это поле"),
+        bool(question.get("required", False))
+    )
+
+
+def compile_validators(questions: list) -> list:
+    """Валидаторы для всех вопросов шаблона, по индексу вопроса."""
+    return [compile_validator(question) for question in questions]
+
+
 def validate_field(question: dict, value: str) -> (bool, str):
     """Валидирует поле формы на основе его типа и параметров"""
-    try:
-        field_type = question.get("type", "text")
-        step = question.get("step", "")
-        label = question.get("label", "Это поле")
-
-        # Проверяем, что value является строкой
-        if value is None:
-            value = ""
-        elif not isinstance(value, str):
-            value = str(value)
-
-        # Проверка пустых значений для обязательных полей
-        if question.get("required", False) and not value.strip():
-            return False, f"{label} обязательно для заполнения"
-
-        # Специфичные проверки
-        if field_type == "number":
-            # Разрешаем отрицательные числа и десятичные дроби
-            if not re.match(r'^-?\d+(\.\d+)?$', value):
-                return False, f"{label} должен быть числом"
-
-        elif field_type == "email":
-            if not validate_email(value):
-                return False, f"Неверный формат {label.lower()}"
-
-        elif field_type == "phone":
-            if not validate_phone(value):
-                return False, f"Неверный формат {label.lower()}"
-
-        elif field_type == "date":
-            try:
-                datetime.strptime(value, "%d.%m.%Y")
-            except ValueError:
-                return False, f"Неверный формат даты для {label.lower()}. Используйте ДД.ММ.ГГГГ"
-
-        elif field_type == "inn" or "inn" in step.lower():
-            if not validate_inn(value):
-                return False, f"Неверный ИНН. {label} должен содержать 10 или 12 цифр"
-
-        elif field_type == "ogrn" or "ogrn" in step.lower():
-            if not validate_ogrn(value):
-                return False, f"Неверный ОГРН. {label} должен содержать 13 или 15 цифр"
-
-        elif field_type == "okved" or "okved" in step.lower():
-            if not validate_okved(value):
-                return False, f"Неверный формат ОКВЭД для {label.lower()}"
-
-        return True, ""
-    except Exception as e:
-        logger.error(f"Ошибка при валидации поля: {e}", exc_info=True)
-        return False, "Произошла ошибка при проверке этого поля"
\ No newline at end of file
+    return compile_validator(question)(value)
+
+
+def validate_many(questions: list, answers: dict, validators: list = None) -> dict:
+    """
+    Проверяет сразу несколько ответов {индекс: значение}.
+    Возвращает {индекс: текст ошибки} только для ответов, не прошедших проверку.
+    """
+    if validators is None:
+        validators = compile_validators(questions)
+    errors = {}
+    for key, value in answers.items():
+        index = int(key)
+        is_valid, error = validators[index](value)
+        if not is_valid:
+            errors[index] = error
+    return errors
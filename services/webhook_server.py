@@ -0,0 +1,192 @@
+import asyncio
+import hmac
+import logging
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from config import config
+from services.health import mark_update_received
+
+logger = logging.getLogger('doc_bot.webhook')
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+# Обработчик webhook Telegram: его загрузку показывает /health приложения метрик
+_telegram_handler = None
+
+
+class TelegramWebhookHandler:
+    """
+    Принимает обновления Telegram и сразу отвечает 200, а обработку запускает
+    в фоне. Число одновременно обрабатываемых обновлений ограничено семафором:
+    при переполнении ответ задерживается, и Telegram снижает темп доставки.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, max_concurrent: int):
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._tasks = set()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        secret = request.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(secret, config.WEBHOOK_SECRET):
+            logger.warning(f"Отклонен webhook-запрос с неверным секретом от {request.remote}")
+            return web.Response(status=401)
+
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except Exception as e:
+            logger.warning(f"Некорректное обновление в webhook: {e}")
+            return web.Response(status=400)
+
+        mark_update_received()
+        await self._semaphore.acquire()
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response()
+
+    async def _process(self, update: Update):
+        try:
+            await self.dispatcher.feed_update(self.bot, update)
+        except Exception as e:
+            logger.error(f"Ошибка обработки обновления {update.update_id}: {e}", exc_info=True)
+        finally:
+            self._semaphore.release()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    async def wait_closed(self, timeout: float = 30.0):
+        if self._tasks:
+            await asyncio.wait(self._tasks, timeout=timeout)
+
+
+async def handle_yookassa_webhook(request: web.Request) -> web.Response:
+    from handlers.payment import handle_yookassa_notification
+
+    try:
+        payload = await request.json()
+    except Exception:
+        return web.Response(status=400)
+
+    try:
+        await handle_yookassa_notification(request.app['bot'], payload)
+    except Exception as e:
+        # Отвечаем 500, чтобы ЮKassa повторила уведомление позже
+        logger.error(f"Ошибка обработки уведомления ЮKassa: {e}", exc_info=True)
+        return web.Response(status=500)
+    return web.Response()
+
+
+async def handle_liveness(request: web.Request) -> web.Response:
+    """Проверка живости для публичного порта: без запросов к БД и внутренних показателей."""
+    return web.json_response({'status': 'ok'})
+
+
+async def handle_health(request: web.Request) -> web.Response:
+    """Состояние процесса и показатели нагрузки; 200, пока event loop отвечает."""
+    from services.health import collect_health
+
+    return web.json_response(await collect_health(_telegram_handler))
+
+
+async def handle_ready(request: web.Request) -> web.Response:
+    """Готовность принимать нагрузку: 503 со списком причин, если процесс перегружен."""
+    from services.health import collect_health
+
+    health = await collect_health(_telegram_handler)
+    return web.json_response(
+        {'ready': health['ready'], 'problems': health['problems']},
+        status=200 if health['ready'] else 503
+    )
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    from services.metrics import get_metrics_sink
+
+    return web.Response(
+        text=get_metrics_sink().render(),
+        content_type="text/plain",
+        headers={"X-Content-Type-Options": "nosniff"},
+        charset="utf-8"
+    )
+
+
+def create_metrics_app() -> web.Application:
+    """
+    Отдельное приложение для /metrics, /health и /ready: слушает METRICS_HOST
+    и не открывается наружу вместе с webhook.
+    """
+    app = web.Application()
+    app.router.add_get(config.METRICS_PATH, handle_metrics)
+    app.router.add_get(config.HEALTH_PATH, handle_health)
+    app.router.add_get(config.READY_PATH, handle_ready)
+    return app
+
+
+async def start_metrics_server() -> web.AppRunner:
+    runner = web.AppRunner(create_metrics_app())
+    await runner.setup()
+    site = web.TCPSite(runner, host=config.METRICS_HOST, port=config.METRICS_PORT)
+    await site.start()
+    logger.info(
+        f"Метрики доступны на http://{config.METRICS_HOST}:{config.METRICS_PORT}{config.METRICS_PATH}, "
+        f"проверка состояния — {config.HEALTH_PATH} и {config.READY_PATH}"
+    )
+    return runner
+
+
+def create_web_app(bot: Bot, dispatcher: Dispatcher = None) -> web.Application:
+    """
+    Создает aiohttp-приложение: webhook Telegram (только в режиме webhook),
+    уведомления ЮKassa и проверка живости. Подробные /health и /ready — только
+    в приложении метрик.
+    """
+    global _telegram_handler
+    app = web.Application()
+    app['bot'] = bot
+
+    if dispatcher is not None:
+        _telegram_handler = TelegramWebhookHandler(dispatcher, bot, config.WEBHOOK_MAX_CONCURRENT_UPDATES)
+        app['telegram_handler'] = _telegram_handler
+        app.router.add_post(config.WEBHOOK_PATH, _telegram_handler.handle)
+
+    app.router.add_post(config.YOOKASSA_WEBHOOK_PATH, handle_yookassa_webhook)
+    app.router.add_get(config.HEALTH_PATH, handle_liveness)
+    return app
+
+
+async def start_web_app(app: web.Application) -> web.AppRunner:
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host=config.WEBAPP_HOST, port=config.WEBAPP_PORT)
+    await site.start()
+    logger.info(f"HTTP-сервер запущен на {config.WEBAPP_HOST}:{config.WEBAPP_PORT}")
+    return runner
+
+
+async def run_webhook(bot: Bot, dispatcher: Dispatcher):
+    """Запускает бота в режиме webhook и работает до остановки процесса."""
+    app = create_web_app(bot, dispatcher)
+    runner = await start_web_app(app)
+
+    await dispatcher.emit_startup(bot=bot, dispatcher=dispatcher)
+    await bot.set_webhook(
+        url=f"{config.WEBHOOK_BASE_URL}{config.WEBHOOK_PATH}",
+        secret_token=config.WEBHOOK_SECRET,
+        allowed_updates=dispatcher.resolve_used_update_types(),
+        drop_pending_updates=config.DROP_PENDING_UPDATES,
+        max_connections=min(config.WEBHOOK_MAX_CONCURRENT_UPDATES, 100)
+    )
+    logger.info(f"Webhook установлен: {config.WEBHOOK_BASE_URL}{config.WEBHOOK_PATH}")
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await app['telegram_handler'].wait_closed()
+        await dispatcher.emit_shutdown(bot=bot, dispatcher=dispatcher)
+        await runner.cleanup()
+        await bot.session.close()